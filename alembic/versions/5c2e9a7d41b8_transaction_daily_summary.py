@@ -0,0 +1,102 @@
+"""transaction daily summary
+
+Revision ID: 5c2e9a7d41b8
+Revises: ac1603d49397
+Create Date: 2026-10-16 23:40:00.000000
+
+The rollup is maintained by statement-level triggers on `transactions`, in the
+transaction of every write, imports and cascaded deletes included. Each statement
+upserts the net change of the keys it touched only, computed from its transition
+tables, in key order so that concurrent writers lock the summary rows in the same order.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2e9a7d41b8'
+down_revision: Union[str, None] = 'ac1603d49397'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The rows added (+1) and removed (-1) by each kind of statement
+SUMMARY_CHANGES = {
+    'INSERT': 'SELECT category_id, created_at, value, 1 AS sign FROM new_rows',
+    'UPDATE': (
+        'SELECT category_id, created_at, value, 1 AS sign FROM new_rows '
+        'UNION ALL SELECT category_id, created_at, value, -1 FROM old_rows'
+    ),
+    'DELETE': 'SELECT category_id, created_at, value, -1 AS sign FROM old_rows',
+}
+
+# Changes of deleted categories are dropped, their rollup rows being deleted by cascade
+SUMMARY_UPSERT = """
+        INSERT INTO transaction_daily_summary AS summary (category_id, day, total, count)
+        SELECT changes.category_id, CAST(changes.created_at AS DATE),
+               SUM(changes.value * changes.sign), SUM(changes.sign)
+        FROM ({changes}) AS changes
+        WHERE EXISTS (SELECT FROM categories WHERE categories.id = changes.category_id)
+        GROUP BY 1, 2
+        HAVING SUM(changes.value * changes.sign) <> 0 OR SUM(changes.sign) <> 0
+        ORDER BY 1, 2
+        ON CONFLICT (category_id, day) DO UPDATE
+        SET total = summary.total + excluded.total, count = summary.count + excluded.count;
+"""
+
+TRIGGERS = {
+    'INSERT': 'REFERENCING NEW TABLE AS new_rows',
+    'UPDATE': 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows',
+    'DELETE': 'REFERENCING OLD TABLE AS old_rows',
+}
+
+
+def upgrade() -> None:
+    op.create_table('transaction_daily_summary',
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('total', sa.Float(asdecimal=True), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('category_id', 'day')
+    )
+    # Backfill the rollup from the existing transactions
+    op.execute(
+        """
+        INSERT INTO transaction_daily_summary (category_id, day, total, count)
+        SELECT category_id, CAST(created_at AS DATE), SUM(value), COUNT(*)
+        FROM transactions
+        GROUP BY category_id, CAST(created_at AS DATE)
+        """
+    )
+    branches = '    ELSIF'.join(
+        f" TG_OP = '{operation}' THEN{SUMMARY_UPSERT.format(changes=changes)}"
+        for operation, changes in SUMMARY_CHANGES.items()
+    )
+    op.execute(
+        f"""
+        CREATE FUNCTION transaction_daily_summary_apply() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF{branches}    END IF;
+            RETURN NULL;
+        END;
+        $$
+        """
+    )
+    for operation, transition_tables in TRIGGERS.items():
+        op.execute(
+            f"""
+            CREATE TRIGGER transactions_summary_{operation.lower()}
+            AFTER {operation} ON transactions {transition_tables}
+            FOR EACH STATEMENT EXECUTE FUNCTION transaction_daily_summary_apply()
+            """
+        )
+
+
+def downgrade() -> None:
+    for operation in reversed(TRIGGERS):
+        op.execute(f'DROP TRIGGER transactions_summary_{operation.lower()} ON transactions')
+    op.execute('DROP FUNCTION transaction_daily_summary_apply()')
+    op.drop_table('transaction_daily_summary')
@@ -0,0 +1,49 @@
+"""transactions primary key
+
+Revision ID: 8e1f0b6a2c47
+Revises: 5c2e9a7d41b8
+Create Date: 2026-10-16 23:55:00.000000
+
+The unique index of the new key is built with CONCURRENTLY, in an autocommit block, so
+the table is not locked against writes while it is built. It is then swapped in for the
+old key with `ADD CONSTRAINT ... USING INDEX`, which only takes a brief lock.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e1f0b6a2c47'
+down_revision: Union[str, None] = '5c2e9a7d41b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _swap_primary_key(index_name: str, columns: list[str]) -> None:
+    """Build the unique index of the columns and make it the primary key of the table."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            index_name,
+            'transactions',
+            columns,
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+    op.execute(
+        f"""
+        ALTER TABLE transactions
+            DROP CONSTRAINT transactions_pkey,
+            ADD CONSTRAINT transactions_pkey PRIMARY KEY USING INDEX {index_name}
+        """
+    )
+
+
+def upgrade() -> None:
+    # `name` keeps its own unique constraint, `id` alone identifies the rows
+    _swap_primary_key('transactions_id_key', ['id'])
+
+
+def downgrade() -> None:
+    _swap_primary_key('transactions_name_id_key', ['name', 'id'])
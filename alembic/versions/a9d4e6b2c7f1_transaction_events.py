@@ -0,0 +1,141 @@
+"""transaction events
+
+Revision ID: a9d4e6b2c7f1
+Revises: f7b2d4e8a913
+Create Date: 2026-10-17 00:20:00.000000
+
+Statement-level triggers on `transactions` send the events of the GraphQL subscriptions
+with `pg_notify`, within the write statement itself, so the mutations and the deletions
+cascaded from the categories publish them. The notifications are delivered on commit
+only.
+
+The events of a statement are coalesced from its transition table: a statement writing
+a few small transactions sends them in one notification, larger ones send their ids in
+chunks, with `partial` set, to be read back by the listeners. Deleted transactions are
+sent in chunks of ids and categories. Bulk loads, like the imports, turn the events off
+for their transaction with `SET LOCAL app.transaction_events = 'off'`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d4e6b2c7f1'
+down_revision: Union[str, None] = 'f7b2d4e8a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHANNEL = 'transaction_events'
+
+# Notifications are limited to 8000 bytes, a bit is kept for the channel name
+MAX_NOTIFICATION_SIZE = 7900
+
+# Statements writing up to this many transactions try to send them in full
+MAX_INLINE_ROWS = 20
+
+# Transactions per notification when sent by id, well within the size limit
+IDS_PER_NOTIFICATION = 500
+DELETED_PER_NOTIFICATION = 150
+
+TRIGGERS = {
+    'INSERT': 'REFERENCING NEW TABLE AS new_rows',
+    'UPDATE': 'REFERENCING NEW TABLE AS new_rows',
+    'DELETE': 'REFERENCING OLD TABLE AS old_rows',
+}
+
+
+def upgrade() -> None:
+    op.execute(
+        f"""
+        CREATE FUNCTION transaction_events_notify() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            event_kind text := CASE TG_OP WHEN 'INSERT' THEN 'created' ELSE 'updated' END;
+            event text;
+        BEGIN
+            IF current_setting('app.transaction_events', true) = 'off' THEN
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP = 'DELETE' THEN
+                PERFORM pg_notify(
+                    '{CHANNEL}',
+                    json_build_object(
+                        'kind', 'deleted',
+                        'transactions', json_agg(
+                            json_build_object('id', id, 'category_id', category_id) ORDER BY id
+                        )
+                    )::text
+                )
+                FROM (
+                    SELECT id, category_id,
+                        (row_number() OVER (ORDER BY id) - 1) / {DELETED_PER_NOTIFICATION} AS chunk
+                    FROM old_rows
+                ) AS chunks
+                GROUP BY chunk
+                ORDER BY chunk;
+                RETURN NULL;
+            END IF;
+
+            IF (SELECT count(*) FROM (SELECT FROM new_rows LIMIT {MAX_INLINE_ROWS + 1}) AS rows)
+                <= {MAX_INLINE_ROWS}
+            THEN
+                SELECT json_build_object(
+                    'kind', event_kind,
+                    'transactions', json_agg(
+                        json_build_object(
+                            'id', id,
+                            'created_at', created_at,
+                            'updated_at', updated_at,
+                            'name', name,
+                            'description', description,
+                            'value', CAST(value AS text),
+                            'category_id', category_id
+                        )
+                        ORDER BY id
+                    )
+                )::text
+                INTO event
+                FROM new_rows
+                HAVING count(*) > 0;
+                IF event IS NULL THEN
+                    RETURN NULL;
+                END IF;
+                IF octet_length(event) <= {MAX_NOTIFICATION_SIZE} THEN
+                    PERFORM pg_notify('{CHANNEL}', event);
+                    RETURN NULL;
+                END IF;
+            END IF;
+
+            PERFORM pg_notify(
+                '{CHANNEL}',
+                json_build_object(
+                    'kind', event_kind, 'ids', json_agg(id ORDER BY id), 'partial', true
+                )::text
+            )
+            FROM (
+                SELECT id, (row_number() OVER (ORDER BY id) - 1) / {IDS_PER_NOTIFICATION} AS chunk
+                FROM new_rows
+            ) AS chunks
+            GROUP BY chunk
+            ORDER BY chunk;
+            RETURN NULL;
+        END;
+        $$
+        """
+    )
+    for operation, transition_table in TRIGGERS.items():
+        op.execute(
+            f"""
+            CREATE TRIGGER transactions_events_{operation.lower()}
+            AFTER {operation} ON transactions {transition_table}
+            FOR EACH STATEMENT EXECUTE FUNCTION transaction_events_notify()
+            """
+        )
+
+
+def downgrade() -> None:
+    for operation in reversed(TRIGGERS):
+        op.execute(f'DROP TRIGGER transactions_events_{operation.lower()} ON transactions')
+    op.execute('DROP FUNCTION transaction_events_notify()')
@@ -0,0 +1,58 @@
+"""ordering indexes
+
+Revision ID: d3a7c9e2f5b1
+Revises: 8e1f0b6a2c47
+Create Date: 2026-10-16 23:58:00.000000
+
+Indexes backing the orderings exposed by the GraphQL API, with the id as tie-breaker
+for the keyset pagination, and the `(category_id, created_at)` composite used by the
+per-category time series. The `(category_id, id)` index serves both the category_id
+ordering and the transactions of a category. The descriptions are unbounded text, too
+long for btree entries, so the description ordering has no index.
+
+They are built with CONCURRENTLY, which cannot run inside a transaction, so each one
+runs in an autocommit block and does not lock the tables against writes.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a7c9e2f5b1'
+down_revision: Union[str, None] = '8e1f0b6a2c47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_transactions_category_id_created_at', 'transactions', ['category_id', 'created_at']),
+    ('ix_transactions_category_id_id', 'transactions', ['category_id', 'id']),
+    ('ix_transactions_created_at_id', 'transactions', ['created_at', 'id']),
+    ('ix_transactions_updated_at_id', 'transactions', ['updated_at', 'id']),
+    ('ix_transactions_value_id', 'transactions', ['value', 'id']),
+    ('ix_categories_created_at_id', 'categories', ['created_at', 'id']),
+    ('ix_categories_updated_at_id', 'categories', ['updated_at', 'id']),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,72 @@
+"""transaction search
+
+Revision ID: f7b2d4e8a913
+Revises: d3a7c9e2f5b1
+Create Date: 2026-10-17 00:10:00.000000
+
+Full-text and fuzzy search of the transactions. `search_vector` is a stored generated
+`tsvector` over the name and the description, with the `simple` configuration so that
+prefixes match the words as typed, indexed with GIN. The `pg_trgm` indexes serve the
+typo-tolerant matching of the names and the `ILIKE` of the `contains` filters.
+
+Adding a stored generated column rewrites the table, the indexes are then built with
+CONCURRENTLY in an autocommit block so they do not lock the table against writes.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7b2d4e8a913'
+down_revision: Union[str, None] = 'd3a7c9e2f5b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_transactions_search_vector', ['search_vector'], {}),
+    ('ix_transactions_name_trgm', ['name'], {'name': 'gin_trgm_ops'}),
+    ('ix_transactions_description_trgm', ['description'], {'description': 'gin_trgm_ops'}),
+]
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column(
+        'transactions',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, ''))",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    with op.get_context().autocommit_block():
+        for name, columns, ops in INDEXES:
+            op.create_index(
+                name,
+                'transactions',
+                columns,
+                postgresql_using='gin',
+                postgresql_ops=ops,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name='transactions',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+    op.drop_column('transactions', 'search_vector')
+    # pg_trgm is left installed, other objects of the database may use it
@@ -0,0 +1,5 @@
+"""Benchmarks for the Finance API.
+
+The benchmarks drive the application in-process and need a reachable PostgreSQL
+database configured through the same environment variables as the API.
+"""
@@ -0,0 +1,99 @@
+"""Measure the import time of the API and the latency of its first requests.
+
+Every run starts a fresh interpreter, like a new pod would: it imports `src.main`, runs
+the lifespan startup, then sends the same GraphQL operation twice. The runs are done
+without the connection pool warm-up and with `--warmup-connections` connections, and
+the medians are reported.
+
+Usage:
+    python -m benchmarks.cold_start --runs 5 --warmup-connections 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from asgi_lifespan import LifespanManager
+
+OPERATION = """
+query firstPage {
+  transactions(limit: 10) {
+    items { id name value category { name } }
+  }
+}
+"""
+
+MEASURES = ("import", "startup", "first_request", "second_request")
+
+
+async def _send_requests(app: object) -> tuple[float, float, float]:
+    """Start the app and send the operation twice.
+
+    Returns when the app was ready and when each response was received.
+    """
+    async with LifespanManager(app) as manager:  # type: ignore[arg-type]
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=manager.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post("/graphql", json={"query": OPERATION})
+            first = time.perf_counter()
+            await client.post("/graphql", json={"query": OPERATION})
+            second = time.perf_counter()
+    return ready, first, second
+
+
+def measure() -> dict[str, float]:
+    """Time the import, the startup and the first two requests, in milliseconds."""
+    started = time.perf_counter()
+    from src.main import app
+
+    imported = time.perf_counter()
+    ready, first, second = asyncio.run(_send_requests(app))
+    return {
+        "import": (imported - started) * 1000,
+        "startup": (ready - imported) * 1000,
+        "first_request": (first - ready) * 1000,
+        "second_request": (second - first) * 1000,
+    }
+
+
+def run(runs: int, warmup_connections: int) -> dict[str, float]:
+    """Measure `runs` fresh interpreters and return the median of each measure."""
+    env = {**os.environ, "DB_POOL_WARMUP_CONNECTIONS": str(warmup_connections)}
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.cold_start", "--child"],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: statistics.median(result[key] for result in results) for key in MEASURES}
+
+
+def main(runs: int, warmup_connections: int) -> None:
+    """Compare the cold starts without and with the pool warm-up."""
+    print(f"{'warm-up':<10}" + "".join(f"{key + ' ms':>20}" for key in MEASURES))
+    for connections in (0, warmup_connections):
+        medians = run(runs, connections)
+        print(f"{connections:<10}" + "".join(f"{medians[key]:>20.1f}" for key in MEASURES))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup-connections", type=int, default=2)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+    if arguments.child:
+        print(json.dumps(measure()))
+    else:
+        main(arguments.runs, arguments.warmup_connections)
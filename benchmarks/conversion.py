@@ -0,0 +1,94 @@
+"""Micro-benchmark of the compiled converters against the previous `as_dict` conversion.
+
+Each iteration builds the GraphQL types of a page of in-memory transactions, then
+encodes the page as a response with the standard library and, when it is installed,
+with orjson. No database connection is needed.
+
+Usage:
+    python -m benchmarks.conversion --records 500 --iterations 200
+"""
+
+import argparse
+import json
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable
+
+from src.graphql_app.converters import convert_records, orjson
+from src.graphql_app.types import Transaction
+from src.sql_app import models
+
+
+def build_records(count: int) -> list[models.TransactionModel]:
+    """Build transactions as if they were loaded from the database."""
+    now = datetime(2024, 1, 1)
+    return [
+        models.TransactionModel(
+            id=index,
+            name=f"transaction-{index}",
+            description=f"description of the transaction {index}" if index % 2 else None,
+            value=Decimal(index) / 100,
+            category_id=index % 50,
+            created_at=now + timedelta(minutes=index),
+            updated_at=now + timedelta(minutes=index),
+        )
+        for index in range(count)
+    ]
+
+
+def build_response(items: list[Transaction]) -> dict[str, Any]:
+    """Build the response of a page of transactions, as sent to the client."""
+    return {
+        "data": {
+            "transactions": {
+                "items": [
+                    {
+                        "id": item.id,
+                        "createdAt": item.created_at.isoformat(),
+                        "updatedAt": item.updated_at.isoformat(),
+                        "name": item.name,
+                        "description": item.description,
+                        "value": float(item.value),
+                        "categoryId": item.category_id,
+                    }
+                    for item in items
+                ]
+            }
+        }
+    }
+
+
+def time_call(function: Callable[[], object], iterations: int) -> float:
+    """Get the best time of a call in microseconds."""
+    return min(timeit.repeat(function, number=iterations, repeat=5)) / iterations * 1e6
+
+
+def main(records: int, iterations: int) -> None:
+    """Time both conversions and both encoders and print the cost per page."""
+    transactions = build_records(records)
+    print(f"{'step':<24}{'us/page':>12}")
+    legacy = time_call(
+        lambda: [Transaction(**transaction.as_dict()) for transaction in transactions],
+        iterations,
+    )
+    print(f"{'convert as_dict':<24}{legacy:>12.1f}")
+    compiled = time_call(lambda: convert_records(transactions, Transaction), iterations)
+    print(f"{'convert compiled':<24}{compiled:>12.1f}")
+
+    response = build_response(convert_records(transactions, Transaction))
+    encoded = time_call(lambda: json.dumps(response), iterations)
+    print(f"{'encode json':<24}{encoded:>12.1f}")
+    if orjson is None:
+        print(f"{'encode orjson':<24}{'not installed':>12}")
+        return
+    encoded = time_call(lambda: orjson.dumps(response), iterations)
+    print(f"{'encode orjson':<24}{encoded:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=500)
+    parser.add_argument("--iterations", type=int, default=200)
+    arguments = parser.parse_args()
+    main(arguments.records, arguments.iterations)
@@ -0,0 +1,89 @@
+"""Micro-benchmark of the filter compiler against the previous per-call filter interpreter.
+
+Each iteration turns the same filter structure, with varying values, into a select
+statement and generates its SQLAlchemy cache key, which is what happens on every
+execution. No database connection is needed.
+
+Usage:
+    python -m benchmarks.filters --iterations 20000
+"""
+
+import argparse
+import operator
+import re
+import timeit
+from typing import Any
+
+from sqlalchemy import or_, select
+
+from src.graphql_app.helpers import build_where_statements
+from src.sql_app import models
+
+
+def legacy_aggregate_filters(filters: dict[str, Any] | None, table: Any) -> list[Any]:
+    """Interpret the filters like `aggregate_filters` did before the filter compiler."""
+    where_statements = []
+    if filters is not None:
+        for table_column, value in filters.items():
+            table_column = re.compile(r"(?<!^)(?=[A-Z])").sub("_", table_column).lower()
+            ops = {
+                "gt": operator.gt,
+                "lt": operator.lt,
+                "ge": operator.ge,
+                "le": operator.le,
+                "eq": operator.eq,
+                "ne": operator.ne,
+            }
+            for comparison_operator, comparison_value in value.items():
+                if comparison_operator == "in":
+                    expression = getattr(table, table_column).in_(comparison_value)
+                elif comparison_operator == "contains":
+                    expression = getattr(table, table_column).ilike(f"%{comparison_value}%")
+                else:
+                    expression = ops[comparison_operator](
+                        getattr(table, table_column), comparison_value
+                    )
+                where_statements.append(expression)
+    return where_statements
+
+
+def filters_for(iteration: int) -> tuple[dict[str, Any], dict[str, Any]]:
+    """Build filters with the same structure and different values."""
+    return (
+        {"value": {"gt": iteration % 100, "le": 1000}, "categoryId": {"in": [1, 2, iteration]}},
+        {"name": {"contains": f"coffee-{iteration}"}, "description": {"eq": "daily"}},
+    )
+
+
+def run_legacy(iteration: int) -> None:
+    """Build the statement with the previous interpreter."""
+    filters, subfilters = filters_for(iteration)
+    and_filters = legacy_aggregate_filters(filters, models.TransactionModel)
+    or_filters = legacy_aggregate_filters(subfilters, models.TransactionModel)
+    query = select(models.TransactionModel).where(*and_filters).filter(or_(*or_filters))
+    query._generate_cache_key()
+
+
+def run_compiled(iteration: int) -> None:
+    """Build the statement with the filter compiler."""
+    filters, subfilters = filters_for(iteration)
+    where_statements, _ = build_where_statements(filters, subfilters, models.TransactionModel)
+    query = select(models.TransactionModel).where(*where_statements)
+    query._generate_cache_key()
+
+
+def main(iterations: int) -> None:
+    """Time both implementations and print the cost per call."""
+    print(f"{'implementation':<16}{'us/call':>10}")
+    for name, function in (("legacy", run_legacy), ("compiled", run_compiled)):
+        counter = iter(range(iterations * 2))
+        elapsed = min(
+            timeit.repeat(lambda: function(next(counter)), number=iterations // 5, repeat=5)
+        )
+        print(f"{name:<16}{elapsed / (iterations // 5) * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    main(parser.parse_args().iterations)
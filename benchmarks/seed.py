@@ -0,0 +1,92 @@
+"""Seed the database with a synthetic dataset for the benchmarks.
+
+Values follow a log-normal distribution, like real spending, and categories are picked
+with a Zipf-like skew, so a few categories hold most of the transactions. Creation dates
+are spread over the last `--days` days with more activity on weekends. The rows are
+loaded with COPY and the same seed always generates the same dataset.
+
+Usage:
+    python -m benchmarks.seed --categories 50 --transactions 100000 --seed 42
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from src.sql_app.session_manager import dispose_engines, get_crud_session_factory
+
+DESCRIPTIONS = [None, "card payment", "transfer", "subscription", "cash withdrawal", "refund"]
+
+
+def generate_transactions(
+    rng: random.Random, category_ids: list[int], count: int, days: int
+) -> list[tuple[str, str | None, float, int, datetime, datetime]]:
+    """Generate the transactions rows."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    weights = [1 / rank for rank in range(1, len(category_ids) + 1)]
+    categories = rng.choices(category_ids, weights=weights, k=count)
+    rows = []
+    for index, category_id in enumerate(categories):
+        created_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        if created_at.weekday() < 5 and rng.random() < 0.3:
+            created_at += timedelta(days=5 - created_at.weekday())
+        created_at = min(created_at, now)
+        value = round(rng.lognormvariate(3.0, 1.1), 2)
+        rows.append(
+            (
+                f"transaction-{index:09d}",
+                rng.choice(DESCRIPTIONS),
+                value,
+                category_id,
+                created_at,
+                created_at,
+            )
+        )
+    return rows
+
+
+async def seed(categories: int, transactions: int, days: int, seed: int) -> None:
+    """Replace the content of the database with the synthetic dataset."""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    async with get_crud_session_factory()() as sess:
+        await sess.execute(
+            text("TRUNCATE transactions, categories, transaction_daily_summary RESTART IDENTITY")
+        )
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        connection = await sess.connection()
+        driver_connection = (await connection.get_raw_connection()).driver_connection
+        await driver_connection.copy_records_to_table(  # type: ignore[union-attr]
+            "categories",
+            records=[(f"category-{index:04d}", now, now) for index in range(categories)],
+            columns=["name", "created_at", "updated_at"],
+        )
+        category_ids = list(range(1, categories + 1))
+        await driver_connection.copy_records_to_table(  # type: ignore[union-attr]
+            "transactions",
+            records=generate_transactions(rng, category_ids, transactions, days),
+            columns=["name", "description", "value", "category_id", "created_at", "updated_at"],
+        )
+        await sess.commit()
+        await sess.execute(text("ANALYZE transactions"))
+        await sess.execute(text("ANALYZE categories"))
+        await sess.commit()
+    await dispose_engines()
+    print(
+        f"Seeded {categories} categories and {transactions} transactions "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    arguments = parser.parse_args()
+    asyncio.run(seed(arguments.categories, arguments.transactions, arguments.days, arguments.seed))
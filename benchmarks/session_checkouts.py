@@ -0,0 +1,112 @@
+"""Measure the number of pooled connection checkouts per GraphQL request.
+
+The same multi-root-field operation is sent in-process to the API twice: once with the
+request-scoped sessions of `Context.db_session`, and once with a stand-in for the previous
+behaviour, where every `db_session` call built a new session factory and session.
+
+Usage:
+    python -m benchmarks.session_checkouts --requests 50
+"""
+
+import argparse
+import asyncio
+import time
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.graphql_app.miscellanious import Context
+from src.main import app
+from src.sql_app.session_manager import dispose_engines, get_crud_engine, get_replica_router
+
+OPERATION = """
+query dashboard {
+  latest: transactions(limit: 5, ordering: {field: created_at, direction: DESC}) {
+    items { id name value category { name } }
+    totalItemsCount
+  }
+  biggest: transactions(limit: 5, ordering: {field: value, direction: DESC}) {
+    items { id name value }
+  }
+  categories(limit: 10) {
+    items { id name transactions { id } }
+  }
+  transactionsConnection(first: 5) {
+    edges { cursor node { id } }
+  }
+}
+"""
+
+
+@asynccontextmanager
+async def per_call_db_session(
+    self: Context, read_only: bool = True
+) -> AsyncGenerator[AsyncSession, None]:
+    """Open a new session factory and session for every call, like the previous context did."""
+    factory = async_sessionmaker(
+        get_replica_router().replicas[0].engine if read_only else get_crud_engine(),
+        expire_on_commit=False,
+        class_=AsyncSession,
+        autoflush=False,
+    )
+    async with factory() as sess:
+        await sess.begin()
+        yield sess
+
+
+class CheckoutCounter:
+    """Count the pool checkouts of the API engines."""
+
+    def __init__(self) -> None:
+        """Register the pool listeners."""
+        self.checkouts = 0
+        for engine in {
+            get_crud_engine(),
+            *[replica.engine for replica in get_replica_router().replicas],
+        }:
+            event.listen(engine.sync_engine.pool, "checkout", self._on_checkout)
+
+    def _on_checkout(self, *args: object) -> None:
+        self.checkouts += 1
+
+
+async def run(requests: int, counter: CheckoutCounter) -> tuple[float, float]:
+    """Send the operation `requests` times and return checkouts per request and elapsed time."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/graphql", json={"query": OPERATION})
+        counter.checkouts = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = await client.post("/graphql", json={"query": OPERATION})
+            response.raise_for_status()
+        elapsed = time.perf_counter() - started
+    return counter.checkouts / requests, elapsed
+
+
+async def main(requests: int) -> None:
+    """Compare the request-scoped sessions with the per-call sessions."""
+    counter = CheckoutCounter()
+    scoped = await run(requests, counter)
+
+    request_scoped_db_session = Context.db_session
+    Context.db_session = per_call_db_session  # type: ignore[assignment]
+    try:
+        per_call = await run(requests, counter)
+    finally:
+        Context.db_session = request_scoped_db_session  # type: ignore[method-assign]
+
+    print(f"{'mode':<16}{'checkouts/request':>20}{'ms/request':>14}")
+    for mode, (checkouts, elapsed) in (("per-call", per_call), ("request-scoped", scoped)):
+        print(f"{mode:<16}{checkouts:>20.2f}{elapsed / requests * 1000:>14.2f}")
+
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    asyncio.run(main(parser.parse_args().requests))
@@ -0,0 +1,340 @@
+"""In-process load benchmark of the GraphQL API.
+
+Representative operations are sent to `src.main:app` over ASGI, one operation at a time
+with `--concurrency` requests in flight. For each operation the suite reports the
+throughput, the p50/p95/p99 latencies and the SQL statements per request, and writes
+them as JSON. Pass the JSON of a previous run as `--baseline` to print the differences.
+
+Run `python -m benchmarks.seed` first: the operations expect the seeded dataset.
+
+Usage:
+    python -m benchmarks.suite --requests 200 --concurrency 8 --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any
+
+import httpx
+from asgi_lifespan import LifespanManager
+from sqlalchemy import event
+
+from src.main import app
+from src.sql_app.session_manager import get_crud_engine, get_replica_router
+
+Variables = dict[str, Any]
+
+
+@dataclass
+class Operation:
+    """A GraphQL operation and the generator of its variables."""
+
+    name: str
+    query: str
+    variables: Callable[[random.Random, dict[str, Any]], Variables] = lambda rng, state: {}
+    after: Callable[[dict[str, Any], dict[str, Any]], None] = lambda response, state: None
+
+
+@dataclass
+class OperationResult:
+    """Measurements of one operation."""
+
+    requests: int
+    errors: int
+    throughput: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    statements_per_request: float
+    latencies_ms: list[float] = field(default_factory=list, repr=False)
+
+
+def _store(key: str, path: list[str]) -> Callable[[dict[str, Any], dict[str, Any]], None]:
+    """Store the value at `path` of the response data under `key` of the shared state."""
+
+    def after(response: dict[str, Any], state: dict[str, Any]) -> None:
+        value: Any = response.get("data")
+        for part in path:
+            value = value[part] if value is not None else None
+        if value is not None:
+            state.setdefault(key, []).append(value)
+
+    return after
+
+
+def _pop(state: dict[str, Any], key: str) -> Any:
+    """Take a value stored by a previous operation."""
+    return state[key].pop() if state.get(key) else 0
+
+
+OPERATIONS = [
+    Operation(
+        "deep_offset_pagination",
+        """{
+          transactions(limit: 50, offset: 1000, ordering: {field: created_at, direction: DESC}) {
+            items { id name value createdAt }
+          }
+        }""",
+    ),
+    Operation(
+        "keyset_pagination",
+        """query ($after: String) {
+          transactionsConnection(
+            first: 50, after: $after, ordering: {field: created_at, direction: DESC}
+          ) {
+            edges { node { id name value createdAt } }
+            pageInfo { endCursor }
+          }
+        }""",
+        lambda rng, state: {"after": (state.get("cursors") or [None])[-1]},
+        _store("cursors", ["transactionsConnection", "pageInfo", "endCursor"]),
+    ),
+    Operation(
+        "filtered_list",
+        """query ($filters: JSON) {
+          transactions(limit: 20, filters: $filters, ordering: {field: value, direction: DESC}) {
+            items { id name value categoryId }
+            totalItemsCount
+          }
+        }""",
+        lambda rng, state: {
+            "filters": {
+                "value": {"gt": rng.randint(10, 200)},
+                "categoryId": {"in": rng.sample(range(1, 11), 3)},
+            }
+        },
+    ),
+    Operation(
+        "nested_category_transactions",
+        """{
+          categories(limit: 10) {
+            items { id name transactions { id value } }
+          }
+        }""",
+    ),
+    Operation(
+        "monthly_aggregates",
+        """{
+          aggregates(groupBy: MONTH, metrics: [SUM, COUNT]) { period sum count }
+        }""",
+    ),
+    Operation(
+        "create_category",
+        """mutation ($name: String!) { createCategory(name: $name) { id } }""",
+        lambda rng, state: {"name": f"bench-{rng.getrandbits(64):x}"},
+        _store("categories", ["createCategory", "id"]),
+    ),
+    Operation(
+        "create_transaction",
+        """mutation ($name: String!, $value: Float!) {
+          createTransaction(name: $name, value: $value, categoryName: "category-0000") { id }
+        }""",
+        lambda rng, state: {"name": f"bench-{rng.getrandbits(64):x}", "value": 12.5},
+        _store("transactions", ["createTransaction", "id"]),
+    ),
+    Operation(
+        "create_transactions_batch",
+        """mutation ($input: [TransactionInput!]!) {
+          createTransactions(input: $input) { index error }
+        }""",
+        lambda rng, state: {
+            "input": [
+                {
+                    "name": f"bench-{rng.getrandbits(64):x}",
+                    "value": 3.5,
+                    "categoryName": "category-0001",
+                }
+                for _ in range(50)
+            ]
+        },
+    ),
+    Operation(
+        "update_transaction_description",
+        """mutation ($id: Int!) {
+          updateTransactionDescription(transactionId: $id, description: "benchmark") { id }
+        }""",
+        lambda rng, state: {"id": rng.choice(state.get("transactions") or [1])},
+    ),
+    Operation(
+        "update_transaction_category",
+        """mutation ($id: Int!, $categoryId: Int!) {
+          updateTransactionCategory(transactionId: $id, categoryId: $categoryId) { id }
+        }""",
+        lambda rng, state: {
+            "id": rng.choice(state.get("transactions") or [1]),
+            "categoryId": rng.randint(1, 10),
+        },
+    ),
+    Operation(
+        "delete_transaction",
+        """mutation ($id: Int!) { deleteTransaction(transactionId: $id) { success } }""",
+        lambda rng, state: {"id": _pop(state, "transactions")},
+    ),
+    Operation(
+        "delete_category",
+        """mutation ($id: Int!) { deleteCategory(categoryId: $id) { success } }""",
+        lambda rng, state: {"id": _pop(state, "categories")},
+    ),
+]
+
+
+class StatementCounter:
+    """Count the SQL statements executed by the API engines."""
+
+    def __init__(self) -> None:
+        """Register the engine listeners."""
+        self.statements = 0
+        for engine in {
+            get_crud_engine(),
+            *[replica.engine for replica in get_replica_router().replicas],
+        }:
+            event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args: object) -> None:
+        self.statements += 1
+
+
+def _percentile(latencies: list[float], percentile: int) -> float:
+    """Get a percentile of the latencies."""
+    if len(latencies) < 2:
+        return latencies[0] if latencies else 0.0
+    return statistics.quantiles(latencies, n=100, method="inclusive")[percentile - 1]
+
+
+async def run_operation(
+    client: httpx.AsyncClient,
+    operation: Operation,
+    requests: int,
+    concurrency: int,
+    counter: StatementCounter,
+    rng: random.Random,
+    state: dict[str, Any],
+) -> OperationResult:
+    """Send the operation `requests` times with `concurrency` requests in flight."""
+    latencies: list[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send() -> None:
+        nonlocal errors
+        async with semaphore:
+            payload = {"query": operation.query, "variables": operation.variables(rng, state)}
+            started = time.perf_counter()
+            response = await client.post("/graphql", json=payload)
+            latencies.append((time.perf_counter() - started) * 1000)
+            body = response.json()
+            if response.status_code != 200 or body.get("errors"):
+                errors += 1
+            operation.after(body, state)
+
+    counter.statements = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(send() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    return OperationResult(
+        requests=requests,
+        errors=errors,
+        throughput=requests / elapsed,
+        p50_ms=_percentile(latencies, 50),
+        p95_ms=_percentile(latencies, 95),
+        p99_ms=_percentile(latencies, 99),
+        statements_per_request=counter.statements / requests,
+        latencies_ms=latencies,
+    )
+
+
+def _git_revision() -> str | None:
+    """Get the commit the benchmark runs on."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: dict[str, OperationResult], baseline: dict[str, Any] | None) -> None:
+    """Print the results, with the change of the p95 latency against the baseline."""
+    print(
+        f"{'operation':<32}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'stmts':>8}{'errors':>8}{'p95 vs base':>13}"
+    )
+    for name, result in results.items():
+        previous = (baseline or {}).get("results", {}).get(name)
+        delta = (
+            f"{(result.p95_ms / previous['p95_ms'] - 1) * 100:+.1f}%"
+            if previous and previous["p95_ms"]
+            else "-"
+        )
+        print(
+            f"{name:<32}{result.throughput:>10.1f}{result.p50_ms:>10.2f}{result.p95_ms:>10.2f}"
+            f"{result.p99_ms:>10.2f}{result.statements_per_request:>8.1f}{result.errors:>8}"
+            f"{delta:>13}"
+        )
+
+
+async def main(
+    requests: int, concurrency: int, seed: int, output: str | None, baseline: str | None
+) -> None:
+    """Run every operation and report the results."""
+    counter = StatementCounter()
+    rng = random.Random(seed)
+    state: dict[str, Any] = {}
+    results: dict[str, OperationResult] = {}
+
+    async with LifespanManager(app) as manager:
+        transport = httpx.ASGITransport(app=manager.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for operation in OPERATIONS:
+                # Warm up the caches and the connection pools
+                await run_operation(
+                    client, operation, concurrency, concurrency, counter, rng, state
+                )
+                results[operation.name] = await run_operation(
+                    client, operation, requests, concurrency, counter, rng, state
+                )
+
+    report = {
+        "revision": _git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "parameters": {"requests": requests, "concurrency": concurrency, "seed": seed},
+        "results": {
+            name: {key: value for key, value in asdict(result).items() if key != "latencies_ms"}
+            for name, result in results.items()
+        },
+    }
+    previous = None
+    if baseline is not None:
+        with open(baseline) as file:
+            previous = json.load(file)
+    print_report(results, previous)
+    if output is not None:
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare with.")
+    arguments = parser.parse_args()
+    asyncio.run(
+        main(
+            arguments.requests,
+            arguments.concurrency,
+            arguments.seed,
+            arguments.output,
+            arguments.baseline,
+        )
+    )
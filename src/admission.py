@@ -0,0 +1,260 @@
+"""Admission control of the GraphQL operations.
+
+Each worker runs at most as many reads, and as many mutations, as its connection pools
+hold connections, so operations wait in front of the API instead of inside the pools.
+Reads and mutations wait in separate bounded queues: when a queue is full, or when an
+operation waited more than `ADMISSION_QUEUE_TIMEOUT` seconds, the operation is shed with
+a 503 response and a `Retry-After` header. Clients sending more operations than their
+token bucket allows are answered with a 429 response when `RATE_LIMIT_ENABLED` is set.
+"""
+
+import asyncio
+import json
+import math
+import re
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, MutableMapping
+from dataclasses import asdict, dataclass
+from functools import cache
+from typing import Any
+
+from graphql import OperationType, get_operation_ast
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from src.config import settings
+from src.graphql_app.miscellanious import get_client_id
+from src.graphql_app.persisted_queries import document_cache
+from src.sql_app.session_manager import pool_capacity
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+MUTATION_PATTERN = re.compile(r"(?:^|[}\s])mutation\b")
+
+
+@dataclass
+class AdmissionStats:
+    """Counters of an admission queue."""
+
+    admitted: int = 0
+    queued: int = 0
+    shed: int = 0
+
+
+class AdmissionQueue:
+    """Limit the operations running concurrently, the others waiting in a bounded queue."""
+
+    def __init__(self, capacity: int, max_waiting: int, timeout: float) -> None:
+        """Initialize the queue."""
+        self.capacity = capacity
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.running = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(capacity)
+        self._stats = AdmissionStats()
+
+    async def acquire(self) -> bool:
+        """Wait for a slot, returning False when the operation is shed."""
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+        elif self.waiting >= self.max_waiting:
+            self._stats.shed += 1
+            return False
+        else:
+            self.waiting += 1
+            self._stats.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+            except TimeoutError:
+                self._stats.shed += 1
+                return False
+            finally:
+                self.waiting -= 1
+        self.running += 1
+        self._stats.admitted += 1
+        return True
+
+    def release(self) -> None:
+        """Free the slot of a finished operation."""
+        self.running -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict[str, int]:
+        """Get the counters and the current load."""
+        return {
+            **asdict(self._stats),
+            "capacity": self.capacity,
+            "running": self.running,
+            "waiting": self.waiting,
+        }
+
+
+class TokenBuckets:
+    """Per-client token buckets, the least recently seen clients being forgotten first."""
+
+    def __init__(self, rate: float, burst: int, max_clients: int) -> None:
+        """Initialize the buckets."""
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, client_id: str) -> float:
+        """Take a token from the bucket of the client.
+
+        Returns 0 when a token was taken, else the seconds until one is available.
+        """
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(client_id, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated_at) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[client_id] = (tokens, now)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+@cache
+def get_admission_queues() -> dict[str, AdmissionQueue]:
+    """Get the queues of the reads and of the writes, sized to the pools of the worker."""
+    return {
+        "reads": AdmissionQueue(
+            settings.ADMISSION_MAX_READS or pool_capacity(read_only=True),
+            settings.ADMISSION_READ_QUEUE_SIZE,
+            settings.ADMISSION_QUEUE_TIMEOUT,
+        ),
+        "writes": AdmissionQueue(
+            settings.ADMISSION_MAX_WRITES or pool_capacity(read_only=False),
+            settings.ADMISSION_WRITE_QUEUE_SIZE,
+            settings.ADMISSION_QUEUE_TIMEOUT,
+        ),
+    }
+
+
+def is_mutation(payload: Any) -> bool:
+    """Tell whether a GraphQL request payload runs a mutation.
+
+    The operation type is read from the cached document when the query is known, else
+    the query is assumed to be a mutation when it defines one.
+    """
+    if not isinstance(payload, dict):
+        return False
+    query = payload.get("query")
+    extensions = payload.get("extensions")
+    if not isinstance(query, str) and isinstance(extensions, dict):
+        persisted_query = extensions.get("persistedQuery")
+        query_hash = isinstance(persisted_query, dict) and persisted_query.get("sha256Hash")
+        cached = document_cache.get(query_hash) if isinstance(query_hash, str) else None
+        if cached is not None:
+            if cached.document is not None:
+                operation = get_operation_ast(cached.document, payload.get("operationName"))
+                return operation is not None and operation.operation == OperationType.MUTATION
+            query = cached.query
+    return isinstance(query, str) and MUTATION_PATTERN.search(query) is not None
+
+
+class AdmissionMiddleware:
+    """Queue the GraphQL operations by kind and shed them when their queue is saturated.
+
+    Only the requests on `path` are controlled. The requests sent with GET are reads; the
+    body of the POST requests is read to find out the kind of operation, then replayed to
+    the app.
+    """
+
+    def __init__(self, app: ASGIApp, path: str = "/graphql") -> None:
+        """Initialize the middleware."""
+        self.app = app
+        self.path = path
+        self.queues = get_admission_queues()
+        self.buckets = (
+            TokenBuckets(
+                settings.RATE_LIMIT_RATE, settings.RATE_LIMIT_BURST, settings.RATE_LIMIT_MAX_CLIENTS
+            )
+            if settings.RATE_LIMIT_ENABLED
+            else None
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Admit, delay or reject the request."""
+        if scope["type"] != "http" or scope["path"].rstrip("/") != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        if self.buckets is not None:
+            request = Request(scope)
+            # Unidentified clients are rate limited by address
+            address = request.client.host if request.client is not None else "anonymous"
+            wait = self.buckets.take(get_client_id(request) or address)
+            if wait:
+                await self._reject(scope, receive, send, 429, "Too many requests.", wait)
+                return
+
+        if scope["method"] != "POST":
+            queue = self.queues["reads"]
+        else:
+            body, receive = await self._buffer_body(receive)
+            try:
+                payload = json.loads(body) if body else None
+            except ValueError:
+                payload = None
+            queue = self.queues["writes" if is_mutation(payload) else "reads"]
+
+        if not await queue.acquire():
+            await self._reject(
+                scope,
+                receive,
+                send,
+                503,
+                "The server is overloaded, retry later.",
+                settings.ADMISSION_RETRY_AFTER,
+            )
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            queue.release()
+
+    @staticmethod
+    async def _buffer_body(receive: Receive) -> tuple[bytes, Receive]:
+        """Read the whole body, returning it and a `receive` replaying it."""
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        replayed = False
+
+        async def replay() -> Message:
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return body, replay
+
+    @staticmethod
+    async def _reject(
+        scope: Scope, receive: Receive, send: Send, status_code: int, message: str, wait: float
+    ) -> None:
+        """Answer with a GraphQL error and the seconds to wait before retrying."""
+        response = JSONResponse(
+            {"data": None, "errors": [{"message": message}]},
+            status_code=status_code,
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+        await response(scope, receive, send)
@@ -4,7 +4,7 @@ It includes settings and constants that are used throughout the application
 to ensure consistent behavior and configuration management.
 """
 
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -20,7 +20,61 @@ class Config(BaseSettings):
     DB_PASSWORD: str
     DB_HOST: str
     DB_HOST_READ_ONLY: Optional[str] = None
+    DB_READ_REPLICA_HOSTS: list[str] = []
+    DB_REPLICA_MAX_LAG: float = 5.0
+    DB_REPLICA_PROBE_INTERVAL: float = 5.0
+    DB_READ_YOUR_WRITES_WINDOW: float = 5.0
     DB_PORT: int = 5432
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_WARMUP_CONNECTIONS: int = 2
+    DB_MAX_CONNECTIONS: Optional[int] = None
+    DB_COUNT_STRATEGY: Literal["exact", "estimated", "cached"] = "exact"
+    DB_COUNT_CACHE_TTL: float = 30.0
+    DB_COUNT_CACHE_MAX_ENTRIES: int = 1024
+    RESULT_CACHE_ENABLED: bool = False
+    RESULT_CACHE_MAX_ENTRIES: int = 1024
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESULT_CACHE_TTL: float = 5.0
+    GRAPHQL_DOCUMENT_CACHE_SIZE: int = 1000
+    QUERY_COST_ENABLED: bool = True
+    QUERY_COST_BUDGET: int = 20000
+    QUERY_COST_FAN_OUTS: dict[str, int] = {"Category.transactions": 50}
+    QUERY_MAX_LIMIT: int = 500
+    ORJSON_ENABLED: bool = True
+    BULK_INSERT_CHUNK_SIZE: int = 1000
+    IMPORT_COPY_BATCH_SIZE: int = 10000
+    IMPORT_MAX_REPORTED_REJECTS: int = 1000
+    EXPORT_YIELD_PER: int = 1000
+    AGGREGATE_SUMMARY_ENABLED: bool = True
+    SQL_INSTRUMENTATION_ENABLED: bool = True
+    SQL_N_PLUS_ONE_THRESHOLD: int = 10
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORTER: Literal["none", "memory", "file"] = "memory"
+    TRACING_FILE_PATH: str = "traces.jsonl"
+    TRACING_MEMORY_MAX_SPANS: int = 10000
+    SLOW_OPERATION_THRESHOLD: float = 0.5
+    SLOW_OPERATION_SAMPLE_RATE: float = 1.0
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 80
+    SERVER_WORKERS: Optional[int] = None
+    SERVER_TIMEOUT: int = 30
+    SERVER_KEEPALIVE: int = 5
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_READS: Optional[int] = None
+    ADMISSION_MAX_WRITES: Optional[int] = None
+    ADMISSION_READ_QUEUE_SIZE: int = 100
+    ADMISSION_WRITE_QUEUE_SIZE: int = 50
+    ADMISSION_QUEUE_TIMEOUT: float = 2.0
+    ADMISSION_RETRY_AFTER: int = 1
+    RATE_LIMIT_ENABLED: bool = False
+    RATE_LIMIT_RATE: float = 20.0
+    RATE_LIMIT_BURST: int = 40
+    RATE_LIMIT_MAX_CLIENTS: int = 10000
+    PUBSUB_BACKEND: Literal["memory", "postgres"] = "postgres"
+    PUBSUB_MAX_PENDING_EVENTS: int = 100
 
     model_config = SettingsConfigDict(env_file=".env")
 
@@ -3,20 +3,34 @@
 import strawberry
 from fastapi import APIRouter
 from strawberry.extensions import AddValidationRules, QueryDepthLimiter
-from strawberry.fastapi import GraphQLRouter
 from strawberry.schema.config import StrawberryConfig
 
+from src.config import settings
+from src.graphql_app.cost import QueryCostExtension
+from src.graphql_app.extensions import SQLInstrumentationExtension, TracingExtension
 from src.graphql_app.miscellanious import ValidateQueryParams, get_context
 from src.graphql_app.mutations import Mutation
+from src.graphql_app.persisted_queries import DocumentCacheExtension, PersistedQueryRouter
 from src.graphql_app.queries import Query
+from src.graphql_app.subscriptions import Subscription
 
 schema = strawberry.Schema(
     query=Query,
     mutation=Mutation,
+    subscription=Subscription,
     config=StrawberryConfig(auto_camel_case=True),
-    extensions=[QueryDepthLimiter(3), AddValidationRules([ValidateQueryParams])],
+    extensions=[
+        DocumentCacheExtension,
+        QueryDepthLimiter(3),
+        *([TracingExtension] if settings.TRACING_ENABLED else []),
+        AddValidationRules([ValidateQueryParams]),
+        *([QueryCostExtension] if settings.QUERY_COST_ENABLED else []),
+        *([SQLInstrumentationExtension] if settings.SQL_INSTRUMENTATION_ENABLED else []),
+    ],
 )
 
 
 graphql_router = APIRouter(tags=["GraphQL"])
-graphql_router.include_router(GraphQLRouter(schema, context_getter=get_context), prefix="/graphql")
+graphql_router.include_router(
+    PersistedQueryRouter(schema, context_getter=get_context), prefix="/graphql"
+)
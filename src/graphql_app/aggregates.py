@@ -0,0 +1,140 @@
+"""Core module for the server-side aggregation of the transactions.
+
+Aggregates are computed by a single GROUP BY in Postgres. Unfiltered sums, averages and
+counts can be served from `transaction_daily_summary`, a per category and per day
+rollup kept up to date by the triggers of the `transaction daily summary` migration, so
+they cost O(buckets) instead of O(rows). Minimums and maximums cannot be maintained
+incrementally when rows are deleted, so they are always computed from the transactions.
+"""
+
+from typing import Any, Callable
+
+from sqlalchemy import DateTime, cast, func, literal_column, select
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import ColumnElement
+
+from src.config import settings
+from src.graphql_app import types
+from src.graphql_app.helpers import build_where_statements
+from src.graphql_app.miscellanious import Info
+from src.sql_app import models
+
+METRIC_FUNCTIONS: dict[types.AggregateMetric, Callable[[Any], ColumnElement[Any]]] = {
+    types.AggregateMetric.SUM: func.sum,
+    types.AggregateMetric.AVG: func.avg,
+    types.AggregateMetric.MIN: func.min,
+    types.AggregateMetric.MAX: func.max,
+    types.AggregateMetric.COUNT: lambda _: func.count(),
+}
+
+SUMMARY_METRICS = {
+    types.AggregateMetric.SUM,
+    types.AggregateMetric.AVG,
+    types.AggregateMetric.COUNT,
+}
+
+
+def _group_key(
+    group_by: types.AggregateGroupBy, category_id: Any, timestamp: Any
+) -> ColumnElement[Any]:
+    """Build the grouping expression.
+
+    The truncation unit is rendered inline so the GROUP BY and the select list share the
+    exact same expression.
+    """
+    if group_by is types.AggregateGroupBy.CATEGORY:
+        return category_id
+    return func.date_trunc(literal_column(f"'{group_by.value}'"), timestamp)
+
+
+def build_aggregate_query(
+    group_by: types.AggregateGroupBy,
+    metrics: list[types.AggregateMetric],
+    filters: types.JSON | None = None,
+    subfilters: types.JSON | None = None,
+) -> tuple[Select[Any], dict[str, Any]]:
+    """Build the GROUP BY query over the filtered transactions."""
+    where_statements, params = build_where_statements(filters, subfilters, models.TransactionModel)
+    model = models.TransactionModel
+    key = _group_key(group_by, model.category_id, model.created_at).label("key")
+    query = (
+        select(
+            key, *[METRIC_FUNCTIONS[metric](model.value).label(metric.value) for metric in metrics]
+        )
+        .where(*where_statements)
+        .group_by(key)
+        .order_by(key)
+    )
+    return query, params
+
+
+def build_summary_query(
+    group_by: types.AggregateGroupBy, metrics: list[types.AggregateMetric]
+) -> Select[Any]:
+    """Build the GROUP BY query over the daily summary table."""
+    summary = models.TransactionDailySummaryModel
+    key = _group_key(group_by, summary.category_id, cast(summary.day, DateTime)).label("key")
+    columns = {
+        types.AggregateMetric.SUM: func.sum(summary.total),
+        types.AggregateMetric.COUNT: func.sum(summary.count),
+        types.AggregateMetric.AVG: func.sum(summary.total)
+        / func.nullif(func.sum(summary.count), 0),
+    }
+    return (
+        select(key, *[columns[metric].label(metric.value) for metric in metrics])
+        .group_by(key)
+        .having(func.sum(summary.count) > 0)
+        .order_by(key)
+    )
+
+
+def _use_summary(
+    metrics: list[types.AggregateMetric],
+    filters: types.JSON | None,
+    subfilters: types.JSON | None,
+) -> bool:
+    """Check whether the aggregates can be computed from the daily summary table."""
+    return (
+        settings.AGGREGATE_SUMMARY_ENABLED
+        and not filters
+        and not subfilters
+        and set(metrics) <= SUMMARY_METRICS
+    )
+
+
+def _metric_value(metric: types.AggregateMetric, value: Any) -> int | float | None:
+    """Convert the numeric values returned by Postgres to the GraphQL types."""
+    if value is None:
+        return None
+    return int(value) if metric is types.AggregateMetric.COUNT else float(value)
+
+
+async def build_aggregates(
+    info: Info,
+    group_by: types.AggregateGroupBy,
+    metrics: list[types.AggregateMetric],
+    filters: types.JSON | None = None,
+    subfilters: types.JSON | None = None,
+) -> list[types.AggregateBucket]:
+    """Compute the metrics of the transactions for each group."""
+    params: dict[str, Any] = {}
+    if _use_summary(metrics, filters, subfilters):
+        query = build_summary_query(group_by, metrics)
+    else:
+        query, params = build_aggregate_query(group_by, metrics, filters, subfilters)
+
+    async with info.context.db_session(read_only=True) as sess:
+        rows = (await sess.execute(query, params)).all()
+
+    buckets = []
+    for row in rows:
+        values = row._mapping
+        bucket = types.AggregateBucket(
+            **{metric.value: _metric_value(metric, values[metric.value]) for metric in metrics}
+        )
+        if group_by is types.AggregateGroupBy.CATEGORY:
+            bucket.category_id = values["key"]
+        else:
+            bucket.period = values["key"]
+        buckets.append(bucket)
+    return buckets
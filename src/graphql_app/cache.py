@@ -0,0 +1,144 @@
+"""Core module for the in-process caches of the GraphQL app.
+
+Cache keys embed the version of the tables the cached value was read from. The
+mutations bump the versions of the tables they write to, which makes every entry read
+before the write unreachable; those entries are then evicted by the LRU policy. The
+caches live in the process memory, so each worker keeps its own copy and only sees the
+writes it served: the other workers keep serving their entries until the TTL expires.
+The clients reading their own writes, see `Context.pinned`, skip the caches.
+"""
+
+import sys
+import time
+from collections import OrderedDict, defaultdict
+from collections.abc import Hashable
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from src.config import settings
+
+
+class TableVersions:
+    """Per-table version counters."""
+
+    def __init__(self) -> None:
+        """Initialize every table at version 0."""
+        self._versions: defaultdict[str, int] = defaultdict(int)
+
+    def get(self, *tables: str) -> tuple[int, ...]:
+        """Get the current versions of the tables."""
+        return tuple(self._versions[table] for table in tables)
+
+    def bump(self, *tables: str) -> None:
+        """Increase the versions of the tables, invalidating the entries read from them."""
+        for table in tables:
+            self._versions[table] += 1
+
+
+table_versions = TableVersions()
+
+
+@dataclass
+class CacheStats:
+    """Counters used to tune a cache."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    bytes: int = 0
+
+
+class ResultCache:
+    """LRU cache bounded by number of entries and estimated memory, with a TTL."""
+
+    def __init__(self, max_entries: int, ttl: float, max_bytes: int | None = None) -> None:
+        """Initialize the cache."""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, int, Any]] = OrderedDict()
+        self._stats = CacheStats()
+
+    def get(self, key: Hashable) -> Any | None:
+        """Get the value stored under the key, or None on a miss."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats.misses += 1
+            return None
+        expires_at, size, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self._stats.expirations += 1
+            self._stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, size: int = 0) -> None:
+        """Store the value under the key, evicting the least recently used entries if needed."""
+        if key in self._entries:
+            self._remove(key)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, size, value)
+        self._stats.bytes += size
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self._stats.bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+            self._stats.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._stats.bytes -= size
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self._entries.clear()
+        self._stats.bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        """Get the hit, miss and eviction counters and the current size."""
+        return {**asdict(self._stats), "entries": len(self._entries)}
+
+
+def estimate_size(value: Any) -> int:
+    """Roughly estimate the memory used by a value and the objects it references.
+
+    Containers and objects with a `__dict__` are walked, shared objects are counted once.
+    """
+    seen: set[int] = set()
+    size = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.append(item.__dict__)
+    return size
+
+
+def invalidate_tables(*tables: str) -> None:
+    """Invalidate the cached results and counts read from the tables."""
+    table_versions.bump(*tables)
+
+
+result_cache: ResultCache | None = (
+    ResultCache(
+        max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+        ttl=settings.RESULT_CACHE_TTL,
+        max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+    )
+    if settings.RESULT_CACHE_ENABLED
+    else None
+)
@@ -0,0 +1,138 @@
+"""Core module for the conversion of the database rows to the GraphQL types.
+
+For each model and GraphQL type pair, the fields to copy are resolved once and compiled
+into a constructor that reads the loaded columns straight from the instance dictionary,
+without inspecting the mapper nor going through the dataclass `__init__`. Columns left
+out of the query, e.g. by `load_only`, are set to None, like `as_dict` does, and
+relationships are left to the DataLoaders.
+
+Responses are encoded with orjson when the `orjson` extra is installed and `ORJSON_ENABLED`
+is set, and with the standard library encoder otherwise.
+"""
+
+import dataclasses
+import json
+from collections.abc import Callable, Sequence
+from functools import cache
+from typing import Any, TypeVar
+
+from sqlalchemy import Row, inspect
+
+from src.config import settings
+from src.sql_app.models import Base
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+GraphQLType = TypeVar("GraphQLType")
+
+
+def _compile_constructor(
+    scalar_type: type[GraphQLType], values: dict[str, str], defaults: dict[str, Any]
+) -> Callable[[Any], GraphQLType]:
+    """Compile a function building the type from a record.
+
+    `values` maps each field to the Python expression reading it from `record`, or from
+    `get`, the lookup in the instance dictionary of an ORM record.
+    """
+    assignments = ", ".join(f"{name!r}: {expression}" for name, expression in values.items())
+    reads_dict = any(expression.startswith("get(") for expression in values.values())
+    source = (
+        "def convert(record):\n"
+        + ("    get = record.__dict__.get\n" if reads_dict else "")
+        + "    instance = new(scalar_type)\n"
+        + f"    instance.__dict__ = {{{assignments}}}\n"
+        + "    return instance\n"
+    )
+    namespace: dict[str, Any] = {
+        "new": object.__new__,
+        "scalar_type": scalar_type,
+        "defaults": defaults,
+    }
+    exec(source, namespace)
+    return namespace["convert"]
+
+
+def _data_fields(scalar_type: type[Any]) -> list[dataclasses.Field[Any]]:
+    """Get the fields of the type set by its constructor, i.e. not resolved by a method."""
+    return [field for field in dataclasses.fields(scalar_type) if field.init]
+
+
+def _default(field: dataclasses.Field[Any], defaults: dict[str, Any]) -> str:
+    """Get the expression of the default value of a field that has no column to be read from.
+
+    The default value, or its factory, is added to `defaults`. Raises a TypeError when
+    the field has no default value.
+    """
+    if field.default is not dataclasses.MISSING:
+        defaults[field.name] = field.default
+        return f"defaults[{field.name!r}]"
+    if field.default_factory is not dataclasses.MISSING:
+        defaults[field.name] = field.default_factory
+        return f"defaults[{field.name!r}]()"
+    raise TypeError(f"No column nor default value for the field {field.name}.")
+
+
+@cache
+def build_converter(
+    model: type[Base], scalar_type: type[GraphQLType]
+) -> Callable[[Base], GraphQLType]:
+    """Get the function building the type from an instance of the model."""
+    columns = {column.key for column in inspect(model).column_attrs}
+    values: dict[str, str] = {}
+    defaults: dict[str, Any] = {}
+    for field in _data_fields(scalar_type):
+        if field.name in columns:
+            values[field.name] = f"get({field.name!r})"
+        else:
+            values[field.name] = _default(field, defaults)
+    return _compile_constructor(scalar_type, values, defaults)
+
+
+@cache
+def build_row_converter(
+    keys: tuple[str, ...], scalar_type: type[GraphQLType]
+) -> Callable[[Row[Any]], GraphQLType]:
+    """Get the function building the type from a row with the given column keys.
+
+    Fields without a column in the row are set to their default value, or None like the
+    columns left out of an ORM query.
+    """
+    positions = {key: position for position, key in enumerate(keys)}
+    values: dict[str, str] = {}
+    defaults: dict[str, Any] = {}
+    for field in _data_fields(scalar_type):
+        if field.name in positions:
+            values[field.name] = f"record[{positions[field.name]}]"
+        elif field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING:
+            values[field.name] = "None"
+        else:
+            values[field.name] = _default(field, defaults)
+    return _compile_constructor(scalar_type, values, defaults)
+
+
+def convert_records(
+    records: Sequence[Base] | Sequence[Row[Any]], scalar_type: type[GraphQLType]
+) -> list[GraphQLType]:
+    """Build the type from each ORM instance or row, all of the same model or shape."""
+    if not records:
+        return []
+    first = records[0]
+    if isinstance(first, Row):
+        convert: Callable[[Any], GraphQLType] = build_row_converter(first._fields, scalar_type)
+    else:
+        convert = build_converter(type(first), scalar_type)
+    return [convert(record) for record in records]
+
+
+def encode_json(data: object) -> str:
+    """Encode a response, with orjson when available and enabled.
+
+    Strawberry joins the encoded parts of multipart responses as text, so the orjson
+    output is decoded too.
+    """
+    if orjson is not None and settings.ORJSON_ENABLED:
+        return orjson.dumps(data).decode()
+    return json.dumps(data)
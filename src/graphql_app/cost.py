@@ -0,0 +1,195 @@
+"""Core module for the cost analysis of the GraphQL operations.
+
+The cost of an operation estimates the number of objects, i.e. of rows, it resolves.
+An object field costs one per parent object, or its fan-out estimate from
+`QUERY_COST_FAN_OUTS` per parent object. The `limit` or `first` argument of a paginated
+field multiplies the cost of the fields selected under it. For example
+`categories(limit: 100) { items { transactions { id } } }` costs 1 + 100 + 100 * 50 with
+a fan-out of 50 for `Category.transactions`.
+
+The analysis runs once the document is validated, on every request, because the
+arguments may come from the variables while validated documents are cached.
+"""
+
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from typing import Any
+
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    InlineFragmentNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    Undefined,
+    VariableNode,
+    get_named_type,
+    get_operation_ast,
+    value_from_ast,
+)
+from strawberry.extensions import SchemaExtension
+from strawberry.types import ExecutionResult
+
+from src.config import settings
+from src.graphql_app.miscellanious import check_page_argument
+
+PAGE_SIZE_ARGUMENTS = ("limit", "first")
+
+
+@dataclass
+class CostAnalysis:
+    """Cost of an operation and the errors found while computing it."""
+
+    cost: int = 0
+    errors: list[GraphQLError] = field(default_factory=list)
+
+
+class CostAnalyzer:
+    """Compute the cost of an operation with the values of its variables."""
+
+    def __init__(
+        self,
+        schema: GraphQLSchema,
+        fragments: dict[str, FragmentDefinitionNode],
+        variables: dict[str, Any],
+        fan_outs: dict[str, int],
+        max_limit: int,
+    ) -> None:
+        """Initialize the analyzer of the operations of a document."""
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables
+        self.fan_outs = fan_outs
+        self.max_limit = max_limit
+        self.analysis = CostAnalysis()
+
+    def analyze(self, operation: OperationDefinitionNode) -> CostAnalysis:
+        """Compute the cost of the operation."""
+        root_type = self.schema.get_root_type(operation.operation)
+        if root_type is not None:
+            self.analysis.cost = self._selection_set_cost(operation.selection_set, root_type, 1)
+        return self.analysis
+
+    def _fields(
+        self, selection_set: SelectionSetNode, parent_type: GraphQLObjectType
+    ) -> Iterator[tuple[FieldNode, GraphQLObjectType]]:
+        """Flatten the fragments of the selection set into its fields and their parent type."""
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection, parent_type
+                continue
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment is None:
+                    continue
+                type_condition, nested = fragment.type_condition, fragment.selection_set
+            else:
+                assert isinstance(selection, InlineFragmentNode)
+                type_condition, nested = selection.type_condition, selection.selection_set
+            fragment_type = (
+                self.schema.get_type(type_condition.name.value) if type_condition else parent_type
+            )
+            if isinstance(fragment_type, GraphQLObjectType):
+                yield from self._fields(nested, fragment_type)
+
+    def _selection_set_cost(
+        self, selection_set: SelectionSetNode, parent_type: GraphQLObjectType, multiplier: int
+    ) -> int:
+        """Compute the cost of the fields selected on `multiplier` objects of the type."""
+        cost = 0
+        for node, node_parent_type in self._fields(selection_set, parent_type):
+            definition = node_parent_type.fields.get(node.name.value)
+            if definition is None or node.selection_set is None:
+                continue
+            field_type = get_named_type(definition.type)
+            if not isinstance(field_type, GraphQLObjectType):
+                continue
+            objects, page_size = self._size(node, node_parent_type, definition)
+            cost += multiplier * objects + self._selection_set_cost(
+                node.selection_set, field_type, multiplier * objects * page_size
+            )
+        return cost
+
+    def _size(
+        self, node: FieldNode, parent_type: GraphQLObjectType, definition: GraphQLField
+    ) -> tuple[int, int]:
+        """Estimate the objects per parent of the field and its page size, checking its bounds."""
+        objects = self.fan_outs.get(f"{parent_type.name}.{node.name.value}", 1)
+        page_size = 1
+        for name, argument in definition.args.items():
+            argument_node = next(
+                (candidate for candidate in node.arguments if candidate.name.value == name), None
+            )
+            if argument_node is None:
+                value = argument.default_value
+            else:
+                value = value_from_ast(argument_node.value, argument.type, self.variables)
+            if value is Undefined or not isinstance(value, int):
+                continue
+            # The literal values are already checked by `ValidateQueryParams`
+            if argument_node is not None and isinstance(argument_node.value, VariableNode):
+                message = check_page_argument(name, value)
+                if message is not None:
+                    self.analysis.errors.append(GraphQLError(message, [argument_node]))
+            if name in PAGE_SIZE_ARGUMENTS:
+                if value > self.max_limit:
+                    self.analysis.errors.append(
+                        GraphQLError(
+                            f"The {name} value must be at most {self.max_limit}.",
+                            [argument_node or node],
+                        )
+                    )
+                page_size = max(value, 1)
+        return objects, page_size
+
+
+class QueryCostExtension(SchemaExtension):
+    """Reject the operations above the cost budget and report the cost in the extensions.
+
+    The page size arguments are also capped at `QUERY_MAX_LIMIT`.
+    """
+
+    analysis: CostAnalysis | None = None
+
+    def on_execute(self) -> Iterator[None]:
+        """Compute the cost of the operation, which is not executed if it is rejected."""
+        execution_context = self.execution_context
+        document = execution_context.graphql_document
+        operation = document and get_operation_ast(document, execution_context.operation_name)
+        if document is None or operation is None:
+            yield
+            return
+        fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        self.analysis = CostAnalyzer(
+            execution_context.schema._schema,
+            fragments,
+            execution_context.variables or {},
+            settings.QUERY_COST_FAN_OUTS,
+            settings.QUERY_MAX_LIMIT,
+        ).analyze(operation)
+        if self.analysis.cost > settings.QUERY_COST_BUDGET:
+            self.analysis.errors.append(
+                GraphQLError(
+                    f"The operation costs {self.analysis.cost}, above the budget of "
+                    f"{settings.QUERY_COST_BUDGET}. Request smaller pages or fewer nested fields.",
+                    [operation],
+                )
+            )
+        if self.analysis.errors:
+            execution_context.result = ExecutionResult(data=None, errors=self.analysis.errors)
+        yield
+
+    def get_results(self) -> dict[str, Any]:
+        """Report the cost of the operation."""
+        if self.analysis is None:
+            return {}
+        return {"cost": {"requested": self.analysis.cost, "budget": settings.QUERY_COST_BUDGET}}
@@ -0,0 +1,102 @@
+"""Core module for counting the rows behind the paginated GraphQL types.
+
+Three strategies are available:
+* exact - run a filtered `COUNT(*)`
+* estimated - read the planner row estimate, either from `pg_class.reltuples` for
+  unfiltered queries or from the `EXPLAIN` output of the filtered query
+* cached - run the exact count once and reuse it until the TTL expires or a mutation
+  bumps the version of the table
+"""
+
+import json
+from typing import Any, Sequence, Type
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.compiler import SQLCompiler
+from sqlalchemy.sql.elements import ClauseElement, ColumnElement
+from sqlalchemy.sql.functions import func
+
+from src.config import settings
+from src.graphql_app.cache import ResultCache, table_versions
+from src.sql_app import models
+
+
+class Explain(Executable, ClauseElement):
+    """`EXPLAIN (FORMAT JSON)` wrapper for a SQLAlchemy statement.
+
+    [Reference](https://github.com/sqlalchemy/sqlalchemy/wiki/Query-Plan-SQL-construct)
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement: Executable) -> None:
+        """Wrap the statement to be explained."""
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler: SQLCompiler, **kwargs: Any) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kwargs)
+
+
+count_cache = ResultCache(
+    max_entries=settings.DB_COUNT_CACHE_MAX_ENTRIES, ttl=settings.DB_COUNT_CACHE_TTL
+)
+
+
+async def count_exact(
+    where_statements: Sequence[ColumnElement[bool]],
+    params: dict[str, Any],
+    table: Type[models.TransactionModel] | Type[models.CategoryModel],
+    sess: AsyncSession,
+) -> int:  # pragma: no cover
+    """Count the rows matching the where statements."""
+    query = select(func.count()).select_from(table).where(*where_statements)
+    return (await sess.execute(query, params)).scalar_one()
+
+
+async def count_estimated(
+    where_statements: Sequence[ColumnElement[bool]],
+    params: dict[str, Any],
+    table: Type[models.TransactionModel] | Type[models.CategoryModel],
+    sess: AsyncSession,
+) -> int:  # pragma: no cover
+    """Estimate the rows matching the where statements from the planner statistics.
+
+    Falls back to the exact count when the table has never been analyzed.
+    """
+    if not where_statements:
+        query = text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)")
+        estimate = (await sess.execute(query, {"table": table.__tablename__})).scalar_one()
+        if estimate < 0:
+            return await count_exact(where_statements, params, table, sess)
+        return int(estimate)
+
+    explain = Explain(select(table.id).where(*where_statements))
+    plan = (await sess.execute(explain, params)).scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def count_cached(
+    cache_key: Any,
+    where_statements: Sequence[ColumnElement[bool]],
+    params: dict[str, Any],
+    table: Type[models.TransactionModel] | Type[models.CategoryModel],
+    sess: AsyncSession,
+) -> int:  # pragma: no cover
+    """Count the rows matching the where statements, reusing a cached exact count."""
+    key = (
+        table.__tablename__,
+        table_versions.get(table.__tablename__),
+        json.dumps(cache_key, sort_keys=True, default=str),
+    )
+    total = count_cache.get(key)
+    if total is None:
+        total = await count_exact(where_statements, params, table, sess)
+        count_cache.set(key, total)
+    return total
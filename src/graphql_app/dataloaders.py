@@ -0,0 +1,60 @@
+"""Core module for defining the DataLoaders used by the GraphQL types.
+
+DataLoaders batch and deduplicate the relationship lookups performed by all resolvers
+of a single GraphQL operation, so nested fields cost one query per relationship
+instead of one query per parent row. They are created per request by the context.
+"""
+
+from collections import defaultdict
+from collections.abc import Callable
+from contextlib import AbstractAsyncContextManager
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from strawberry.dataloader import DataLoader, DefaultCache
+
+from src.sql_app import models
+
+SessionGetter = Callable[..., AbstractAsyncContextManager[AsyncSession]]
+
+
+class LoaderCache(DefaultCache):
+    """Cache of a DataLoader whose keys can be cleared whether they were loaded or not."""
+
+    def delete(self, key: int) -> None:
+        """Forget the value of the key, if any."""
+        self.cache_map.pop(self.cache_key_fn(key), None)
+
+
+def build_category_loader(
+    db_session: SessionGetter,
+) -> DataLoader[int, models.CategoryModel | None]:
+    """Build the DataLoader that fetches categories by their id."""
+
+    async def load_categories(keys: list[int]) -> list[models.CategoryModel | None]:
+        async with db_session(read_only=True) as sess:
+            query = select(models.CategoryModel).where(models.CategoryModel.id.in_(keys))
+            categories = {
+                category.id: category for category in (await sess.execute(query)).scalars()
+            }
+        return [categories.get(key) for key in keys]
+
+    return DataLoader(load_fn=load_categories, cache_map=LoaderCache())
+
+
+def build_transactions_by_category_loader(
+    db_session: SessionGetter,
+) -> DataLoader[int, list[models.TransactionModel]]:
+    """Build the DataLoader that fetches the transactions of categories by the category id."""
+
+    async def load_transactions(keys: list[int]) -> list[list[models.TransactionModel]]:
+        async with db_session(read_only=True) as sess:
+            query = select(models.TransactionModel).where(
+                models.TransactionModel.category_id.in_(keys)
+            )
+            transactions: defaultdict[int, list[models.TransactionModel]] = defaultdict(list)
+            for transaction in (await sess.execute(query)).scalars():
+                transactions[transaction.category_id].append(transaction)
+        return [transactions[key] for key in keys]
+
+    return DataLoader(load_fn=load_transactions, cache_map=LoaderCache())
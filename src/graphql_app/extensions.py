@@ -0,0 +1,155 @@
+"""Core module for the schema extensions measuring the GraphQL operations."""
+
+import inspect
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from typing import Any
+
+from graphql import GraphQLResolveInfo
+from strawberry.extensions import SchemaExtension
+from strawberry.schema.schema_converter import GraphQLCoreConverter
+
+from src.graphql_app.tracing import Span, Trace, current_trace
+from src.sql_app.instrumentation import OperationStats, current_operation, current_path
+
+
+class SQLInstrumentationExtension(SchemaExtension):
+    """Attribute the SQL statements to the current operation and resolver path.
+
+    The statements are measured by the engine hooks of `src.sql_app.instrumentation`,
+    which read the context variables set here. Only asynchronous resolvers set the path:
+    the synchronous ones cannot run statements. The batches of the DataLoaders inherit
+    the path of the field that scheduled them.
+    """
+
+    stats: OperationStats | None = None
+
+    def on_operation(self) -> Iterator[None]:
+        """Collect the statements of the operation and record its cost once it is done."""
+        self.stats = OperationStats()
+        token = current_operation.set(self.stats)
+        try:
+            yield
+        finally:
+            current_operation.reset(token)
+            self.stats.finish()
+
+    def on_execute(self) -> Iterator[None]:
+        """Name the operation once its document is parsed."""
+        if self.stats is not None:
+            self.stats.name = self.execution_context.operation_name or "anonymous"
+            self.stats.operation_type = self.execution_context.operation_type.value
+        yield
+
+    def resolve(
+        self,
+        _next: Callable[..., Any],
+        root: Any,
+        info: GraphQLResolveInfo,
+        *args: Any,
+        **kwargs: Any,
+    ) -> Any:
+        """Run the resolver with its path as the current one."""
+        result = _next(root, info, *args, **kwargs)
+        if not inspect.isawaitable(result):
+            return result
+        path = ".".join(key for key in info.path.as_list() if isinstance(key, str))
+        return self._resolve_in_path(result, path)
+
+    @staticmethod
+    async def _resolve_in_path(result: Awaitable[Any], path: str) -> Any:
+        """Await the result of an asynchronous resolver with its path as the current one."""
+        token = current_path.set(path)
+        try:
+            return await result
+        finally:
+            current_path.reset(token)
+
+
+class TracingExtension(SchemaExtension):
+    """Record the parsing, validation, execution and resolvers of the operation as spans.
+
+    The spans are added to the trace of the request, opened by the GraphQL router, see
+    `src.graphql_app.tracing`. Operations executed outside of the router are not traced.
+    Only asynchronous resolvers get a span: the synchronous ones merely read attributes.
+    """
+
+    trace: Trace | None = None
+    operation_span: Span | None = None
+    execute_span: Span | None = None
+
+    def on_operation(self) -> Iterator[None]:
+        """Attach the operation to the trace of the request."""
+        self.trace = current_trace.get()
+        if self.trace is None:
+            yield
+            return
+        self.trace.query = self.execution_context.query
+        self.trace.variables = self.execution_context.variables
+        with self.trace.span("graphql.operation") as self.operation_span:
+            yield
+        self.trace.operation_name = self.execution_context.operation_name
+
+    def on_parse(self) -> Iterator[None]:
+        """Time the parsing of the document."""
+        if self.trace is None:
+            yield
+            return
+        with self.trace.span("graphql.parse", self.operation_span):
+            yield
+
+    def on_validate(self) -> Iterator[None]:
+        """Time the validation of the document."""
+        if self.trace is None:
+            yield
+            return
+        with self.trace.span("graphql.validate", self.operation_span):
+            yield
+
+    def on_execute(self) -> Iterator[None]:
+        """Time the execution of the operation."""
+        if self.trace is None:
+            yield
+            return
+        with self.trace.span(
+            "graphql.execute",
+            self.operation_span,
+            **{"graphql.operation.type": self.execution_context.operation_type.value},
+        ) as self.execute_span:
+            yield
+
+    def resolve(
+        self,
+        _next: Callable[..., Any],
+        root: Any,
+        info: GraphQLResolveInfo,
+        *args: Any,
+        **kwargs: Any,
+    ) -> Any:
+        """Time the asynchronous resolvers."""
+        trace = self.trace
+        if trace is None:
+            return _next(root, info, *args, **kwargs)
+        started = time.time_ns()
+        result = _next(root, info, *args, **kwargs)
+        if not inspect.isawaitable(result):
+            return result
+        field = info.parent_type.fields[info.field_name].extensions.get(
+            GraphQLCoreConverter.DEFINITION_BACKREF
+        )
+        resolver = field.base_resolver if field is not None else None
+        span = trace.start_span(
+            f"graphql.resolve.{resolver.name if resolver is not None else info.field_name}",
+            self.execute_span,
+            **{"graphql.field.path": ".".join(str(key) for key in info.path.as_list())},
+        )
+        span.start_time_unix_nano = started
+        return self._resolve_in_span(result, trace, span)
+
+    @staticmethod
+    async def _resolve_in_span(result: Awaitable[Any], trace: Trace, span: Span) -> Any:
+        """Await the result of an asynchronous resolver and end its span."""
+        try:
+            return await result
+        finally:
+            trace.end_span(span)
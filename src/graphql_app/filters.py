@@ -0,0 +1,201 @@
+"""Core module for compiling the JSON filters of the GraphQL API into SQL where statements.
+
+Filters are validated against a whitelist of the model columns, built once per model.
+The where statements are templates with named bound parameters: they only depend on the
+shape of the filters (which columns, operators and value kinds are used, and whether
+`eq` and `ne` compare with null, which compiles to `IS NULL` and `IS NOT NULL`), so they are
+cached per shape and the values are passed as execution parameters. Identical shapes
+therefore reuse both the Python-side construction and SQLAlchemy's compiled-SQL cache.
+
+The following is a list of supported operations:
+* gt - greater than (>)
+* lt - less than (<)
+* ge - greater or equal than (>=)
+* le - less or equal than (<=)
+* eq - equal to (==)
+* ne - not equal to (!=)
+* in - in list
+* contains - contain "a" in "b"
+
+`contains` matches the text columns with `ILIKE`, the wildcards of the value being
+escaped, which the `pg_trgm` indexes of the transactions names and descriptions serve
+instead of a sequential scan.
+"""
+
+import operator
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Type
+
+from sqlalchemy import ARRAY, DateTime, bindparam, inspect
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql.elements import ColumnElement
+from strawberry.utils.str_converters import to_camel_case
+
+from src.sql_app import models
+
+COMPARISON_OPERATORS: dict[str, Callable[[Any, Any], ColumnElement[bool]]] = {
+    "gt": operator.gt,
+    "lt": operator.lt,
+    "ge": operator.ge,
+    "le": operator.le,
+    "eq": operator.eq,
+    "ne": operator.ne,
+}
+
+NULL_OPERATORS: dict[str, Callable[[Any], ColumnElement[bool]]] = {
+    "eq": lambda attribute: attribute.is_(None),
+    "ne": lambda attribute: attribute.is_not(None),
+}
+
+FilterShape = tuple[tuple[str, str, bool], ...]
+
+LIKE_ESCAPE = "\\"
+
+
+def escape_like(value: str) -> str:
+    """Escape the wildcards of a `LIKE` pattern, so the value is matched literally."""
+    return (
+        value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2)
+        .replace("%", f"{LIKE_ESCAPE}%")
+        .replace("_", f"{LIKE_ESCAPE}_")
+    )
+
+
+@dataclass(frozen=True)
+class CompiledFilters:
+    """Where statements of a set of filters and the parameters to execute them with."""
+
+    clauses: tuple[ColumnElement[bool], ...] = ()
+    params: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class FilterColumn:
+    """Metadata of a column that can be filtered on."""
+
+    key: str
+    attribute: InstrumentedAttribute[Any]
+    is_datetime: bool
+    is_array: bool
+
+
+class FilterCompiler:
+    """Compile the JSON filters of one model."""
+
+    def __init__(self, model: Type[models.TransactionModel] | Type[models.CategoryModel]) -> None:
+        """Build the column whitelist of the model.
+
+        Columns can be referenced by their snake case or camel case names. Deferred
+        columns, maintained by the database, cannot be filtered on.
+        """
+        self.model = model
+        self.columns: dict[str, FilterColumn] = {}
+        for column_attr in inspect(model).column_attrs:
+            if column_attr.deferred:
+                continue
+            column_type = column_attr.columns[0].type
+            column = FilterColumn(
+                key=column_attr.key,
+                attribute=getattr(model, column_attr.key),
+                is_datetime=isinstance(column_type, DateTime),
+                is_array=isinstance(column_type, ARRAY),
+            )
+            self.columns[column_attr.key] = column
+            self.columns[to_camel_case(column_attr.key)] = column
+        self._template = lru_cache(maxsize=512)(self._build_template)
+
+    def _coerce(self, column: FilterColumn, value: Any) -> Any:
+        """Convert JSON values to the Python type expected by the column."""
+        if column.is_datetime and isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"Invalid datetime {value} for column {column.key}.") from None
+        return value
+
+    def _build_template(self, shape: FilterShape, prefix: str) -> tuple[ColumnElement[bool], ...]:
+        """Build the where statements of a filter shape with one bound parameter per value."""
+        clauses: list[ColumnElement[bool]] = []
+        for index, (column_key, comparison_operator, is_null) in enumerate(shape):
+            attribute = self.columns[column_key].attribute
+            if is_null:
+                clauses.append(NULL_OPERATORS[comparison_operator](attribute))
+                continue
+            param = bindparam(
+                f"{prefix}_{index}",
+                type_=attribute.type,
+                expanding=comparison_operator == "in",
+            )
+            if comparison_operator == "in":
+                clauses.append(attribute.in_(param))
+            elif comparison_operator == "contains":
+                if self.columns[column_key].is_array:
+                    clauses.append(attribute.contains(param))
+                else:
+                    # [Reference]
+                    # (https://docs.sqlalchemy.org/en/14/core/sqlelement.html#sqlalchemy.sql.expression.ColumnElement.ilike)
+                    clauses.append(attribute.ilike(param, escape=LIKE_ESCAPE))
+            else:
+                clauses.append(COMPARISON_OPERATORS[comparison_operator](attribute, param))
+        return tuple(clauses)
+
+    def _param_value(self, column: FilterColumn, comparison_operator: str, value: Any) -> Any:
+        """Validate a comparison and convert its value into the bound parameter value."""
+        if comparison_operator == "in":
+            if not isinstance(value, list):
+                raise ValueError(f"The in filter of column {column.key} expects a list.")
+            return [self._coerce(column, item) for item in value]
+        if comparison_operator == "contains":
+            if column.is_array and isinstance(value, list):
+                return value
+            if not column.is_array and isinstance(value, str):
+                return f"%{escape_like(value)}%"
+            raise ValueError(f"Invalid contains filter {value} for column {column.key}.")
+        if comparison_operator in COMPARISON_OPERATORS:
+            return self._coerce(column, value)
+        raise ValueError(f"Unknown filter operator {comparison_operator}.")
+
+    def compile(self, filters: dict[str, Any] | None, prefix: str = "f") -> CompiledFilters:
+        """Compile the filters into where statements and their execution parameters.
+
+        `prefix` names the bound parameters, so filters compiled with different prefixes
+        can be used in the same statement.
+        """
+        if not filters:
+            return CompiledFilters()
+
+        shape: list[tuple[str, str, bool]] = []
+        params: dict[str, Any] = {}
+        for column_name, comparisons in filters.items():
+            column = self.columns.get(column_name)
+            if column is None:
+                raise ValueError(f"Unknown filter column {column_name}.")
+            if not isinstance(comparisons, dict):
+                raise ValueError(f"The filters of column {column_name} must be an object.")
+
+            for comparison_operator, comparison_value in comparisons.items():
+                is_null = comparison_value is None and comparison_operator in NULL_OPERATORS
+                if not is_null:
+                    params[f"{prefix}_{len(shape)}"] = self._param_value(
+                        column, comparison_operator, comparison_value
+                    )
+                shape.append((column.key, comparison_operator, is_null))
+
+        return CompiledFilters(self._template(tuple(shape), prefix), params)
+
+
+filter_compilers: dict[type, FilterCompiler] = {
+    models.TransactionModel: FilterCompiler(models.TransactionModel),
+    models.CategoryModel: FilterCompiler(models.CategoryModel),
+}
+
+
+def compile_filters(
+    filters: dict[str, Any] | None,
+    table: Type[models.TransactionModel] | Type[models.CategoryModel],
+    prefix: str = "f",
+) -> CompiledFilters:
+    """Compile the filters of a model into where statements and their execution parameters."""
+    return filter_compilers[table].compile(filters, prefix)
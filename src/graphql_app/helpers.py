@@ -1,19 +1,41 @@
 """Core module for defining general helper functions used by the GraphQL resolvers."""
 
-import operator
-import re
+import base64
+import binascii
+import json
 from dataclasses import dataclass
-from typing import Any, Sequence, Type
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Hashable, Sequence, Type
 
 import strawberry
-from sqlalchemy import or_, select
+from sqlalchemy import (
+    Select,
+    and_,
+    inspect,
+    or_,
+    select,
+    tuple_,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import InstrumentedAttribute, subqueryload
-from sqlalchemy.sql.elements import BinaryExpression
-from sqlalchemy.sql.functions import func
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.orm.interfaces import LoaderOption
+from sqlalchemy.sql.elements import ColumnElement
+from strawberry.types.nodes import SelectedField, Selection
 
-from src.graphql_app import types
+from src.config import settings
+from src.graphql_app import counting, types
+from src.graphql_app.cache import estimate_size, result_cache, table_versions
+from src.graphql_app.converters import convert_records
+from src.graphql_app.filters import CompiledFilters, compile_filters
 from src.graphql_app.miscellanious import Info
+from src.graphql_app.projection import (
+    load_columns,
+    plan_projection,
+    selected_columns,
+    type_columns,
+)
+from src.graphql_app.search import SEARCH_CLAUSE, SEARCH_RANK, search_params
 from src.sql_app import models
 
 
@@ -21,7 +43,7 @@ from src.sql_app import models
 class FetchDataResponse:
     """Dataclass to store records fetched from the database and how many of them indeed exist."""
 
-    total: int
+    total: int | None
     records: list[models.TransactionModel | models.CategoryModel]
 
 
@@ -30,31 +52,52 @@ def _build_items(
     scalar_type: Type[types.Transaction] | Type[types.Category],
 ) -> list[types.Item]:
     """Build the GraphQL item type."""
-    return [scalar_type.from_db_model(record) for record in records]
+    return convert_records(records, scalar_type)
 
 
-def convert_camel_case(name: str):
-    """Convert camel case string to snake case."""
-    pattern = re.compile(r"(?<!^)(?=[A-Z])")
-    name = pattern.sub("_", name).lower()
-    return name
+def is_field_selected(info: Info, name: str) -> bool:
+    """Check whether the client selected a field of the type returned by the resolver.
+
+    Fragments are followed, nested fields are not.
+    """
+
+    def walk(selections: list[Selection]) -> bool:
+        for selection in selections:
+            if isinstance(selection, SelectedField):
+                if selection.name == name:
+                    return True
+            elif walk(selection.selections):
+                return True
+        return False
+
+    return any(walk(field.selections) for field in info.selected_fields)
+
+
+def _resolve_count_strategy(
+    info: Info, field: str, count_strategy: types.CountStrategy | None
+) -> types.CountStrategy | None:
+    """Pick the counting strategy, or None when the client did not ask for the total.
+
+    A client reading its own writes gets an exact count instead of a cached one.
+    """
+    if not is_field_selected(info, field):
+        return None
+    strategy = count_strategy or types.CountStrategy(settings.DB_COUNT_STRATEGY)
+    if strategy is types.CountStrategy.CACHED and info.context.pinned:
+        return types.CountStrategy.EXACT
+    return strategy
 
 
 def aggregate_filters(
     filters: types.JSON | None,
     table: Type[models.TransactionModel] | Type[models.CategoryModel],
-) -> list[BinaryExpression]:
-    """Generate a list of where statements based on input filters.
-
-    The following is a list of supported operations:
-    * gt - greater than (>)
-    * lt - less than (<)
-    * ge - greater or equal than (>=)
-    * le - less or equal than (<=)
-    * eq - equal to (==)
-    * ne - not equal to (!=)
-    * in - in list
-    * contains - contain "a" in "b"
+    prefix: str = "f",
+) -> CompiledFilters:
+    """Generate the where statements based on input filters, plus their bound parameters.
+
+    The filters are validated and compiled by the cached compiler of the table, see
+    `src.graphql_app.filters` for the supported operations. The parameters must be
+    passed when executing a statement that uses the where statements.
 
     Examples
     --------
@@ -76,113 +119,384 @@ def aggregate_filters(
         models.Transactions,
     )
     """
-    where_statements: list[BinaryExpression] = []
-    if filters is not None:
-        for table_column, value in filters.items():
-            table_column = convert_camel_case(table_column)
-            ops = {
-                "gt": operator.gt,
-                "lt": operator.lt,
-                "ge": operator.ge,
-                "le": operator.le,
-                "eq": operator.eq,
-                "ne": operator.ne,
-            }
-            for comparison_operator, comparison_value in value.items():
-                if comparison_operator == "in":
-                    sqlalchemy_binary_expression = getattr(table, table_column).in_(
-                        comparison_value
-                    )
-                elif comparison_operator == "contains" and isinstance(comparison_value, str):
-                    # [Reference]
-                    # (https://docs.sqlalchemy.org/en/14/core/sqlelement.html#sqlalchemy.sql.expression.ColumnElement.ilike)
-                    comparison_value = f"%{comparison_value}%"
-                    sqlalchemy_binary_expression = getattr(table, table_column).ilike(
-                        comparison_value
-                    )
-                elif comparison_operator == "contains" and isinstance(comparison_value, list):
-                    sqlalchemy_binary_expression = getattr(table, table_column).op("@>")(
-                        comparison_value
-                    )
-                else:
-                    sqlalchemy_binary_expression = ops[comparison_operator](
-                        getattr(table, table_column), comparison_value
-                    )
-                where_statements.append(sqlalchemy_binary_expression)
-
-    return where_statements
+    return compile_filters(filters, table, prefix)
+
+
+def build_where_statements(
+    filters: types.JSON | None,
+    subfilters: types.JSON | None,
+    table: Type[models.TransactionModel] | Type[models.CategoryModel],
+    search: str | None = None,
+) -> tuple[list[ColumnElement[bool]], dict[str, Any]]:
+    """Combine the filters, which must all match, with the subfilters, of which any must match.
+
+    The transactions can also be narrowed down to the matches of a search. Returns the
+    where statements and the parameters to execute them with.
+    """
+    and_filters = aggregate_filters(filters, table, prefix="f")
+    or_filters = aggregate_filters(subfilters, table, prefix="sf")
+    where_statements = list(and_filters.clauses)
+    if or_filters.clauses:
+        where_statements.append(or_(*or_filters.clauses))
+    params = {**and_filters.params, **or_filters.params}
+    if search is not None:
+        if table is not models.TransactionModel:
+            raise ValueError(f"The {table.__tablename__} cannot be searched.")
+        where_statements.append(SEARCH_CLAUSE)
+        params.update(search_params(search))
+    return where_statements, params
 
 
 async def _count_rows(
     filters: types.JSON | None,
+    subfilters: types.JSON | None,
     table: Type[models.TransactionModel] | Type[models.CategoryModel],
     sess: AsyncSession,
-) -> int:
+    strategy: types.CountStrategy = types.CountStrategy.EXACT,
+    search: str | None = None,
+) -> int:  # pragma: no cover
     """Count the number of elements in the database based on supplied filters."""
-    where_statements = aggregate_filters(filters, table)
-    query = select(func.count()).select_from(table).where(*where_statements)
+    where_statements, params = build_where_statements(filters, subfilters, table, search)
+
+    if strategy is types.CountStrategy.ESTIMATED:
+        return await counting.count_estimated(where_statements, params, table, sess)
+    if strategy is types.CountStrategy.CACHED:
+        return await counting.count_cached(
+            [filters, subfilters, search], where_statements, params, table, sess
+        )
+    return await counting.count_exact(where_statements, params, table, sess)
 
-    result = await sess.execute(query)
 
-    return result.scalars().one()
+def build_list_query(
+    model: Type[models.TransactionModel] | Type[models.CategoryModel],
+    limit: int,
+    offset: int,
+    where_statements: Sequence[ColumnElement[bool]] = (),
+    ordering: types.TransactionOrderingInput | None = None,
+    projection: LoaderOption | None = None,
+    search: str | None = None,
+) -> Select[Any]:
+    """Build the query of a page of a list, `offset` being the 1-based page number."""
+    query = select(model).where(*where_statements).offset((offset - 1) * limit).limit(limit)
+    if ordering is not None:
+        query = query.order_by(
+            getattr(getattr(model, ordering.field.value), ordering.direction.value)()
+        )
+    elif search is not None:
+        query = query.order_by(SEARCH_RANK.desc(), model.id)
+    if projection is not None:
+        query = query.options(projection)
+    return query
 
 
 async def _fetch_data(
     info: Info,
     limit: int,
     model: Type[models.TransactionModel] | Type[models.CategoryModel],
-    model_relations: list[InstrumentedAttribute[Any]],
     filters: types.JSON | None = None,
     subfilters: types.JSON | None = None,
     ordering: types.TransactionOrderingInput | None = None,
     offset: int = strawberry.UNSET,
+    count_strategy: types.CountStrategy | None = None,
+    projection: LoaderOption | None = None,
+    search: str | None = None,
 ) -> FetchDataResponse:  # pragma: no cover
-    """Build the SQLAlchemy query based on common pattern and fetch the data."""
+    """Build the SQLAlchemy query based on common pattern and fetch the data.
+
+    The matches of a search are ranked by relevance, unless an ordering is given.
+    """
     offset = offset if offset is not strawberry.UNSET else 1
-    and_filters = aggregate_filters(filters=filters, table=model)
-    or_filters = aggregate_filters(subfilters, table=model)
+    where_statements, params = build_where_statements(filters, subfilters, model, search)
 
     async with info.context.db_session(read_only=True) as sess:
-        total = await _count_rows(filters=filters, table=model, sess=sess)
-        query = (
-            select(model)
-            .where(*and_filters)
-            .filter(or_(*or_filters))
-            .offset((offset - 1) * limit)
-            .limit(limit)
+        total = None
+        if count_strategy is not None:
+            total = await _count_rows(filters, subfilters, model, sess, count_strategy, search)
+        query = build_list_query(
+            model, limit, offset, where_statements, ordering, projection, search
         )
-        if ordering is not None:
-            query = query.order_by(
-                getattr(getattr(model, ordering.field.value), ordering.direction.value)()
-            )
-        for model_relation in model_relations:
-            query = query.options(subqueryload(getattr(model, model_relation.key)))
-        records = (await sess.execute(query)).scalars().all()
+        records = (await sess.execute(query, params)).scalars().all()
 
     return FetchDataResponse(total, records)
 
 
+def _prime_loaders(
+    info: Info, records: Sequence[models.TransactionModel | models.CategoryModel]
+) -> None:
+    """Prime the request DataLoaders with the categories that were already fetched.
+
+    Only the categories loaded with every column of the `Category` type are primed, as the
+    projected ones lack the columns `Transaction.category` may select.
+    """
+    columns = type_columns(models.CategoryModel, types.Category)
+    info.context.category_loader.prime_many(
+        {
+            record.id: record
+            for record in records
+            if isinstance(record, models.CategoryModel) and not inspect(record).unloaded & columns
+        }
+    )
+
+
+def _result_cache_key(
+    model: Type[models.TransactionModel] | Type[models.CategoryModel],
+    limit: int,
+    offset: int,
+    filters: types.JSON | None,
+    subfilters: types.JSON | None,
+    ordering: types.TransactionOrderingInput | types.CategoryOrderingInput | None,
+    count_strategy: types.CountStrategy | None,
+    columns: tuple[str, ...],
+    search: str | None = None,
+) -> Hashable:
+    """Build the normalized result cache key of a pagination window.
+
+    The key embeds the current version of the table, so mutations invalidate it.
+    """
+    return (
+        model.__tablename__,
+        table_versions.get(model.__tablename__),
+        json.dumps([filters, subfilters, search], sort_keys=True, default=str),
+        (ordering.field.value, ordering.direction.value) if ordering is not None else None,
+        limit,
+        offset,
+        count_strategy,
+        columns,
+    )
+
+
 async def build_paginated_window(
     info: Info,
     limit: int,
     offset: int,
     model: Type[models.TransactionModel] | Type[models.CategoryModel],
     scalar_type: Type[types.Transaction] | Type[types.Category],
-    model_relations: list[InstrumentedAttribute[Any]] = [],
     filters: types.JSON | None = None,
     subfilters: types.JSON | None = None,
     ordering: types.TransactionOrderingInput | None = None,
+    count_strategy: types.CountStrategy | None = None,
+    search: str | None = None,
 ) -> types.PaginationWindow:
-    """Build the GraphQL connection type."""
+    """Build the GraphQL connection type.
+
+    The total is only counted when the client selects `totalItemsCount`. When the result
+    cache is enabled, windows are served from it until their TTL expires or a mutation
+    touches the table, except to a client reading its own writes. The transactions can be
+    narrowed down by a search, see `src.graphql_app.search`.
+    """
+    count_strategy = _resolve_count_strategy(info, "totalItemsCount", count_strategy)
+    columns = selected_columns(info, model, scalar_type, ("items",))
+    cache = None if info.context.pinned else result_cache
+    cache_key = None
+    if cache is not None:
+        cache_key = _result_cache_key(
+            model, limit, offset, filters, subfilters, ordering, count_strategy, columns, search
+        )
+        window = cache.get(cache_key)
+        if window is not None:
+            return window
+
     data = await _fetch_data(
         info=info,
         limit=limit,
         model=model,
-        model_relations=model_relations,
         filters=filters,
         subfilters=subfilters,
         ordering=ordering,
         offset=offset,
+        count_strategy=count_strategy,
+        projection=load_columns(model, columns),
+        search=search,
     )
+    _prime_loaders(info, data.records)
     items = _build_items(data.records, scalar_type)
-    return types.PaginationWindow(items=items, total_items_count=data.total)
+    window = types.PaginationWindow(items=items, total_items_count=data.total or 0)
+    if cache is not None:
+        cache.set(cache_key, window, estimate_size(window))
+    return window
+
+
+def encode_cursor(field: str, value: Any, record_id: int) -> str:
+    """Encode the ordering value and the id of a record into an opaque cursor."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, Decimal):
+        value = str(value)
+    payload = json.dumps([field, value, record_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str, field: str, column: InstrumentedAttribute[Any]) -> tuple[Any, int]:
+    """Decode an opaque cursor back into the ordering value and the id of a record.
+
+    The cursor must have been generated for the same ordering field, otherwise
+    the position it points to is meaningless for the requested ordering.
+    """
+    try:
+        cursor_field, value, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if value is not None:
+            python_type = column.type.python_type
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is Decimal:
+                value = Decimal(value)
+        record_id = int(record_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError(f"Invalid cursor {cursor}.") from None
+
+    if cursor_field != field:
+        raise ValueError(f"The cursor {cursor} was not generated for the ordering field {field}.")
+    return value, record_id
+
+
+def _seek_after(
+    model: Type[models.TransactionModel] | Type[models.CategoryModel],
+    column: InstrumentedAttribute[Any],
+    direction: types.OrderingDirection,
+    value: Any,
+    record_id: int,
+) -> ColumnElement[bool]:
+    """Build the where statement that seeks the rows placed after the cursor position.
+
+    Rows are ordered by `(column, id)`, so the seek is a row value comparison that
+    can be served by an index on the same columns. PostgreSQL places NULL values last
+    in ascending order and first in descending order, which is taken into account
+    for nullable columns.
+    """
+    if column is model.id:
+        if direction is types.OrderingDirection.ASC:
+            return model.id > record_id
+        return model.id < record_id
+
+    nullable = column.property.columns[0].nullable
+    if direction is types.OrderingDirection.ASC:
+        if value is None:
+            return and_(column.is_(None), model.id > record_id)
+        seek = tuple_(column, model.id) > tuple_(value, record_id)
+        return or_(seek, column.is_(None)) if nullable else seek
+
+    if value is None:
+        return or_(and_(column.is_(None), model.id < record_id), column.is_not(None))
+    return tuple_(column, model.id) < tuple_(value, record_id)
+
+
+def build_keyset_query(
+    model: Type[models.TransactionModel] | Type[models.CategoryModel],
+    first: int,
+    column: InstrumentedAttribute[Any],
+    direction: types.OrderingDirection,
+    where_statements: Sequence[ColumnElement[bool]] = (),
+    projection: LoaderOption | None = None,
+) -> Select[Any]:
+    """Build the keyset query of a page, fetching one record more than the page size."""
+    query = (
+        select(model)
+        .where(*where_statements)
+        .order_by(getattr(column, direction.value)(), getattr(model.id, direction.value)())
+        .limit(first + 1)
+    )
+    if projection is not None:
+        query = query.options(projection)
+    return query
+
+
+async def _fetch_keyset_data(
+    info: Info,
+    first: int,
+    model: Type[models.TransactionModel] | Type[models.CategoryModel],
+    field: str,
+    direction: types.OrderingDirection,
+    after: str | None = None,
+    filters: types.JSON | None = None,
+    subfilters: types.JSON | None = None,
+    count_strategy: types.CountStrategy | None = None,
+    projection: LoaderOption | None = None,
+) -> FetchDataResponse:  # pragma: no cover
+    """Build the keyset SQLAlchemy query and fetch one record more than the page size.
+
+    The extra record is only used to find out whether there is a next page.
+    """
+    column: InstrumentedAttribute[Any] = getattr(model, field)
+    where_statements, params = build_where_statements(filters, subfilters, model)
+    if after is not None:
+        value, record_id = decode_cursor(after, field, column)
+        where_statements.append(_seek_after(model, column, direction, value, record_id))
+
+    async with info.context.db_session(read_only=True) as sess:
+        total = None
+        if count_strategy is not None:
+            total = await _count_rows(filters, subfilters, model, sess, count_strategy)
+        query = build_keyset_query(model, first, column, direction, where_statements, projection)
+        records = (await sess.execute(query, params)).scalars().all()
+
+    return FetchDataResponse(total, records)
+
+
+async def build_connection(
+    info: Info,
+    first: int,
+    model: Type[models.TransactionModel] | Type[models.CategoryModel],
+    scalar_type: Type[types.Transaction] | Type[types.Category],
+    after: str | None = None,
+    filters: types.JSON | None = None,
+    subfilters: types.JSON | None = None,
+    ordering: types.TransactionOrderingInput | types.CategoryOrderingInput | None = None,
+    count_strategy: types.CountStrategy | None = None,
+) -> types.Connection:
+    """Build the GraphQL cursor-based connection type.
+
+    Pages are fetched with a keyset seek on `(ordering field, id)` instead of an offset,
+    so every page costs the same regardless of how deep the client has scrolled.
+    """
+    field = ordering.field.value if ordering is not None else "id"
+    direction = ordering.direction if ordering is not None else types.OrderingDirection.ASC
+    data = await _fetch_keyset_data(
+        info=info,
+        first=first,
+        model=model,
+        field=field,
+        direction=direction,
+        after=after,
+        filters=filters,
+        subfilters=subfilters,
+        count_strategy=_resolve_count_strategy(info, "total", count_strategy),
+        projection=plan_projection(info, model, scalar_type, ("edges", "node"), required=[field]),
+    )
+    records = data.records[:first]
+    _prime_loaders(info, records)
+    edges = [
+        types.Edge(
+            node=scalar_type.from_db_model(record),
+            cursor=encode_cursor(field, getattr(record, field), record.id),
+        )
+        for record in records
+    ]
+    page_info = types.PageInfo(
+        has_next_page=len(data.records) > first,
+        has_previous_page=after is not None,
+        start_cursor=edges[0].cursor if edges else None,
+        end_cursor=edges[-1].cursor if edges else None,
+    )
+    return types.Connection(page_info=page_info, edges=edges, total=data.total or 0)
+
+
+def build_warm_up_queries() -> list[Select[Any]]:
+    """Build the first pages of the lists and connections, as the resolvers query them.
+
+    The statements are those of the default arguments, every field of the type being
+    selected. LIMIT and OFFSET are bound parameters, so every page shares the statement
+    prepared at warm-up.
+    """
+    queries: list[Select[Any]] = []
+    for model, scalar_type in (
+        (models.TransactionModel, types.Transaction),
+        (models.CategoryModel, types.Category),
+    ):
+        projection = load_columns(model, sorted({"id", *type_columns(model, scalar_type)}))
+        queries.append(build_list_query(model, 10, 1, projection=projection))
+        queries.append(
+            build_keyset_query(
+                model, 10, model.id, types.OrderingDirection.ASC, projection=projection
+            )
+        )
+    return queries
@@ -1,38 +1,138 @@
 """Define miscellaneous functions/classes for the GraphQL app."""
 
+import asyncio
+import math
+import time
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
-from typing import Any, Self
+from typing import Any, Callable, Self
 
+from fastapi import Response
+from fastapi.requests import HTTPConnection
 from graphql import GraphQLError, ValidationRule
-from graphql.language.ast import FieldNode
+from graphql.language.ast import FieldNode, IntValueNode
 from loguru import logger
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 from strawberry.fastapi import BaseContext
 from strawberry.types import Info as _Info
 from strawberry.types.info import RootValueType
 
+from src.config import settings
+from src.graphql_app.converters import build_converter
+from src.graphql_app.dataloaders import (
+    build_category_loader,
+    build_transactions_by_category_loader,
+)
 from src.sql_app.models import CategoryModel, TransactionModel
-from src.sql_app.session_manager import create_async_session
+from src.sql_app.session_manager import get_replica_router, get_session_factory
+
+# Cookie holding the Unix time of the last write of the client, for the read-your-writes
+# routing of its next reads
+LAST_WRITE_COOKIE = "last_write"
 
 
 class Context(BaseContext):
     """Context class to override the default context from Strawberry."""
 
+    def __init__(self, last_write: float | None = None) -> None:
+        """Create the DataLoaders and the session slots shared by all resolvers of the request.
+
+        `last_write` is the Unix time of the last write of the client, for the
+        read-your-writes routing of the reads.
+        """
+        super().__init__()
+        self.last_write = last_write
+        self._sessions: dict[bool, AsyncSession] = {}
+        self._releases: list[Callable[[], None]] = []
+        self._session_locks = {True: asyncio.Lock(), False: asyncio.Lock()}
+        self._session_owners: dict[bool, asyncio.Task[Any] | None] = {True: None, False: None}
+        self.category_loader = build_category_loader(self.db_session)
+        self.transactions_by_category_loader = build_transactions_by_category_loader(
+            self.db_session
+        )
+
+    @property
+    def pinned(self) -> bool:
+        """Check whether the reads of the request must see the last write of the client.
+
+        They then go to the primary and skip the caches, which are per worker and only
+        invalidated by the writes of their own worker.
+        """
+        return get_replica_router().is_pinned(self.last_write)
+
     @asynccontextmanager
     async def db_session(self, read_only: bool = True) -> AsyncGenerator[AsyncSession, None]:
-        """Store the database session in the context."""
-        session = await create_async_session(read_only)
-        async with session() as sess:
+        """Yield the database session of the request, opening it on first use.
+
+        All resolvers of an operation share one read session and one write session, so
+        the request checks out at most one connection per engine. Access to each session
+        is serialized because an `AsyncSession` must not be used by concurrent tasks, so
+        the block must not be entered again, nor wait for a DataLoader, while it is open.
+
+        The read session is opened on the replica chosen by the replica router. Each
+        commit of the write session sends the time of the write to the client, so its
+        next reads go to the primary.
+        """
+        task = asyncio.current_task()
+        if task is not None and self._session_owners[read_only] is task:
+            kind = "read" if read_only else "write"
+            raise RuntimeError(f"The {kind} session is already in use by this task.")
+        async with self._session_locks[read_only]:
+            self._session_owners[read_only] = task
             try:
-                await sess.begin()
-                yield sess
-            except Exception as err:
-                logger.error(f"Error: {err}")
-                await sess.rollback()
-                raise err
+                sess = self._sessions.get(read_only)
+                if sess is None:
+                    sess = self._sessions[read_only] = self._open_session(read_only)
+                try:
+                    yield sess
+                except Exception as err:
+                    logger.error(f"Error: {err}")
+                    await sess.rollback()
+                    raise err
             finally:
+                self._session_owners[read_only] = None
+
+    def _open_session(self, read_only: bool) -> AsyncSession:
+        """Open a read session on the leased replica, or a write session on the primary."""
+        if read_only:
+            session_factory, release = get_replica_router().lease(self.last_write)
+            self._releases.append(release)
+            return session_factory()
+        sess = get_session_factory(read_only=False)()
+        event.listen(sess.sync_session, "after_commit", self._record_write)
+        return sess
+
+    def _record_write(self, sess: Session) -> None:
+        """Send the time of a committed write to the client."""
+        self.last_write = time.time()
+        if self.response is not None:
+            set_last_write(self.response, self.last_write)
+
+    async def reset(self) -> None:
+        """Close the database sessions and clear the DataLoaders between subscription events.
+
+        The context of a subscription lives as long as its websocket, so its sessions are
+        not kept open, nor its DataLoaders kept stale, while waiting for the next event.
+        """
+        async with self._session_locks[True], self._session_locks[False]:
+            await self.close()
+        self.category_loader.clear_all()
+        self.transactions_by_category_loader.clear_all()
+
+    async def close(self) -> None:
+        """Close the database sessions opened during the request."""
+        sessions = list(self._sessions.values())
+        releases = self._releases
+        self._sessions.clear()
+        self._releases = []
+        try:
+            for sess in sessions:
                 await sess.close()
+        finally:
+            for release in releases:
+                release()
 
 
 Info = _Info[Context, RootValueType]
@@ -45,8 +145,14 @@ class CommonMethods:
     def from_db_model(
         cls, table: TransactionModel | CategoryModel, extra: dict[str, str] = {}
     ) -> Self:
-        """Generate the Strawberry type from the SQLAlchemy model."""
-        return cls(**table.as_dict(), **extra)
+        """Generate the Strawberry type from the SQLAlchemy model.
+
+        Relationships are not read here, they are resolved on demand by the DataLoaders.
+        """
+        instance = build_converter(type(table), cls)(table)
+        if extra:
+            instance.__dict__.update(extra)
+        return instance
 
     @classmethod
     def __name__(cls) -> str:
@@ -54,31 +160,63 @@ class CommonMethods:
         return cls.__name__()
 
 
+def check_page_argument(name: str, value: int) -> str | None:
+    """Check the value of an offset, limit or first argument, returning the error message."""
+    if name in ("offset", "limit", "first") and value < 1:
+        return f"The {name} value must be greater than or equal to 1."
+    return None
+
+
 class ValidateQueryParams(ValidationRule):
-    """Validate the query parameters values."""
+    """Validate the query parameters values.
+
+    Only the literal values are checked here, as the document alone is validated and
+    cached. The values of the variables are checked by the cost analysis.
+    """
 
     def enter_field(self, node: FieldNode, *args: Any) -> None:
-        """Check the offset value."""
+        """Check the offset, limit and first values."""
         if node.arguments is not None:
             for argument in node.arguments:
-                if argument.name.value == "offset":
-                    if int(argument.value.value) < 1:
-                        self.report_error(
-                            GraphQLError(
-                                "The offset value must be greater than or equal to 1.",
-                                [argument],
-                            )
-                        )
-                elif argument.name.value == "limit":
-                    if int(argument.value.value) < 1:
-                        self.report_error(
-                            GraphQLError(
-                                "The limit value must be greater than or equal to 1.",
-                                [argument],
-                            )
-                        )
-
-
-async def get_context() -> Context:
-    """Fetch the Strawberry context."""
-    return Context()
+                if not isinstance(argument.value, IntValueNode):
+                    continue
+                message = check_page_argument(argument.name.value, int(argument.value.value))
+                if message is not None:
+                    self.report_error(GraphQLError(message, [argument]))
+
+
+def get_client_id(request: HTTPConnection) -> str | None:
+    """Identify the client by its `X-Client-Id` header."""
+    return request.headers.get("x-client-id")
+
+
+def get_last_write(request: HTTPConnection) -> float | None:
+    """Get the Unix time of the last write of the client from its cookie, if any."""
+    try:
+        return float(request.cookies[LAST_WRITE_COOKIE])
+    except (KeyError, ValueError):
+        return None
+
+
+def set_last_write(response: Response, last_write: float) -> None:
+    """Send the time of a write to the client, expiring with the read-your-writes window."""
+    if settings.DB_READ_YOUR_WRITES_WINDOW > 0:
+        response.set_cookie(
+            LAST_WRITE_COOKIE,
+            f"{last_write:.6f}",
+            max_age=math.ceil(settings.DB_READ_YOUR_WRITES_WINDOW),
+            httponly=True,
+            samesite="lax",
+        )
+
+
+async def get_context(request: HTTPConnection) -> AsyncGenerator[Context, None]:
+    """Fetch the Strawberry context and close its database sessions after the request.
+
+    The context of the subscriptions is kept for the lifetime of their websocket.
+    """
+    context = Context(last_write=get_last_write(request))
+    try:
+        yield context
+    finally:
+        await context.close()
@@ -1,12 +1,18 @@
 """Core module for the GraphQL mutations."""
 
-from typing import Optional
+from typing import List, Optional
 
 import strawberry
 
 from src.graphql_app import resolvers
 from src.graphql_app.miscellanious import Info
-from src.graphql_app.types import Category, GenericSuccess, Transaction
+from src.graphql_app.types import (
+    Category,
+    GenericSuccess,
+    Transaction,
+    TransactionInput,
+    TransactionResult,
+)
 
 
 @strawberry.type
@@ -31,6 +37,13 @@ class Mutation:
             description=description,
         )
 
+    @strawberry.mutation
+    async def create_transactions(
+        self, info: Info, input: List[TransactionInput], atomic: bool = False
+    ) -> List[TransactionResult]:
+        """Mutation definition for creating transactions in bulk."""
+        return await resolvers.create_transactions(info=info, input=input, atomic=atomic)
+
     @strawberry.mutation
     async def delete_transaction(self, info: Info, transaction_id: int) -> GenericSuccess:
         """Mutation definition for deleting a transaction."""
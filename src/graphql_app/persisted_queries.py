@@ -0,0 +1,186 @@
+"""Automatic persisted queries and the cache of parsed and validated GraphQL documents.
+
+Clients following the Apollo automatic persisted queries protocol send the sha256 hash of
+the query in `extensions.persistedQuery` and may omit the query text. Unknown hashes are
+answered with a `PersistedQueryNotFound` error, after which the client sends the query
+along with its hash to register it.
+[Reference](https://www.apollographql.com/docs/apollo-server/performance/apq)
+
+Every query, persisted or not, is cached by hash with its parsed `DocumentNode` and
+whether it passed validation, so known operations skip both steps.
+"""
+
+import hashlib
+from collections import OrderedDict
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Any, Literal, Optional
+
+from graphql import DocumentNode, GraphQLError
+from strawberry.extensions import SchemaExtension
+from strawberry.http import GraphQLRequestData
+from strawberry.http.async_base_view import AsyncHTTPRequestAdapter
+from strawberry.http.base import BaseRequestProtocol
+from strawberry.http.exceptions import HTTPException
+from strawberry.http.parse_content_type import parse_content_type
+from strawberry.types import ExecutionResult, SubscriptionExecutionResult
+
+from src.config import settings
+from src.graphql_app.tracing import TracingRouter
+
+
+@dataclass
+class CachedDocument:
+    """A known query, its parsed document and whether it passed validation."""
+
+    query: str
+    document: Optional[DocumentNode] = None
+    validated: bool = False
+
+
+class DocumentCache:
+    """Bounded LRU cache of documents keyed by the sha256 hash of the query."""
+
+    def __init__(self, maxsize: int) -> None:
+        """Initialize the cache."""
+        self.maxsize = maxsize
+        self._documents: OrderedDict[str, CachedDocument] = OrderedDict()
+
+    def get(self, query_hash: str) -> CachedDocument | None:
+        """Get the document registered under the hash."""
+        document = self._documents.get(query_hash)
+        if document is not None:
+            self._documents.move_to_end(query_hash)
+        return document
+
+    def register(self, query_hash: str, query: str) -> CachedDocument:
+        """Get the document registered under the hash, registering the query on a miss."""
+        document = self.get(query_hash)
+        if document is None:
+            document = self._documents[query_hash] = CachedDocument(query)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+        return document
+
+
+document_cache = DocumentCache(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+
+
+def hash_query(query: str) -> str:
+    """Compute the sha256 hash identifying a query."""
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class PersistedQueryNotFoundError(Exception):
+    """The client sent a hash without the query and the hash is not registered."""
+
+
+class DocumentCacheExtension(SchemaExtension):
+    """Skip parsing and validation for operations found in the document cache.
+
+    Only successful validations are cached. The validation rules of the schema only
+    depend on the document, so a document that passed once always passes.
+    """
+
+    cached_document: CachedDocument | None = None
+
+    def on_parse(self) -> Iterator[None]:
+        """Reuse the parsed document of known queries."""
+        execution_context = self.execution_context
+        if execution_context.query:
+            self.cached_document = document_cache.register(
+                hash_query(execution_context.query), execution_context.query
+            )
+            if self.cached_document.document is not None:
+                execution_context.graphql_document = self.cached_document.document
+        yield
+        if self.cached_document is not None and self.cached_document.document is None:
+            self.cached_document.document = execution_context.graphql_document
+
+    def on_validate(self) -> Iterator[None]:
+        """Skip the validation of documents that already passed it."""
+        execution_context = self.execution_context
+        if self.cached_document is not None and self.cached_document.validated:
+            execution_context.errors = []
+        yield
+        if self.cached_document is not None and not execution_context.errors:
+            self.cached_document.validated = True
+
+
+class PersistedQueryRouter(TracingRouter):
+    """GraphQL router implementing the automatic persisted queries protocol."""
+
+    def should_render_graphql_ide(self, request: BaseRequestProtocol) -> bool:
+        """Render the GraphQL IDE for GET requests without a query nor a persisted query."""
+        return super().should_render_graphql_ide(request) and (
+            request.query_params.get("extensions") is None
+        )
+
+    async def parse_http_body(self, request: AsyncHTTPRequestAdapter) -> GraphQLRequestData:
+        """Parse the request and resolve or register its persisted query."""
+        content_type, _ = parse_content_type(request.content_type or "")
+        accept = request.headers.get("accept", "")
+
+        protocol: Literal["http", "multipart-subscription"] = "http"
+        if self._is_multipart_subscriptions(*parse_content_type(accept)):
+            protocol = "multipart-subscription"
+
+        if request.method == "GET":
+            data = self.parse_query_params(request.query_params)
+            if isinstance(data.get("extensions"), str):
+                data["extensions"] = self.parse_json(data["extensions"])
+        elif "application/json" in content_type:
+            data = self.parse_json(await request.get_body())
+        elif self.multipart_uploads_enabled and content_type == "multipart/form-data":
+            data = await self.parse_multipart(request)
+        else:
+            raise HTTPException(400, "Unsupported content type")
+
+        return GraphQLRequestData(
+            query=self._resolve_persisted_query(data.get("query"), data.get("extensions")),
+            variables=data.get("variables"),
+            operation_name=data.get("operationName"),
+            protocol=protocol,
+        )
+
+    def _resolve_persisted_query(self, query: str | None, extensions: Any) -> str | None:
+        """Look up the query of a hash-only request, or register the query under its hash."""
+        if not isinstance(extensions, dict) or not isinstance(
+            extensions.get("persistedQuery"), dict
+        ):
+            return query
+
+        persisted_query = extensions["persistedQuery"]
+        if persisted_query.get("version") != 1:
+            raise HTTPException(400, "Unsupported persisted query version")
+        query_hash = persisted_query.get("sha256Hash")
+        if not isinstance(query_hash, str):
+            raise HTTPException(400, "Missing persisted query sha256Hash")
+
+        if query is None:
+            cached_document = document_cache.get(query_hash)
+            if cached_document is None:
+                raise PersistedQueryNotFoundError
+            return cached_document.query
+
+        if hash_query(query) != query_hash:
+            raise HTTPException(400, "Provided sha does not match query")
+        document_cache.register(query_hash, query)
+        return query
+
+    async def execute_operation(
+        self, request: Any, context: Any, root_value: Any
+    ) -> ExecutionResult | SubscriptionExecutionResult:
+        """Execute the operation, answering unknown hashes with `PersistedQueryNotFound`."""
+        try:
+            return await super().execute_operation(request, context, root_value)
+        except PersistedQueryNotFoundError:
+            return ExecutionResult(
+                data=None,
+                errors=[
+                    GraphQLError(
+                        "PersistedQueryNotFound",
+                        extensions={"code": "PERSISTED_QUERY_NOT_FOUND"},
+                    )
+                ],
+            )
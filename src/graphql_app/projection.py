@@ -0,0 +1,102 @@
+"""Core module for planning which columns to fetch from the GraphQL selection set.
+
+Only the columns behind the fields requested by the client are loaded. Relationships
+are resolved by the request DataLoaders, so the planner only has to keep the columns
+the loaders join on, e.g. `category_id` when `Transaction.category` is selected.
+"""
+
+from functools import cache
+from typing import Iterable, Type
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.interfaces import LoaderOption
+from strawberry.types.nodes import SelectedField, Selection
+from strawberry.utils.str_converters import to_camel_case
+
+from src.graphql_app import types
+from src.graphql_app.miscellanious import Info
+from src.sql_app import models
+
+
+@cache
+def _field_columns(
+    model: Type[models.TransactionModel] | Type[models.CategoryModel],
+    scalar_type: Type[types.Transaction] | Type[types.Category],
+) -> dict[str, tuple[str, ...]]:
+    """Map the GraphQL field names of the type to the model columns needed to resolve them."""
+    mapper = inspect(model)
+    columns = {column.key for column in mapper.column_attrs}
+    relationships = {
+        relationship.key: tuple(column.key for column in relationship.local_columns)
+        for relationship in mapper.relationships
+    }
+    field_columns: dict[str, tuple[str, ...]] = {}
+    for field in scalar_type.__strawberry_definition__.fields:
+        if field.python_name in columns:
+            field_columns[to_camel_case(field.python_name)] = (field.python_name,)
+        elif field.python_name in relationships:
+            field_columns[to_camel_case(field.python_name)] = relationships[field.python_name]
+    return field_columns
+
+
+@cache
+def type_columns(
+    model: Type[models.TransactionModel] | Type[models.CategoryModel],
+    scalar_type: Type[types.Transaction] | Type[types.Category],
+) -> frozenset[str]:
+    """Get the model columns needed to resolve every field of the type."""
+    return frozenset(
+        column for columns in _field_columns(model, scalar_type).values() for column in columns
+    )
+
+
+def _collect_fields(selections: list[Selection], path: tuple[str, ...]) -> set[str]:
+    """Collect the field names selected at the end of the path, following fragments."""
+    names: set[str] = set()
+    for selection in selections:
+        if isinstance(selection, SelectedField):
+            if not path:
+                names.add(selection.name)
+            elif selection.name == path[0]:
+                names |= _collect_fields(selection.selections, path[1:])
+        else:
+            names |= _collect_fields(selection.selections, path)
+    return names
+
+
+def selected_columns(
+    info: Info,
+    model: Type[models.TransactionModel] | Type[models.CategoryModel],
+    scalar_type: Type[types.Transaction] | Type[types.Category],
+    path: tuple[str, ...],
+    required: Iterable[str] = (),
+) -> tuple[str, ...]:
+    """Get the model columns needed by the items selected at `path` below the resolver field.
+
+    The primary key and the `required` columns are always part of the result.
+    """
+    field_columns = _field_columns(model, scalar_type)
+    columns = {"id", *required}
+    for field in info.selected_fields:
+        for name in _collect_fields(field.selections, path):
+            columns.update(field_columns.get(name, ()))
+    return tuple(sorted(columns))
+
+
+def plan_projection(
+    info: Info,
+    model: Type[models.TransactionModel] | Type[models.CategoryModel],
+    scalar_type: Type[types.Transaction] | Type[types.Category],
+    path: tuple[str, ...],
+    required: Iterable[str] = (),
+) -> LoaderOption:
+    """Build the `load_only` option restricting the query to the selected columns."""
+    return load_columns(model, selected_columns(info, model, scalar_type, path, required))
+
+
+def load_columns(
+    model: Type[models.TransactionModel] | Type[models.CategoryModel], columns: Iterable[str]
+) -> LoaderOption:
+    """Build the `load_only` option restricting the query to the given columns."""
+    return load_only(*[getattr(model, column) for column in columns])
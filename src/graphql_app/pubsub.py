@@ -0,0 +1,282 @@
+"""Core module for publishing the changes of the transactions to the subscriptions.
+
+Events are published within the transaction of the change and delivered once it commits,
+so rolled back changes are never seen. The broker is chosen by `PUBSUB_BACKEND`:
+
+- `memory` fans the events published by the mutations out to the subscriptions of the
+  worker, which is enough for a single worker and for tests.
+- `postgres` receives the events on one `LISTEN` connection per worker, shared by all
+  its subscriptions, so every worker sees the events of all workers. They are sent by
+  the triggers of the `transaction events` migration, one notification per write
+  statement, cascaded deletions included, so the mutations do not publish anything.
+  Statements writing too many transactions for a notification send their ids, read
+  back from the primary by the listening workers. The imports send no events.
+
+The events of a write are queued together, so `PUBSUB_MAX_PENDING_EVENTS` bounds the
+number of writes a subscription can lag behind.
+"""
+
+import asyncio
+import contextlib
+import json
+from collections.abc import AsyncIterator
+from datetime import datetime
+from decimal import Decimal
+from functools import cache
+from typing import TYPE_CHECKING, Any, Literal, Protocol
+
+from loguru import logger
+from sqlalchemy import Row, event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.sql_app.models import TransactionModel
+from src.sql_app.session_manager import get_crud_session_factory
+
+if TYPE_CHECKING:
+    import asyncpg
+
+TRANSACTIONS_CHANNEL = "transaction_events"
+
+EventKind = Literal["created", "updated", "deleted"]
+
+
+def transaction_payload(transaction: TransactionModel | Row[Any]) -> dict[str, Any]:
+    """Build the JSON payload of a transaction."""
+    return {
+        "id": transaction.id,
+        "created_at": transaction.created_at.isoformat(),
+        "updated_at": transaction.updated_at.isoformat(),
+        "name": transaction.name,
+        "description": transaction.description,
+        "value": str(transaction.value),
+        "category_id": transaction.category_id,
+    }
+
+
+def parse_transaction(payload: dict[str, Any]) -> dict[str, Any]:
+    """Parse the transaction of an event payload into the fields of its GraphQL type."""
+    return {
+        **payload,
+        "created_at": datetime.fromisoformat(payload["created_at"]),
+        "updated_at": datetime.fromisoformat(payload["updated_at"]),
+        "value": Decimal(payload["value"]),
+    }
+
+
+class Subscriptions:
+    """Queues of the subscriptions of the worker, by channel."""
+
+    def __init__(self, max_pending: int) -> None:
+        """Initialize the subscriptions."""
+        self.max_pending = max_pending
+        self._queues: dict[str, set[asyncio.Queue[list[dict[str, Any]] | None]]] = {}
+
+    def deliver(self, channel: str, payloads: list[dict[str, Any]]) -> None:
+        """Hand the events of a write to every subscription, dropping the oldest if full."""
+        for queue in self._queues.get(channel, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(payloads)
+
+    def close(self) -> None:
+        """End every subscription."""
+        for queues in self._queues.values():
+            for queue in queues:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def listen(self, channel: str) -> AsyncIterator[dict[str, Any]]:
+        """Yield the events of the channel until the subscriptions are closed."""
+        queue: asyncio.Queue[list[dict[str, Any]] | None] = asyncio.Queue(self.max_pending)
+        self._queues.setdefault(channel, set()).add(queue)
+        try:
+            while (payloads := await queue.get()) is not None:
+                for payload in payloads:
+                    yield payload
+        finally:
+            self._queues[channel].discard(queue)
+
+
+class Broker(Protocol):
+    """Subscriber of the events."""
+
+    def subscribe(self, channel: str) -> AsyncIterator[dict[str, Any]]:
+        """Yield the events published on the channel."""
+
+    async def close(self) -> None:
+        """End the subscriptions and release the resources of the broker."""
+
+
+def _on_commit(sess: Session) -> None:
+    """Deliver the events published in the committed transaction."""
+    for subscriptions, channel, payloads in sess.info.pop("pending_events", []):
+        subscriptions.deliver(channel, payloads)
+
+
+def _on_rollback(sess: Session) -> None:
+    """Drop the events published in the rolled back transaction."""
+    sess.info.pop("pending_events", None)
+
+
+class InMemoryBroker:
+    """Deliver the events to the subscriptions of the worker."""
+
+    def __init__(self, max_pending: int) -> None:
+        """Initialize the broker."""
+        self.subscriptions = Subscriptions(max_pending)
+
+    async def publish(
+        self, sess: AsyncSession, channel: str, payloads: list[dict[str, Any]]
+    ) -> None:
+        """Deliver the events once the transaction of the session commits."""
+        sync_session = sess.sync_session
+        if not event.contains(sync_session, "after_commit", _on_commit):
+            event.listen(sync_session, "after_commit", _on_commit)
+            event.listen(sync_session, "after_rollback", _on_rollback)
+        sync_session.info.setdefault("pending_events", []).append(
+            (self.subscriptions, channel, payloads)
+        )
+
+    def subscribe(self, channel: str) -> AsyncIterator[dict[str, Any]]:
+        """Yield the events published on the channel."""
+        return self.subscriptions.listen(channel)
+
+    async def close(self) -> None:
+        """End the subscriptions."""
+        self.subscriptions.close()
+
+
+class PostgresBroker:
+    """Receive the events notified by the database triggers on a shared `LISTEN` connection.
+
+    The connection is opened by the first subscription, outside of the connection pools.
+    Its notifications are handled in order by a single task. When it is lost, the
+    subscriptions end, so the clients subscribe again, and the next subscription opens
+    a new connection.
+    """
+
+    def __init__(self, max_pending: int) -> None:
+        """Initialize the broker."""
+        self.subscriptions = Subscriptions(max_pending)
+        self._connection: "asyncpg.Connection | None" = None
+        self._reader: asyncio.Task[None] | None = None
+        self._notifications: asyncio.Queue[tuple[str, str]] = asyncio.Queue()
+        self._channels: set[str] = set()
+        self._lock = asyncio.Lock()
+
+    def _on_notification(
+        self, connection: "asyncpg.Connection", pid: int, channel: str, payload: str
+    ) -> None:
+        """Queue a notification for the reader task."""
+        self._notifications.put_nowait((channel, payload))
+
+    @staticmethod
+    async def _read_back(kind: str, ids: list[int]) -> list[dict[str, Any]]:
+        """Read the transactions of a partial notification back, skipping the deleted ones."""
+        query = (
+            select(TransactionModel)
+            .where(TransactionModel.id.in_(ids))
+            .order_by(TransactionModel.id)
+        )
+        async with get_crud_session_factory()() as sess:
+            transactions = (await sess.execute(query)).scalars().all()
+        return [
+            {"kind": kind, "transaction": transaction_payload(transaction)}
+            for transaction in transactions
+        ]
+
+    async def _read_notifications(self) -> None:
+        """Hand the notifications to the subscriptions, reading back the partial ones."""
+        while True:
+            channel, notification = await self._notifications.get()
+            payload = json.loads(notification)
+            if payload.get("partial"):
+                try:
+                    payloads = await self._read_back(payload["kind"], payload["ids"])
+                except Exception as err:
+                    logger.error(f"Could not read back the events {notification}: {err!r}")
+                    continue
+            else:
+                payloads = [
+                    {"kind": payload["kind"], "transaction": transaction}
+                    for transaction in payload["transactions"]
+                ]
+            if payloads:
+                self.subscriptions.deliver(channel, payloads)
+
+    def _on_termination(self, connection: "asyncpg.Connection") -> None:
+        """End the subscriptions when the listening connection is lost."""
+        logger.warning("The LISTEN connection was lost, ending the subscriptions.")
+        self._connection = None
+        self._channels.clear()
+        self.subscriptions.close()
+
+    async def _listen(self, channel: str) -> None:
+        """Open the listening connection and listen to the channel, if not done yet."""
+        async with self._lock:
+            if self._reader is None:
+                self._reader = asyncio.create_task(self._read_notifications())
+            if self._connection is None or self._connection.is_closed():
+                # Imported here, so that importing the app does not load the driver
+                import asyncpg
+
+                self._connection = await asyncpg.connect(
+                    host=settings.DB_HOST,
+                    port=settings.DB_PORT,
+                    user=settings.DB_USER,
+                    password=settings.DB_PASSWORD,
+                    database=settings.DB_NAME,
+                )
+                self._connection.add_termination_listener(self._on_termination)
+                self._channels.clear()
+            if channel not in self._channels:
+                await self._connection.add_listener(channel, self._on_notification)
+                self._channels.add(channel)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[dict[str, Any]]:
+        """Yield the events published on the channel by any worker."""
+        await self._listen(channel)
+        async for payload in self.subscriptions.listen(channel):
+            yield payload
+
+    async def close(self) -> None:
+        """End the subscriptions, close the listening connection and stop the reader task."""
+        self.subscriptions.close()
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            connection.remove_termination_listener(self._on_termination)
+            await connection.close()
+        if self._reader is not None:
+            self._reader.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._reader
+            self._reader = None
+
+
+@cache
+def get_broker() -> Broker:
+    """Get the broker configured by `PUBSUB_BACKEND`."""
+    if settings.PUBSUB_BACKEND == "postgres":
+        return PostgresBroker(settings.PUBSUB_MAX_PENDING_EVENTS)
+    return InMemoryBroker(settings.PUBSUB_MAX_PENDING_EVENTS)
+
+
+async def publish_transaction_events(
+    sess: AsyncSession, kind: EventKind, transactions: list[dict[str, Any]]
+) -> None:
+    """Publish an event per transaction payload, delivered once the session commits.
+
+    Only the in-memory broker is published to: with the postgres backend the triggers
+    publish the events of every write.
+    """
+    broker = get_broker()
+    if not isinstance(broker, InMemoryBroker):
+        raise TypeError("The postgres backend events are published by the database triggers.")
+    await broker.publish(
+        sess,
+        TRANSACTIONS_CHANNEL,
+        [{"kind": kind, "transaction": transaction} for transaction in transactions],
+    )
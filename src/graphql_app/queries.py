@@ -2,8 +2,20 @@
 
 import strawberry
 
-from src.graphql_app.resolvers import list_categories, list_transactions
-from src.graphql_app.types import Category, PaginationWindow, Transaction
+from src.graphql_app.resolvers import (
+    aggregate_transactions,
+    list_categories,
+    list_categories_connection,
+    list_transactions,
+    list_transactions_connection,
+)
+from src.graphql_app.types import (
+    AggregateBucket,
+    Category,
+    Connection,
+    PaginationWindow,
+    Transaction,
+)
 
 
 @strawberry.type
@@ -12,3 +24,10 @@ class Query:
 
     transactions: PaginationWindow[Transaction] = strawberry.field(resolver=list_transactions)
     categories: PaginationWindow[Category] = strawberry.field(resolver=list_categories)
+    transactions_connection: Connection[Transaction] = strawberry.field(
+        resolver=list_transactions_connection
+    )
+    categories_connection: Connection[Category] = strawberry.field(
+        resolver=list_categories_connection
+    )
+    aggregates: list[AggregateBucket] = strawberry.field(resolver=aggregate_transactions)
@@ -3,25 +3,57 @@
 Resolvers are responsible for handling the logic of GraphQL queries, mutations, and subscriptions.
 """
 
-from typing import Optional
+from collections.abc import AsyncGenerator
+from itertools import batched
+from typing import Any, Optional
 
-from sqlalchemy import delete, insert, select
-from sqlalchemy.orm import subqueryload
-from sqlalchemy.sql import Delete, Insert, Select
+from sqlalchemy import Row, String, delete, exists, insert, inspect, literal, select, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.graphql_app.helpers import build_paginated_window
+from src.config import settings
+from src.graphql_app.aggregates import build_aggregates
+from src.graphql_app.cache import invalidate_tables
+from src.graphql_app.converters import convert_records
+from src.graphql_app.helpers import build_connection, build_paginated_window
 from src.graphql_app.miscellanious import Info
+from src.graphql_app.projection import type_columns
+from src.graphql_app.pubsub import (
+    TRANSACTIONS_CHANNEL,
+    EventKind,
+    get_broker,
+    parse_transaction,
+    publish_transaction_events,
+    transaction_payload,
+)
 from src.graphql_app.types import (
     JSON,
+    AggregateBucket,
+    AggregateGroupBy,
+    AggregateMetric,
     Category,
     CategoryOrderingInput,
+    Connection,
+    CountStrategy,
+    DeletedTransaction,
     GenericSuccess,
     PaginationWindow,
     Transaction,
+    TransactionInput,
     TransactionOrderingInput,
+    TransactionResult,
 )
 from src.sql_app import models
 
+# Columns returned by the mutations writing transactions: the ones of the GraphQL type,
+# which the event payloads also need, leaving the deferred search vector out
+TRANSACTION_COLUMNS = [
+    getattr(models.TransactionModel, column.key)
+    for column in inspect(models.TransactionModel).column_attrs
+    if column.key in type_columns(models.TransactionModel, Transaction)
+]
+
 
 async def list_transactions(
     info: Info,
@@ -30,18 +62,25 @@ async def list_transactions(
     filters: Optional[JSON] = None,
     subfilters: Optional[JSON] = None,
     ordering: Optional[TransactionOrderingInput] = None,
+    count_strategy: Optional[CountStrategy] = None,
+    search: Optional[str] = None,
 ) -> PaginationWindow[Transaction]:
-    """Get all clusters."""
+    """Get all clusters.
+
+    `search` keeps the transactions whose name or description match it, by word prefixes
+    or by name similarity, ranked by relevance unless an ordering is given.
+    """
     return await build_paginated_window(
         info=info,
         limit=limit,
         offset=offset,
         model=models.TransactionModel,
         scalar_type=Transaction,
-        model_relations=[models.TransactionModel.category],
         filters=filters,
         subfilters=subfilters,
         ordering=ordering,
+        count_strategy=count_strategy,
+        search=search,
     )
 
 
@@ -52,6 +91,7 @@ async def list_categories(
     filters: Optional[JSON] = None,
     subfilters: Optional[JSON] = None,
     ordering: Optional[CategoryOrderingInput] = None,
+    count_strategy: Optional[CountStrategy] = None,
 ) -> PaginationWindow[Category]:
     """Get all clusters."""
     return await build_paginated_window(
@@ -60,10 +100,73 @@ async def list_categories(
         offset=offset,
         model=models.CategoryModel,
         scalar_type=Category,
-        model_relations=[models.CategoryModel.transactions],
         filters=filters,
         subfilters=subfilters,
         ordering=ordering,
+        count_strategy=count_strategy,
+    )
+
+
+async def list_transactions_connection(
+    info: Info,
+    first: int = 10,
+    after: Optional[str] = None,
+    filters: Optional[JSON] = None,
+    subfilters: Optional[JSON] = None,
+    ordering: Optional[TransactionOrderingInput] = None,
+    count_strategy: Optional[CountStrategy] = None,
+) -> Connection[Transaction]:
+    """Get the transactions using cursor-based pagination."""
+    return await build_connection(
+        info=info,
+        first=first,
+        model=models.TransactionModel,
+        scalar_type=Transaction,
+        after=after,
+        filters=filters,
+        subfilters=subfilters,
+        ordering=ordering,
+        count_strategy=count_strategy,
+    )
+
+
+async def list_categories_connection(
+    info: Info,
+    first: int = 10,
+    after: Optional[str] = None,
+    filters: Optional[JSON] = None,
+    subfilters: Optional[JSON] = None,
+    ordering: Optional[CategoryOrderingInput] = None,
+    count_strategy: Optional[CountStrategy] = None,
+) -> Connection[Category]:
+    """Get the categories using cursor-based pagination."""
+    return await build_connection(
+        info=info,
+        first=first,
+        model=models.CategoryModel,
+        scalar_type=Category,
+        after=after,
+        filters=filters,
+        subfilters=subfilters,
+        ordering=ordering,
+        count_strategy=count_strategy,
+    )
+
+
+async def aggregate_transactions(
+    info: Info,
+    group_by: AggregateGroupBy,
+    metrics: Optional[list[AggregateMetric]] = None,
+    filters: Optional[JSON] = None,
+    subfilters: Optional[JSON] = None,
+) -> list[AggregateBucket]:
+    """Get the metrics of the transactions grouped by category or by time bucket."""
+    return await build_aggregates(
+        info=info,
+        group_by=group_by,
+        metrics=metrics or list(AggregateMetric),
+        filters=filters,
+        subfilters=subfilters,
     )
 
 
@@ -74,98 +177,242 @@ async def create_transaction(
     category_name: str,
     description: Optional[str] = None,
 ) -> Transaction:
-    """Create a transaction."""
-    query: Select | Insert
-    async with info.context.db_session(read_only=False) as sess:
-        query = select(models.CategoryModel).where(models.CategoryModel.name == category_name)
-        category: models.CategoryModel | None = (await sess.execute(query)).scalar_one_or_none()
-        if category is None:
-            raise ValueError(f"Category {category_name} not found.")
+    """Create a transaction.
 
+    The category is looked up by name in the same `INSERT ... SELECT` statement, so no row
+    is inserted when it does not exist.
+    """
+    async with info.context.db_session(read_only=False) as sess:
         query = (
             insert(models.TransactionModel)
-            .values(
-                name=name,
-                description=description,
-                value=value,
-                category_id=category.id,
+            .from_select(
+                ["name", "description", "value", "category_id"],
+                select(
+                    literal(name),
+                    literal(description, String),
+                    literal(value),
+                    models.CategoryModel.id,
+                ).where(models.CategoryModel.name == category_name),
             )
-            .returning(models.TransactionModel)
-            .options(subqueryload(models.TransactionModel.category))
+            .returning(*TRANSACTION_COLUMNS)
+        )
+        transaction = (await sess.execute(query)).one_or_none()
+        if transaction is None:
+            raise ValueError(f"Category {category_name} not found.")
+        if settings.PUBSUB_BACKEND == "memory":
+            await publish_transaction_events(sess, "created", [transaction_payload(transaction)])
+        await sess.commit()
+    invalidate_tables(models.TransactionModel.__tablename__)
+    info.context.transactions_by_category_loader.clear(transaction.category_id)
+    return convert_records([transaction], Transaction)[0]
+
+
+async def _insert_transactions(
+    sess: AsyncSession, rows: list[tuple[int, dict[str, Any]]], atomic: bool
+) -> tuple[dict[int, Row[Any]], dict[int, str]]:
+    """Insert the rows in chunks of multi-row INSERT statements, skipping existing names.
+
+    Outside of atomic mode each chunk runs in a savepoint, so a failing chunk only fails
+    its own items.
+    """
+    created: dict[int, Row[Any]] = {}
+    errors: dict[int, str] = {}
+    for chunk in batched(rows, settings.BULK_INSERT_CHUNK_SIZE):
+        query = (
+            postgresql.insert(models.TransactionModel)
+            .values([values for _, values in chunk])
+            .on_conflict_do_nothing(index_elements=[models.TransactionModel.name])
+            .returning(*TRANSACTION_COLUMNS)
+        )
+        if atomic:
+            inserted = (await sess.execute(query)).all()
+        else:
+            try:
+                async with sess.begin_nested():
+                    inserted = (await sess.execute(query)).all()
+            except DBAPIError as err:
+                errors.update((index, str(err.orig)) for index, _ in chunk)
+                continue
+
+        by_name = {transaction.name: transaction for transaction in inserted}
+        for index, values in chunk:
+            transaction = by_name.get(values["name"])
+            if transaction is None:
+                errors[index] = f"Transaction {values['name']} already exists."
+            else:
+                created[index] = transaction
+    return created, errors
+
+
+async def create_transactions(
+    info: Info, input: list[TransactionInput], atomic: bool = False
+) -> list[TransactionResult]:
+    """Create transactions in bulk.
+
+    The categories are resolved with one query and the rows inserted with multi-row
+    INSERT statements committed once. Items that fail are reported in their result, unless
+    `atomic` is set, in which case any failure rolls back the whole batch.
+    """
+    errors: dict[int, str] = {}
+    rows: list[tuple[int, dict[str, Any]]] = []
+    async with info.context.db_session(read_only=False) as sess:
+        query = select(models.CategoryModel).where(
+            models.CategoryModel.name.in_({item.category_name for item in input})
         )
-        transaction = (await sess.execute(query)).scalar_one()
+        categories = {category.name: category for category in (await sess.execute(query)).scalars()}
+
+        names: set[str] = set()
+        for index, item in enumerate(input):
+            category = categories.get(item.category_name)
+            if category is None:
+                errors[index] = f"Category {item.category_name} not found."
+            elif item.name in names:
+                errors[index] = f"Transaction {item.name} is duplicated in the input."
+            else:
+                names.add(item.name)
+                rows.append(
+                    (
+                        index,
+                        {
+                            "name": item.name,
+                            "description": item.description,
+                            "value": item.value,
+                            "category_id": category.id,
+                        },
+                    )
+                )
+        if atomic and errors:
+            raise ValueError(" ".join(errors.values()))
+
+        created, insert_errors = await _insert_transactions(sess, rows, atomic)
+        errors.update(insert_errors)
+        if atomic and errors:
+            raise ValueError(" ".join(errors.values()))
+        if settings.PUBSUB_BACKEND == "memory":
+            await publish_transaction_events(
+                sess,
+                "created",
+                [transaction_payload(transaction) for transaction in created.values()],
+            )
         await sess.commit()
-        await sess.refresh(transaction)
-    return Transaction.from_db_model(transaction)
+
+    if created:
+        invalidate_tables(models.TransactionModel.__tablename__)
+    for category in categories.values():
+        info.context.category_loader.prime(category.id, category)
+    info.context.transactions_by_category_loader.clear_many(
+        list({transaction.category_id for transaction in created.values()})
+    )
+    return [
+        TransactionResult(
+            index=index,
+            transaction=(
+                convert_records([created[index]], Transaction)[0] if index in created else None
+            ),
+            error=errors.get(index),
+        )
+        for index in range(len(input))
+    ]
 
 
 async def create_category(info: Info, name: str) -> Category:
     """Create a category."""
-    query: Insert | Select
     async with info.context.db_session(read_only=False) as sess:
-        query = select(models.CategoryModel).where(models.CategoryModel.name == name)
-        category = (await sess.execute(query)).scalar_one_or_none()
-        if category is not None:
-            raise ValueError(f"Category {name} already exists")
-
         query = (
-            insert(models.CategoryModel)
+            postgresql.insert(models.CategoryModel)
             .values(name=name)
+            .on_conflict_do_nothing(index_elements=[models.CategoryModel.name])
             .returning(models.CategoryModel)
-            .options(subqueryload(models.CategoryModel.transactions))
         )
-        category = (await sess.execute(query)).scalar_one()
+        category = (await sess.execute(query)).scalar_one_or_none()
+        if category is None:
+            raise ValueError(f"Category {name} already exists")
         await sess.commit()
-        await sess.refresh(category)
+    invalidate_tables(models.CategoryModel.__tablename__)
+    info.context.category_loader.prime(category.id, category)
     return Category.from_db_model(category)
 
 
 async def delete_transaction(info: Info, transaction_id: int) -> GenericSuccess:
     """Delete a transaction."""
     async with info.context.db_session(read_only=False) as sess:
-        query = select(models.TransactionModel).where(models.TransactionModel.id == transaction_id)
-        transaction = (await sess.execute(query)).scalar_one_or_none()
-        if transaction is None:
+        query = (
+            delete(models.TransactionModel)
+            .where(models.TransactionModel.id == transaction_id)
+            .returning(models.TransactionModel.category_id)
+        )
+        category_id = (await sess.execute(query)).scalar_one_or_none()
+        if category_id is None:
             raise ValueError(f"Transaction {transaction_id} not found.")
-        query = delete(models.TransactionModel).where(models.TransactionModel.id == transaction_id)
-        await sess.execute(query)
+        if settings.PUBSUB_BACKEND == "memory":
+            await publish_transaction_events(
+                sess, "deleted", [{"id": transaction_id, "category_id": category_id}]
+            )
         await sess.commit()
+    invalidate_tables(models.TransactionModel.__tablename__)
+    info.context.transactions_by_category_loader.clear(category_id)
     return GenericSuccess(success=True, message=f"Transaction {transaction_id} deleted.")
 
 
 async def delete_category(info: Info, category_id: int) -> GenericSuccess:
     """Delete a category."""
     async with info.context.db_session(read_only=False) as sess:
-        query: Select | Delete
-        query = select(models.CategoryModel).where(models.CategoryModel.id == category_id)
-        category = (await sess.execute(query)).scalar_one_or_none()
-        if category is None:
+        query = (
+            delete(models.CategoryModel)
+            .where(models.CategoryModel.id == category_id)
+            .returning(models.CategoryModel.id)
+        )
+        if (await sess.execute(query)).scalar_one_or_none() is None:
             raise ValueError(f"Category with id {category_id} not found.")
-        query = delete(models.CategoryModel).where(models.CategoryModel.id == category_id)
-        await sess.execute(query)
         await sess.commit()
+    invalidate_tables(models.CategoryModel.__tablename__, models.TransactionModel.__tablename__)
+    info.context.category_loader.clear(category_id)
+    info.context.transactions_by_category_loader.clear(category_id)
     return GenericSuccess(success=True, message=f"Category {category_id} deleted.")
 
 
 async def update_transaction_category(
     info: Info, transaction_id: int, category_id: int
 ) -> Transaction:
-    """Update the category of a transaction."""
-    async with info.context.db_session(read_only=False) as sess:
-        query = select(models.TransactionModel).where(models.TransactionModel.id == transaction_id)
-        transaction = (await sess.execute(query)).scalar_one_or_none()
-        if transaction is None:
-            raise ValueError(f"Transaction {transaction_id} not found.")
+    """Update the category of a transaction.
 
-        query = select(models.CategoryModel).where(models.CategoryModel.id == category_id)
-        category = (await sess.execute(query)).scalar_one_or_none()
-        if category is None:
+    The previous category is read from the pre-update row locked in the `FROM` clause, and
+    the row is only updated when the new category exists.
+    """
+    async with info.context.db_session(read_only=False) as sess:
+        previous = (
+            select(models.TransactionModel.id, models.TransactionModel.category_id)
+            .where(models.TransactionModel.id == transaction_id)
+            .with_for_update()
+            .subquery()
+        )
+        query = (
+            update(models.TransactionModel)
+            .where(
+                models.TransactionModel.id == previous.c.id,
+                exists().where(models.CategoryModel.id == category_id),
+            )
+            .values(category_id=category_id)
+            .returning(*TRANSACTION_COLUMNS, previous.c.category_id.label("previous_category_id"))
+            .execution_options(synchronize_session=False)
+        )
+        updated = (await sess.execute(query)).one_or_none()
+        if updated is None:
+            query = select(models.TransactionModel.id).where(
+                models.TransactionModel.id == transaction_id
+            )
+            if (await sess.execute(query)).scalar_one_or_none() is None:
+                raise ValueError(f"Transaction {transaction_id} not found.")
             raise ValueError(f"Category {category_id} not found.")
 
-        transaction.category_id = category.id
+        transaction = updated
+        previous_category_id = updated.previous_category_id
+        if settings.PUBSUB_BACKEND == "memory":
+            await publish_transaction_events(sess, "updated", [transaction_payload(transaction)])
         await sess.commit()
-        await sess.refresh(transaction)
-    return Transaction.from_db_model(transaction)
+    invalidate_tables(models.TransactionModel.__tablename__)
+    info.context.transactions_by_category_loader.clear_many([previous_category_id, category_id])
+    return convert_records([transaction], Transaction)[0]
 
 
 async def update_transaction_description(
@@ -173,12 +420,61 @@ async def update_transaction_description(
 ) -> Transaction:
     """Update the description of a transaction."""
     async with info.context.db_session(read_only=False) as sess:
-        query = select(models.TransactionModel).where(models.TransactionModel.id == transaction_id)
-        transaction = (await sess.execute(query)).scalar_one_or_none()
+        query = (
+            update(models.TransactionModel)
+            .where(models.TransactionModel.id == transaction_id)
+            .values(description=description)
+            .returning(*TRANSACTION_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        transaction = (await sess.execute(query)).one_or_none()
         if transaction is None:
             raise ValueError(f"Transaction {transaction_id} not found.")
-
-        transaction.description = description
+        if settings.PUBSUB_BACKEND == "memory":
+            await publish_transaction_events(sess, "updated", [transaction_payload(transaction)])
         await sess.commit()
-        await sess.refresh(transaction)
-    return Transaction.from_db_model(transaction)
+    invalidate_tables(models.TransactionModel.__tablename__)
+    info.context.transactions_by_category_loader.clear(transaction.category_id)
+    return convert_records([transaction], Transaction)[0]
+
+
+async def _transaction_events(
+    info: Info, kind: EventKind, category_id: Optional[int]
+) -> AsyncGenerator[dict[str, Any], None]:
+    """Yield the transactions of the events of a kind, of the category if given.
+
+    The context is reset once the fields of an event are resolved, before waiting for
+    the next one.
+    """
+    async for event in get_broker().subscribe(TRANSACTIONS_CHANNEL):
+        transaction = event["transaction"]
+        if event["kind"] != kind or (
+            category_id is not None and transaction["category_id"] != category_id
+        ):
+            continue
+        yield transaction
+        await info.context.reset()
+
+
+async def transaction_created(
+    info: Info, category_id: Optional[int] = None
+) -> AsyncGenerator[Transaction, None]:
+    """Stream the created transactions."""
+    async for transaction in _transaction_events(info, "created", category_id):
+        yield Transaction(**parse_transaction(transaction))
+
+
+async def transaction_updated(
+    info: Info, category_id: Optional[int] = None
+) -> AsyncGenerator[Transaction, None]:
+    """Stream the updated transactions."""
+    async for transaction in _transaction_events(info, "updated", category_id):
+        yield Transaction(**parse_transaction(transaction))
+
+
+async def transaction_deleted(
+    info: Info, category_id: Optional[int] = None
+) -> AsyncGenerator[DeletedTransaction, None]:
+    """Stream the deleted transactions."""
+    async for transaction in _transaction_events(info, "deleted", category_id):
+        yield DeletedTransaction(**transaction)
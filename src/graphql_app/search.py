@@ -0,0 +1,46 @@
+"""Core module for the full-text and fuzzy search of the transactions.
+
+A transaction matches a search when its `search_vector` contains every word of the
+search as a prefix, or when the search is similar enough to a part of its name, which
+tolerates typos. Both conditions are served by GIN indexes, see the `transaction search`
+migration. The matches are ranked by their full-text rank plus their name similarity.
+"""
+
+import re
+from typing import Any
+
+from sqlalchemy import bindparam, func, literal_column, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+from src.sql_app import models
+
+WORD_PATTERN = re.compile(r"\w+")
+
+TEXT_SEARCH_CONFIG = literal_column("'simple'::regconfig")
+
+_ts_query = func.to_tsquery(TEXT_SEARCH_CONFIG, bindparam("search_query"))
+_term = bindparam("search_term")
+
+SEARCH_CLAUSE: ColumnElement[bool] = or_(
+    models.TransactionModel.search_vector.bool_op("@@")(_ts_query),
+    _term.bool_op("<%")(models.TransactionModel.name),
+)
+
+SEARCH_RANK: ColumnElement[float] = func.ts_rank(
+    models.TransactionModel.search_vector, _ts_query
+) + func.word_similarity(_term, models.TransactionModel.name)
+
+
+def search_params(search: str) -> dict[str, Any]:
+    """Build the parameters of the search clause and rank.
+
+    Every word of the search must be the prefix of a word of the transaction, so the
+    results narrow down as the user types.
+    """
+    words = WORD_PATTERN.findall(search.lower())
+    if not words:
+        raise ValueError("The search must contain at least one word.")
+    return {
+        "search_query": " & ".join(f"{word}:*" for word in words),
+        "search_term": " ".join(words),
+    }
@@ -0,0 +1,36 @@
+"""Core module for the GraphQL subscriptions."""
+
+from collections.abc import AsyncGenerator
+from typing import Optional
+
+import strawberry
+
+from src.graphql_app import resolvers
+from src.graphql_app.miscellanious import Info
+from src.graphql_app.types import DeletedTransaction, Transaction
+
+
+@strawberry.type
+class Subscription:
+    """Subscription class."""
+
+    @strawberry.subscription
+    def transaction_created(
+        self, info: Info, category_id: Optional[int] = None
+    ) -> AsyncGenerator[Transaction, None]:
+        """Subscription definition for the created transactions, of a category if given."""
+        return resolvers.transaction_created(info=info, category_id=category_id)
+
+    @strawberry.subscription
+    def transaction_updated(
+        self, info: Info, category_id: Optional[int] = None
+    ) -> AsyncGenerator[Transaction, None]:
+        """Subscription definition for the updated transactions, of a category if given."""
+        return resolvers.transaction_updated(info=info, category_id=category_id)
+
+    @strawberry.subscription
+    def transaction_deleted(
+        self, info: Info, category_id: Optional[int] = None
+    ) -> AsyncGenerator[DeletedTransaction, None]:
+        """Subscription definition for the deleted transactions, of a category if given."""
+        return resolvers.transaction_deleted(info=info, category_id=category_id)
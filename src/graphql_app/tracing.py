@@ -0,0 +1,342 @@
+"""Core module for the tracing of the GraphQL requests.
+
+Each request gets a trace made of OpenTelemetry-compatible spans: the request itself,
+the parsing, the validation, the execution, every asynchronous resolver and the
+serialization of the response. When the request is done the spans are summed up in a
+`Server-Timing` header and handed to the span exporter, and operations slower than
+`SLOW_OPERATION_THRESHOLD` seconds are sampled into the slow-operation log.
+
+Tracing is off by default, `TRACING_ENABLED` turns it on.
+"""
+
+import json
+import queue
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Protocol
+
+from fastapi import Request, Response
+from loguru import logger
+from strawberry.fastapi import GraphQLRouter
+from strawberry.types.unset import UNSET
+
+from src.config import settings
+from src.graphql_app.converters import encode_json
+
+AttributeValue = str | int | float | bool
+
+# Requests whose spans wait to be written to the file, above which new ones are dropped
+MAX_PENDING_EXPORTS = 10000
+
+
+def _random_id(bits: int) -> str:
+    """Generate a random trace or span id, as hex digits.
+
+    Like the OpenTelemetry SDK, ids come from the non-cryptographic generator, which is
+    cheap enough to be called for every resolver.
+    """
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+@dataclass
+class Span:
+    """A timed step of a request."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    start_time_unix_nano: int
+    end_time_unix_nano: int = 0
+    attributes: dict[str, AttributeValue] = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        """Get the duration of the span in milliseconds."""
+        return (self.end_time_unix_nano - self.start_time_unix_nano) / 1e6
+
+    def to_otlp(self) -> dict[str, Any]:
+        """Convert the span to the OTLP JSON encoding."""
+
+        def encode(value: AttributeValue) -> dict[str, AttributeValue]:
+            if isinstance(value, bool):
+                return {"boolValue": value}
+            if isinstance(value, int):
+                return {"intValue": str(value)}
+            if isinstance(value, float):
+                return {"doubleValue": value}
+            return {"stringValue": value}
+
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_time_unix_nano),
+            "endTimeUnixNano": str(self.end_time_unix_nano),
+            "attributes": [
+                {"key": key, "value": encode(value)} for key, value in self.attributes.items()
+            ],
+        }
+        if self.parent_span_id is not None:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+class SpanExporter(Protocol):
+    """Destination of the spans of the finished requests."""
+
+    def export(self, spans: Sequence[Span]) -> None:
+        """Export the spans of a request."""
+
+    def close(self) -> None:
+        """Export the pending spans and release the resources of the exporter."""
+
+
+class InMemorySpanExporter:
+    """Keep the most recent spans in memory."""
+
+    def __init__(self, max_spans: int) -> None:
+        """Initialize the exporter without any span."""
+        self.spans: deque[Span] = deque(maxlen=max_spans)
+
+    def export(self, spans: Sequence[Span]) -> None:
+        """Keep the spans, dropping the oldest ones past the limit."""
+        self.spans.extend(spans)
+
+    def close(self) -> None:
+        """Do nothing, the spans are kept in memory."""
+
+
+class FileSpanExporter:
+    """Append the spans to a file, one OTLP JSON export request per line.
+
+    The format is the one read by the `otlpjsonfile` receiver of the OpenTelemetry
+    collector. The spans are queued and written by a background thread, started by the
+    first export, so the event loop never waits on the file. When the writer falls
+    behind by `MAX_PENDING_EXPORTS` requests, the spans of the next ones are dropped.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize the exporter."""
+        self.path = path
+        self._pending: queue.Queue[Sequence[Span] | None] = queue.Queue(MAX_PENDING_EXPORTS)
+        self._writer: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def export(self, spans: Sequence[Span]) -> None:
+        """Queue the spans of a request to be appended to the file."""
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(
+                        target=self._write, name="span-file-writer", daemon=True
+                    )
+                    self._writer.start()
+        try:
+            self._pending.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        """Write the queued spans and stop the writer thread."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._pending.put(None)
+            writer.join()
+
+    @staticmethod
+    def _encode(spans: Sequence[Span]) -> str:
+        """Encode the spans of a request as an OTLP JSON export request line."""
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": "finance-api"}}
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [span.to_otlp() for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        return json.dumps(request) + "\n"
+
+    def _write(self) -> None:
+        """Append the queued spans to the file until closed, flushing when idle."""
+        with open(self.path, "a") as file:
+            while True:
+                try:
+                    spans = self._pending.get_nowait()
+                except queue.Empty:
+                    file.flush()
+                    spans = self._pending.get()
+                if spans is None:
+                    return
+                file.write(self._encode(spans))
+
+
+def build_span_exporter(name: str) -> SpanExporter | None:
+    """Build the span exporter configured by `TRACING_EXPORTER`."""
+    if name == "memory":
+        return InMemorySpanExporter(settings.TRACING_MEMORY_MAX_SPANS)
+    if name == "file":
+        return FileSpanExporter(settings.TRACING_FILE_PATH)
+    return None
+
+
+span_exporter = build_span_exporter(settings.TRACING_EXPORTER)
+
+
+def set_span_exporter(exporter: SpanExporter | None) -> None:
+    """Replace the span exporter, e.g. with one sending the spans to a collector."""
+    global span_exporter
+    span_exporter = exporter
+
+
+def close_span_exporter() -> None:
+    """Export the pending spans and close the span exporter, at shutdown."""
+    if span_exporter is not None:
+        span_exporter.close()
+
+
+class Trace:
+    """Spans of one GraphQL request."""
+
+    def __init__(self) -> None:
+        """Start the trace and its root span."""
+        self.trace_id = _random_id(128)
+        self.root = Span(
+            name="graphql.request",
+            trace_id=self.trace_id,
+            span_id=_random_id(64),
+            parent_span_id=None,
+            start_time_unix_nano=time.time_ns(),
+        )
+        self.spans = [self.root]
+        self.operation_name: str | None = None
+        self.query: str | None = None
+        self.variables: dict[str, Any] | None = None
+
+    def start_span(
+        self, name: str, parent: Span | None = None, **attributes: AttributeValue
+    ) -> Span:
+        """Start a span, a child of the root span by default."""
+        span = Span(
+            name=name,
+            trace_id=self.trace_id,
+            span_id=_random_id(64),
+            parent_span_id=(parent or self.root).span_id,
+            start_time_unix_nano=time.time_ns(),
+            attributes=attributes,
+        )
+        self.spans.append(span)
+        return span
+
+    @staticmethod
+    def end_span(span: Span) -> None:
+        """End a span."""
+        span.end_time_unix_nano = time.time_ns()
+
+    @contextmanager
+    def span(
+        self, name: str, parent: Span | None = None, **attributes: AttributeValue
+    ) -> Iterator[Span]:
+        """Time the block in a span."""
+        span = self.start_span(name, parent, **attributes)
+        try:
+            yield span
+        finally:
+            self.end_span(span)
+
+    def server_timing(self) -> str:
+        """Sum the durations of the spans by name in a `Server-Timing` header value."""
+        durations: defaultdict[str, float] = defaultdict(float)
+        calls: defaultdict[str, int] = defaultdict(int)
+        for span in self.spans[1:]:
+            name = span.name.removeprefix("graphql.")
+            durations[name] += span.duration_ms
+            calls[name] += 1
+        metrics = [
+            f"{name};dur={duration:.3f}"
+            + (f';desc="{calls[name]} calls"' if calls[name] > 1 else "")
+            for name, duration in durations.items()
+        ]
+        metrics.append(f"total;dur={self.root.duration_ms:.3f}")
+        return ", ".join(metrics)
+
+    def finish(self) -> None:
+        """End the trace, export its spans and log it if the operation was slow."""
+        self.end_span(self.root)
+        if self.operation_name is not None:
+            self.root.attributes["graphql.operation.name"] = self.operation_name
+        if span_exporter is not None:
+            span_exporter.export(self.spans)
+        if (
+            self.query is not None
+            and self.root.duration_ms >= settings.SLOW_OPERATION_THRESHOLD * 1000
+            and random.random() < settings.SLOW_OPERATION_SAMPLE_RATE
+        ):
+            self._log_slow_operation()
+
+    def _log_slow_operation(self) -> None:
+        """Log the operation, its variables and its slowest resolvers."""
+        resolvers = sorted(
+            (span for span in self.spans if span.name.startswith("graphql.resolve.")),
+            key=lambda span: span.duration_ms,
+            reverse=True,
+        )
+        logger.bind(slow_operation=True).warning(
+            f"Slow operation {self.operation_name or 'anonymous'} took "
+            f"{self.root.duration_ms:.1f} ms (trace {self.trace_id}). "
+            f"Variables: {json.dumps(self.variables, default=str)}. Slowest resolvers: "
+            + ", ".join(
+                f"{span.attributes.get('graphql.field.path')}={span.duration_ms:.1f}ms"
+                for span in resolvers[:5]
+            )
+            + f". Query: {' '.join((self.query or '').split())[:500]}"
+        )
+
+
+current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+
+
+class TracingRouter(GraphQLRouter):
+    """GraphQL router opening a trace per request and sending its `Server-Timing` header."""
+
+    async def run(self, request: Any, context: Any = UNSET, root_value: Any = UNSET) -> Any:
+        """Handle the request within its trace."""
+        if not settings.TRACING_ENABLED or not isinstance(request, Request):
+            return await super().run(request, context, root_value)
+
+        trace = Trace()
+        token = current_trace.set(trace)
+        try:
+            response = await super().run(request, context, root_value)
+        finally:
+            current_trace.reset(token)
+            trace.finish()
+        if isinstance(response, Response):
+            response.headers["Server-Timing"] = trace.server_timing()
+        return response
+
+    def encode_json(self, data: object) -> str:
+        """Serialize the response, timing it in the trace of the request."""
+        trace = current_trace.get()
+        if trace is None:
+            return encode_json(data)
+        with trace.span("graphql.serialize"):
+            return encode_json(data)
@@ -1,21 +1,29 @@
 """Definition of the GraphQL types."""
 
 import enum
-import json
 from datetime import datetime
-from typing import Generic, List, NewType, Optional, TypeVar
+from typing import Any, Generic, List, NewType, Optional, TypeVar
 
 import strawberry
 
-from src.graphql_app.miscellanious import CommonMethods
+from src.graphql_app.converters import convert_records
+from src.graphql_app.miscellanious import CommonMethods, Info
 
 GenericType = TypeVar("GenericType")
 
+
+def _parse_json_object(value: Any) -> dict[str, Any]:
+    """Check that the JSON value is an object, without copying it."""
+    if not isinstance(value, dict):
+        raise ValueError("The JSON value must be an object.")
+    return value
+
+
 # [Reference](https://strawberry.rocks/docs/types/scalars#example-jsonscalar)
 JSON = strawberry.scalar(
     NewType("JSON", dict),
     serialize=lambda v: v,
-    parse_value=lambda v: json.loads(json.dumps(v)),
+    parse_value=_parse_json_object,
     description="The `JSON` scalar type represents JSON values as specified by ECMA-404",
 )
 
@@ -69,7 +77,10 @@ class PaginationWindow(Generic[Item]):
 
     items: list[Item] = strawberry.field(description="The list of items in this pagination window.")
     total_items_count: int = strawberry.field(
-        description="Total number of items in the filtered dataset."
+        description=(
+            "Total number of items in the filtered dataset. It is a planner estimate when the "
+            "estimated count strategy is used."
+        )
     )
 
 
@@ -81,6 +92,15 @@ class OrderingDirection(enum.Enum):
     DESC = "desc"
 
 
+@strawberry.enum
+class CountStrategy(enum.Enum):
+    """How the total number of items of a paginated list is computed."""
+
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    CACHED = "cached"
+
+
 @strawberry.type
 class Transaction(CommonMethods):
     """Transaction type."""
@@ -92,7 +112,41 @@ class Transaction(CommonMethods):
     description: Optional[str] = None
     value: float
     category_id: int
-    category: "Category"
+
+    @strawberry.field
+    async def category(self, info: Info) -> "Category":
+        """Resolve the category of the transaction through the request DataLoader."""
+        category = await info.context.category_loader.load(self.category_id)
+        if category is None:
+            raise ValueError(f"Category {self.category_id} not found.")
+        return Category.from_db_model(category)
+
+
+@strawberry.type
+class DeletedTransaction:
+    """Transaction that was deleted."""
+
+    id: int
+    category_id: int
+
+
+@strawberry.input
+class TransactionInput:
+    """Define the input of one transaction of a bulk creation."""
+
+    name: str
+    value: float
+    category_name: str
+    description: Optional[str] = None
+
+
+@strawberry.type
+class TransactionResult:
+    """Outcome of one item of a bulk transaction creation."""
+
+    index: int = strawberry.field(description="Position of the item in the input list.")
+    transaction: Optional[Transaction] = None
+    error: Optional[str] = None
 
 
 @strawberry.enum
@@ -124,7 +178,12 @@ class Category(CommonMethods):
     created_at: datetime
     updated_at: datetime
     name: str
-    transactions: List[Transaction]
+
+    @strawberry.field
+    async def transactions(self, info: Info) -> List[Transaction]:
+        """Resolve the transactions of the category through the request DataLoader."""
+        transactions = await info.context.transactions_by_category_loader.load(self.id)
+        return convert_records(transactions, Transaction)
 
 
 @strawberry.enum
@@ -145,6 +204,44 @@ class CategoryOrderingInput:
     direction: OrderingDirection = OrderingDirection.ASC
 
 
+@strawberry.enum
+class AggregateGroupBy(enum.Enum):
+    """Dimension the transactions are grouped by. Time buckets use `created_at`."""
+
+    CATEGORY = "category"
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+@strawberry.enum
+class AggregateMetric(enum.Enum):
+    """Metric computed on the `value` of the transactions of each group."""
+
+    SUM = "sum"
+    AVG = "avg"
+    MIN = "min"
+    MAX = "max"
+    COUNT = "count"
+
+
+@strawberry.type
+class AggregateBucket:
+    """Metrics of a group of transactions. Metrics that were not requested are null."""
+
+    category_id: Optional[int] = strawberry.field(
+        default=None, description="Category of the group, when grouping by category."
+    )
+    period: Optional[datetime] = strawberry.field(
+        default=None, description="Start of the time bucket, when grouping by time."
+    )
+    sum: Optional[float] = None
+    avg: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    count: Optional[int] = None
+
+
 @strawberry.type
 class GenericSuccess:
     """Generic success message."""
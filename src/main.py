@@ -1,14 +1,60 @@
 """Main module for the API."""
 
-import toml
+import asyncio
+import contextlib
+from collections.abc import AsyncIterator
+from importlib import metadata
+
 from fastapi import FastAPI, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
+from src.admission import AdmissionMiddleware, get_admission_queues
+from src.config import settings
 from src.graphql_app import graphql_router
+from src.graphql_app.cache import result_cache
+from src.graphql_app.counting import count_cache
+from src.graphql_app.helpers import build_warm_up_queries
+from src.graphql_app.pubsub import get_broker
+from src.graphql_app.tracing import close_span_exporter
+from src.rest_app import rest_router
+from src.sql_app.instrumentation import render_metrics
+from src.sql_app.session_manager import dispose_engines, get_replica_router, warm_up_pools
+
+try:
+    version = metadata.version("ready-4-prod-fastapi-app")
+except metadata.PackageNotFoundError:
+    # Installed with `poetry install --no-root`, as in the Docker image
+    version = "unknown"
+
 
-version = toml.load("pyproject.toml").get("tool").get("poetry").get("version")
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Warm the connection pools up before serving and dispose the engines at shutdown.
 
-app = FastAPI(version=version, title="Finance API")
+    The read replicas are probed in the background while the API is running. The
+    subscriptions are ended and the pending spans exported at shutdown.
+    """
+    await warm_up_pools(settings.DB_POOL_WARMUP_CONNECTIONS, build_warm_up_queries())
+    probes = (
+        asyncio.create_task(get_replica_router().run()) if settings.DB_READ_REPLICA_HOSTS else None
+    )
+    try:
+        yield
+    finally:
+        if probes is not None:
+            probes.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await probes
+        await get_broker().close()
+        await asyncio.to_thread(close_span_exporter)
+        await dispose_engines()
+
+
+app = FastAPI(version=version, title="Finance API", lifespan=lifespan)
+# Added first to run inside CORSMiddleware, so the rejections carry the CORS headers
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -17,6 +63,7 @@ app.add_middleware(
 )
 
 app.include_router(graphql_router, tags=["GraphQL"])
+app.include_router(rest_router)
 
 
 @app.get(
@@ -26,3 +73,39 @@ app.include_router(graphql_router, tags=["GraphQL"])
 )
 async def health():  # noqa: D103
     return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@app.get(
+    "/cache/stats",
+    responses={200: {"description": "Hit and miss statistics of the in-process caches"}},
+)
+async def cache_stats() -> dict[str, dict[str, int] | None]:  # noqa: D103
+    return {
+        "results": result_cache.stats() if result_cache is not None else None,
+        "counts": count_cache.stats(),
+    }
+
+
+@app.get(
+    "/replicas/stats",
+    responses={200: {"description": "Health, lag and load of the read replicas"}},
+)
+async def replica_stats() -> list[dict[str, str | int | float | bool]]:  # noqa: D103
+    return get_replica_router().stats()
+
+
+@app.get(
+    "/admission/stats",
+    responses={200: {"description": "Load and shedding counters of the admission queues"}},
+)
+async def admission_stats() -> dict[str, dict[str, int]]:  # noqa: D103
+    return {kind: queue.stats() for kind, queue in get_admission_queues().items()}
+
+
+@app.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    responses={200: {"description": "SQL and connection pool metrics in the Prometheus format"}},
+)
+async def metrics() -> PlainTextResponse:  # noqa: D103
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
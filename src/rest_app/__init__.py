@@ -0,0 +1,103 @@
+"""Definition of the REST routes used for bulk data transfers."""
+
+import json
+import time
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+
+from src.graphql_app.miscellanious import get_last_write, set_last_write
+from src.graphql_app.types import JSON, OrderingDirection, TransactionOrderingFilter
+from src.rest_app.exporter import ExportFormat, build_export_query, stream_transactions
+from src.rest_app.importer import ConflictPolicy, ImportFormat, ImportReport, import_transactions
+from src.sql_app.session_manager import get_session_factory
+
+rest_router = APIRouter(prefix="/transactions", tags=["Transactions"])
+
+
+@rest_router.post(
+    "/import",
+    responses={
+        200: {"description": "Import report, with the rejected rows and the throughput"},
+        400: {"description": "The upload cannot be parsed"},
+    },
+)
+async def import_transactions_route(
+    request: Request,
+    response: Response,
+    format: Optional[ImportFormat] = None,
+    on_conflict: ConflictPolicy = ConflictPolicy.SKIP,
+) -> ImportReport:
+    """Import transactions from a CSV or NDJSON request body, streamed as it is received.
+
+    The format defaults to the one of the `Content-Type` header. Each line holds one
+    record with the `name`, `value`, `category_name` and optional `description` fields,
+    the quoted CSV fields may span several lines.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = ImportFormat.NDJSON if "json" in content_type else ImportFormat.CSV
+
+    async with get_session_factory(read_only=False)() as sess:
+        try:
+            report = await import_transactions(sess, request.stream(), format, on_conflict)
+        except ValueError as err:
+            await sess.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    set_last_write(response, time.time())
+    return report
+
+
+def _parse_json_param(name: str, value: str | None) -> JSON | None:
+    """Parse a JSON object passed as query parameter."""
+    if value is None:
+        return None
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        raise ValueError(f"The {name} parameter is not valid JSON.") from None
+    if not isinstance(parsed, dict):
+        raise ValueError(f"The {name} parameter must be a JSON object.")
+    return JSON(parsed)
+
+
+@rest_router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "Every transaction matching the filters, streamed as it is read",
+            "content": {"text/csv": {}, "application/x-ndjson": {}},
+        },
+        400: {"description": "Invalid filters"},
+    },
+)
+async def export_transactions_route(
+    request: Request,
+    format: ExportFormat = ExportFormat.CSV,
+    filters: Optional[str] = None,
+    subfilters: Optional[str] = None,
+    ordering_field: TransactionOrderingFilter = TransactionOrderingFilter.id,
+    ordering_direction: OrderingDirection = OrderingDirection.ASC,
+) -> StreamingResponse:
+    """Export the transactions as CSV or NDJSON.
+
+    `filters` and `subfilters` are JSON objects with the semantics of the `transactions`
+    GraphQL query.
+    """
+    try:
+        query, params = build_export_query(
+            _parse_json_param("filters", filters),
+            _parse_json_param("subfilters", subfilters),
+            ordering_field,
+            ordering_direction,
+        )
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+
+    return StreamingResponse(
+        stream_transactions(query, params, format, get_last_write(request)),
+        media_type=format.media_type,
+        headers={"Content-Disposition": f'attachment; filename="transactions.{format.value}"'},
+    )
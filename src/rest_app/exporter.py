@@ -0,0 +1,108 @@
+"""Core module for streaming exports of the transactions as CSV or NDJSON.
+
+Rows are read from a server-side cursor in partitions of `EXPORT_YIELD_PER` rows and
+written to the response as soon as they are encoded, so memory use does not depend on
+the size of the export. When the client disconnects, the response task is cancelled,
+which closes the cursor and returns the connection to the pool.
+"""
+
+import csv
+import enum
+import io
+import json
+from collections.abc import AsyncIterator, Sequence
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+
+from sqlalchemy import Row, select
+from sqlalchemy.sql import Select
+
+from src.config import settings
+from src.graphql_app.helpers import build_where_statements
+from src.graphql_app.types import JSON, OrderingDirection, TransactionOrderingFilter
+from src.sql_app import models
+from src.sql_app.session_manager import get_replica_router
+
+
+class ExportFormat(enum.Enum):
+    """Supported export formats."""
+
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+    @property
+    def media_type(self) -> str:
+        """Get the media type of the format."""
+        return "text/csv" if self is ExportFormat.CSV else "application/x-ndjson"
+
+
+def build_export_query(
+    filters: JSON | None,
+    subfilters: JSON | None,
+    ordering_field: TransactionOrderingFilter,
+    direction: OrderingDirection,
+) -> tuple[Select[Any], dict[str, Any]]:
+    """Build the query of the export, filtered and ordered like `list_transactions`.
+
+    The id breaks ties, so the export order is deterministic. The generated columns, like
+    the search vector, are not exported.
+    """
+    where_statements, params = build_where_statements(filters, subfilters, models.TransactionModel)
+    table = models.TransactionModel.__table__
+    query = (
+        select(*(column for column in table.columns if column.computed is None))
+        .where(*where_statements)
+        .order_by(
+            getattr(table.c[ordering_field.value], direction.value)(),
+            getattr(table.c.id, direction.value)(),
+        )
+    )
+    return query, params
+
+
+def _json_default(value: Any) -> Any:
+    """Encode the column types unknown to the json module."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_rows(rows: Sequence[Row[Any]], columns: list[str], export_format: ExportFormat) -> str:
+    """Encode a partition of rows."""
+    if export_format is ExportFormat.NDJSON:
+        return "".join(
+            json.dumps(dict(zip(columns, row)), default=_json_default) + "\n" for row in rows
+        )
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [value.isoformat() if isinstance(value, datetime) else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue()
+
+
+async def stream_transactions(
+    query: Select[Any],
+    params: dict[str, Any],
+    export_format: ExportFormat,
+    last_write: float | None = None,
+) -> AsyncIterator[str]:
+    """Stream the rows of the query from a server-side cursor, encoded in the export format."""
+    columns = list(query.selected_columns.keys())
+    if export_format is ExportFormat.CSV:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(columns)
+        yield buffer.getvalue()
+
+    async with get_replica_router().session(last_write) as sess:
+        result = await sess.stream(
+            query, params, execution_options={"yield_per": settings.EXPORT_YIELD_PER}
+        )
+        try:
+            async for rows in result.partitions():
+                yield _encode_rows(rows, columns, export_format)
+        finally:
+            await result.close()
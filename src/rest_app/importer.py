@@ -0,0 +1,330 @@
+"""Core module for bulk importing transactions from CSV or NDJSON uploads.
+
+The upload is decoded and parsed line by line as it is received, so the file is never
+buffered in memory. Each line holds one record, except for the CSV records with quoted
+fields spanning several lines, which are joined back before parsing. Valid records are
+copied in batches into a temporary staging table with the binary `COPY` protocol of
+asyncpg, then moved into `transactions` by set-based statements: category names are
+resolved with a join and name conflicts are either skipped or turned into updates.
+"""
+
+import codecs
+import csv
+import enum
+import json
+import math
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+
+from pydantic import BaseModel
+from sqlalchemy import (
+    Column,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    func,
+    select,
+    text,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.graphql_app.cache import invalidate_tables
+from src.sql_app import models
+
+StagingRecord = tuple[int, str, str | None, float, str]
+
+# Longest CSV record, in characters, so that an unterminated quote does not buffer the
+# rest of the upload
+MAX_CSV_RECORD_SIZE = 1 << 20
+
+# Turns the subscription events of the `transaction events` triggers off for the import,
+# which would otherwise notify every imported row
+DISABLE_TRANSACTION_EVENTS = text("SET LOCAL app.transaction_events = 'off'")
+
+staging_table = Table(
+    "transactions_staging",
+    MetaData(),
+    Column("line", Integer, nullable=False),
+    Column("name", String, nullable=False),
+    Column("description", String, nullable=True),
+    Column("value", Float, nullable=False),
+    Column("category_name", String, nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
+class ImportFormat(enum.Enum):
+    """Supported upload formats."""
+
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+class ConflictPolicy(enum.Enum):
+    """What to do with records whose name is already stored."""
+
+    SKIP = "skip"
+    UPDATE = "update"
+
+
+class RejectedRow(BaseModel):
+    """A record that was not imported."""
+
+    line: int
+    error: str
+
+
+class ImportReport(BaseModel):
+    """Outcome of an import."""
+
+    rows_received: int = 0
+    rows_imported: int = 0
+    rows_skipped: int = 0
+    rows_rejected: int = 0
+    rejected: list[RejectedRow] = []
+    elapsed_seconds: float = 0.0
+    rows_per_second: float = 0.0
+
+    def reject(self, line: int, error: str) -> None:
+        """Record a rejected row, keeping the details of the first ones only."""
+        self.rows_rejected += 1
+        if len(self.rejected) < settings.IMPORT_MAX_REPORTED_REJECTS:
+            self.rejected.append(RejectedRow(line=line, error=error))
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, str]]:
+    """Decode the chunks of an UTF-8 upload and yield its lines with their numbers."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    line_number = 0
+    try:
+        async for chunk in chunks:
+            *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+            for line in lines:
+                line_number += 1
+                yield line_number, line.removesuffix("\r")
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise ValueError(f"The upload is not valid UTF-8 after line {line_number}.") from None
+    if pending:
+        yield line_number + 1, pending.removesuffix("\r")
+
+
+async def iter_csv_records(
+    lines: AsyncIterator[tuple[int, str]],
+) -> AsyncIterator[tuple[int, str]]:
+    """Join the lines of the quoted CSV fields spanning several lines.
+
+    A record ends on a line leaving an even number of quotes, the escaped quotes being
+    doubled. The records are yielded with the number of their first line.
+    """
+    record: list[str] = []
+    first_line = quotes = size = 0
+    async for line_number, line in lines:
+        if not record:
+            first_line = line_number
+        record.append(line)
+        quotes += line.count('"')
+        size += len(line) + 1
+        if quotes % 2 == 0:
+            yield first_line, "\n".join(record)
+            record, quotes, size = [], 0, 0
+        elif size > MAX_CSV_RECORD_SIZE:
+            raise ValueError(f"The quoted field opened at line {first_line} is too long.")
+    if record:
+        raise ValueError(f"The quoted field opened at line {first_line} is not closed.")
+
+
+def _to_record(line: int, data: dict[str, Any]) -> StagingRecord:
+    """Validate a parsed record and convert it into a staging table row."""
+    name = data.get("name")
+    category_name = data.get("category_name", data.get("categoryName"))
+    description = data.get("description") or None
+    if not isinstance(name, str) or not name:
+        raise ValueError("The name is required.")
+    if not isinstance(category_name, str) or not category_name:
+        raise ValueError("The category name is required.")
+    if description is not None and not isinstance(description, str):
+        raise ValueError("The description must be a string.")
+    # Postgres text cannot store NUL characters, they would abort the whole COPY
+    for field, text_value in (
+        ("name", name),
+        ("description", description),
+        ("category name", category_name),
+    ):
+        if text_value is not None and "\x00" in text_value:
+            raise ValueError(f"The {field} contains a NUL character.")
+    try:
+        value = float(data.get("value"))  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value {data.get('value')!r}.") from None
+    if not math.isfinite(value):
+        raise ValueError(f"Invalid value {data.get('value')!r}, it must be finite.")
+    return line, name, description, value, category_name
+
+
+def _parse_line(line: str, import_format: ImportFormat, header: list[str]) -> dict[str, Any]:
+    """Parse one line of the upload into a record."""
+    if import_format is ImportFormat.NDJSON:
+        data = json.loads(line)
+        if not isinstance(data, dict):
+            raise ValueError("The record must be a JSON object.")
+        return data
+    fields = next(csv.reader([line]))
+    if len(fields) != len(header):
+        raise ValueError(f"Expected {len(header)} fields, got {len(fields)}.")
+    return dict(zip(header, fields))
+
+
+async def parse_records(
+    lines: AsyncIterator[tuple[int, str]], import_format: ImportFormat, report: ImportReport
+) -> AsyncIterator[StagingRecord]:
+    """Parse the lines into staging rows, rejecting the invalid ones.
+
+    CSV uploads start with a header naming the columns `name`, `value`, `category_name`
+    and optionally `description`. Their quoted fields may span several lines.
+    """
+    header: list[str] | None = None
+    if import_format is ImportFormat.CSV:
+        lines = iter_csv_records(lines)
+    async for line_number, line in lines:
+        if not line.strip():
+            continue
+        if import_format is ImportFormat.CSV and header is None:
+            header = next(csv.reader([line]))
+            missing = {"name", "value", "category_name"} - set(header)
+            if missing:
+                raise ValueError(f"The CSV header misses the columns {sorted(missing)}.")
+            continue
+
+        report.rows_received += 1
+        try:
+            record = _to_record(line_number, _parse_line(line, import_format, header or []))
+        except (ValueError, csv.Error) as err:
+            report.reject(line_number, str(err))
+            continue
+        yield record
+
+
+async def _copy_to_staging(sess: AsyncSession, records: AsyncIterator[StagingRecord]) -> None:
+    """Copy the records to the staging table in batches with the COPY protocol."""
+    connection = await sess.connection()
+    await connection.run_sync(staging_table.create)
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    columns = [column.name for column in staging_table.columns]
+
+    batch: list[StagingRecord] = []
+    async for record in records:
+        batch.append(record)
+        if len(batch) >= settings.IMPORT_COPY_BATCH_SIZE:
+            await driver_connection.copy_records_to_table(  # type: ignore[union-attr]
+                staging_table.name, records=batch, columns=columns
+            )
+            batch = []
+    if batch:
+        await driver_connection.copy_records_to_table(  # type: ignore[union-attr]
+            staging_table.name, records=batch, columns=columns
+        )
+
+
+async def _reject_staged_rows(sess: AsyncSession, report: ImportReport) -> None:
+    """Reject and drop the staged rows with an unknown category or a repeated name.
+
+    The first occurrence of a name in the upload wins.
+    """
+    categories = models.CategoryModel.__table__
+    unknown_category = (
+        delete(staging_table)
+        .where(
+            ~select(categories.c.id)
+            .where(categories.c.name == staging_table.c.category_name)
+            .exists()
+        )
+        .returning(staging_table.c.line, staging_table.c.category_name)
+    )
+    for line, category_name in (await sess.execute(unknown_category)).all():
+        report.reject(line, f"Category {category_name} not found.")
+
+    first_lines = (
+        select(staging_table.c.name, func.min(staging_table.c.line).label("line"))
+        .group_by(staging_table.c.name)
+        .subquery()
+    )
+    repeated_name = (
+        delete(staging_table)
+        .where(
+            staging_table.c.name == first_lines.c.name,
+            staging_table.c.line != first_lines.c.line,
+        )
+        .returning(staging_table.c.line, staging_table.c.name, first_lines.c.line)
+    )
+    for line, name, first_line in (await sess.execute(repeated_name)).all():
+        report.reject(line, f"Transaction {name} is already defined at line {first_line}.")
+
+
+async def _merge_staged_rows(sess: AsyncSession, on_conflict: ConflictPolicy) -> int:
+    """Insert the staged rows into the transactions, returning the number of rows written."""
+    transactions = models.TransactionModel.__table__
+    categories = models.CategoryModel.__table__
+    rows = select(
+        staging_table.c.name,
+        staging_table.c.description,
+        staging_table.c.value,
+        categories.c.id,
+        func.now(),
+        func.now(),
+    ).join(categories, categories.c.name == staging_table.c.category_name)
+    query = postgresql.insert(transactions).from_select(
+        ["name", "description", "value", "category_id", "created_at", "updated_at"], rows
+    )
+    if on_conflict is ConflictPolicy.UPDATE:
+        query = query.on_conflict_do_update(
+            index_elements=[transactions.c.name],
+            set_={
+                "description": query.excluded.description,
+                "value": query.excluded.value,
+                "category_id": query.excluded.category_id,
+                "updated_at": query.excluded.updated_at,
+            },
+        )
+    else:
+        query = query.on_conflict_do_nothing(index_elements=[transactions.c.name])
+    return (await sess.execute(query)).rowcount  # type: ignore[attr-defined]
+
+
+async def import_transactions(
+    sess: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    import_format: ImportFormat,
+    on_conflict: ConflictPolicy = ConflictPolicy.SKIP,
+) -> ImportReport:
+    """Import the transactions of an upload in a single database transaction.
+
+    Invalid records are rejected with their line number and do not abort the import. The
+    daily summary is updated with the net change of the written rows by its triggers. No
+    subscription event is sent for the imported rows.
+    """
+    report = ImportReport()
+    started_at = time.perf_counter()
+
+    records = parse_records(iter_lines(chunks), import_format, report)
+    await _copy_to_staging(sess, records)
+    await _reject_staged_rows(sess, report)
+    await sess.execute(DISABLE_TRANSACTION_EVENTS)
+    written = await _merge_staged_rows(sess, on_conflict)
+    await sess.commit()
+    invalidate_tables(models.TransactionModel.__tablename__)
+
+    report.rows_imported = written
+    report.rows_skipped = report.rows_received - report.rows_rejected - written
+    report.elapsed_seconds = time.perf_counter() - started_at
+    report.rows_per_second = report.rows_received / max(report.elapsed_seconds, 1e-9)
+    return report
@@ -0,0 +1,61 @@
+"""Production entry point running the API in several worker processes.
+
+Gunicorn manages `SERVER_WORKERS` Uvicorn workers, one per CPU by default, which use
+uvloop and httptools when they are installed. The app is imported once in the master
+process before the workers are forked, so they share its memory pages copy-on-write.
+The database engines are only built by the lifespan of each worker, after the fork, and
+their pools are sized so that all workers together stay within `DB_MAX_CONNECTIONS`.
+
+Usage:
+    python -m src.server
+"""
+
+import os
+from typing import Any
+
+from fastapi import FastAPI
+from gunicorn.app.base import BaseApplication
+
+from src.config import settings
+
+
+class Server(BaseApplication):
+    """Gunicorn application serving the API."""
+
+    def __init__(self, options: dict[str, Any]) -> None:
+        """Initialize the server with its Gunicorn settings."""
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        """Apply the Gunicorn settings."""
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self) -> FastAPI:
+        """Import the app."""
+        from src.main import app
+
+        return app
+
+
+def main() -> None:
+    """Run the API."""
+    # The workers inherit the settings from the master, which sizes their pools
+    settings.SERVER_WORKERS = settings.SERVER_WORKERS or os.cpu_count() or 1
+    Server(
+        {
+            "bind": f"{settings.SERVER_HOST}:{settings.SERVER_PORT}",
+            "workers": settings.SERVER_WORKERS,
+            "worker_class": "uvicorn_worker.UvicornWorker",
+            "preload_app": True,
+            "timeout": settings.SERVER_TIMEOUT,
+            "graceful_timeout": settings.SERVER_TIMEOUT,
+            "keepalive": settings.SERVER_KEEPALIVE,
+            "accesslog": "-",
+        }
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Core module for the instrumentation of the SQL statements and the connection pools.
+
+Engine event hooks measure every statement. When the statement runs inside a GraphQL
+operation, its count, database time and returned rows are also attributed to the
+operation and to the resolver path that issued it, both tracked with context variables
+set by `src.graphql_app.extensions.SQLInstrumentationExtension`. A statement shape, i.e.
+its SQL text without the parameter values, repeated `SQL_N_PLUS_ONE_THRESHOLD` times in
+one operation is logged as a likely N+1 pattern.
+
+The measures are aggregated in histograms rendered in the Prometheus text format. They
+live in the process memory, so each worker exposes its own.
+"""
+
+import bisect
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection, QueuePool
+
+from src.config import settings
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels) -> str:
+    """Render the labels of a sample."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Histogram:
+    """Distribution of observed values, with one series per set of labels."""
+
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...]) -> None:
+        """Initialize the histogram without any series."""
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # Per series: the count of each bucket plus the overflow, the sum of the values
+        self._series: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Add a value to the series of the labels."""
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def render(self) -> list[str]:
+        """Render the histogram in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels((*labels, ('le', str(bound))))} "
+                    f"{cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total[0]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class CounterMetric:
+    """Monotonic counter, with one series per set of labels."""
+
+    def __init__(self, name: str, description: str) -> None:
+        """Initialize the counter without any series."""
+        self.name = name
+        self.description = description
+        self._series: defaultdict[Labels, int] = defaultdict(int)
+
+    def inc(self, **labels: str) -> None:
+        """Increase the series of the labels by one."""
+        self._series[tuple(sorted(labels.items()))] += 1
+
+    def render(self) -> list[str]:
+        """Render the counter in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for labels, value in self._series.items():
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+statement_seconds = Histogram(
+    "sql_statement_duration_seconds", "Execution time of the SQL statements.", SECONDS_BUCKETS
+)
+operation_statements = Histogram(
+    "graphql_operation_sql_statements",
+    "SQL statements executed per GraphQL operation.",
+    COUNT_BUCKETS,
+)
+operation_db_seconds = Histogram(
+    "graphql_operation_db_duration_seconds",
+    "Time spent executing SQL statements per GraphQL operation.",
+    SECONDS_BUCKETS,
+)
+operation_rows = Histogram(
+    "graphql_operation_sql_rows", "Rows returned or written per GraphQL operation.", ROWS_BUCKETS
+)
+n_plus_one_detections = CounterMetric(
+    "graphql_n_plus_one_detections_total",
+    "GraphQL operations that repeated a SQL statement shape past the N+1 threshold.",
+)
+pool_checkout_seconds = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time waited to check a connection out of the pool.",
+    SECONDS_BUCKETS,
+)
+pool_checked_out = Histogram(
+    "db_pool_checked_out_connections",
+    "Connections checked out of the pool, observed at each checkout.",
+    COUNT_BUCKETS,
+)
+
+_instrumented_engines: dict[str, AsyncEngine] = {}
+
+
+@dataclass
+class StatementStats:
+    """Cost of the statements of an operation or of a resolver path."""
+
+    statements: int = 0
+    seconds: float = 0.0
+    rows: int = 0
+
+    def add(self, seconds: float, rows: int) -> None:
+        """Account for one statement."""
+        self.statements += 1
+        self.seconds += seconds
+        self.rows += rows
+
+
+@dataclass
+class OperationStats:
+    """Cost of the statements of a GraphQL operation."""
+
+    name: str = "anonymous"
+    operation_type: str = "query"
+    total: StatementStats = field(default_factory=StatementStats)
+    by_path: defaultdict[str, StatementStats] = field(
+        default_factory=lambda: defaultdict(StatementStats)
+    )
+    shapes: Counter[str] = field(default_factory=Counter)
+
+    def record(self, statement: str, seconds: float, rows: int, path: str) -> None:
+        """Attribute a statement to the operation and to the resolver path."""
+        self.total.add(seconds, rows)
+        self.by_path[path].add(seconds, rows)
+        self.shapes[statement] += 1
+        if self.shapes[statement] == settings.SQL_N_PLUS_ONE_THRESHOLD:
+            n_plus_one_detections.inc(operation_type=self.operation_type)
+            logger.warning(
+                f"Likely N+1 in operation {self.name}: the same statement ran "
+                f"{settings.SQL_N_PLUS_ONE_THRESHOLD} times, last from {path or 'the root'}: "
+                f"{' '.join(statement.split())[:200]}"
+            )
+
+    def finish(self) -> None:
+        """Add the operation to the histograms and log its cost per resolver path."""
+        operation_statements.observe(self.total.statements, operation_type=self.operation_type)
+        operation_db_seconds.observe(self.total.seconds, operation_type=self.operation_type)
+        operation_rows.observe(self.total.rows, operation_type=self.operation_type)
+        if self.total.statements:
+            logger.debug(
+                f"Operation {self.name}: {self.total.statements} statements, "
+                f"{self.total.seconds * 1000:.1f} ms, {self.total.rows} rows. By path: "
+                + ", ".join(
+                    f"{path or 'root'}={stats.statements}/{stats.seconds * 1000:.1f}ms"
+                    for path, stats in self.by_path.items()
+                )
+            )
+
+
+current_operation: ContextVar[OperationStats | None] = ContextVar("current_operation", default=None)
+current_path: ContextVar[str] = ContextVar("current_path", default="")
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool measuring how long each checkout waits and how many connections are out.
+
+    The pool is labelled by its `logging_name`, which survives the pool being recreated.
+    """
+
+    def connect(self) -> PoolProxiedConnection:
+        """Check a connection out of the pool."""
+        started = time.perf_counter()
+        connection = super().connect()
+        name = getattr(self, "logging_name", None) or "default"
+        pool_checkout_seconds.observe(time.perf_counter() - started, pool=name)
+        pool_checked_out.observe(self.checkedout(), pool=name)
+        return connection
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    """Measure the statements executed by the engine."""
+    _instrumented_engines[name] = engine
+    if not settings.SQL_INSTRUMENTATION_ENABLED:
+        return
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn: Any, *args: Any) -> None:
+        # A connection runs one statement at a time, so a single slot is enough
+        conn.info["statement_started"] = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        seconds = time.perf_counter() - conn.info.pop("statement_started")
+        statement_seconds.observe(seconds, engine=name)
+        operation = current_operation.get()
+        if operation is not None:
+            operation.record(statement, seconds, max(cursor.rowcount, 0), current_path.get())
+
+
+def render_metrics() -> str:
+    """Render every metric in the Prometheus text format."""
+    lines = []
+    for metric in (
+        statement_seconds,
+        operation_statements,
+        operation_db_seconds,
+        operation_rows,
+        n_plus_one_detections,
+        pool_checkout_seconds,
+        pool_checked_out,
+    ):
+        lines.extend(metric.render())
+    for gauge, description, measure in (
+        ("db_pool_size", "Connections kept open by the pool.", "size"),
+        ("db_pool_checked_out", "Connections currently checked out.", "checkedout"),
+        (
+            "db_pool_overflow",
+            "Connections open beyond the pool size, negative while it is not full.",
+            "overflow",
+        ),
+    ):
+        lines.append(f"# HELP {gauge} {description}")
+        lines.append(f"# TYPE {gauge} gauge")
+        for name, engine in _instrumented_engines.items():
+            if isinstance(engine.pool, QueuePool):
+                lines.append(f'{gauge}{{pool="{name}"}} {getattr(engine.pool, measure)()}')
+    return "\n".join(lines) + "\n"
@@ -1,10 +1,21 @@
 """Core module for defining the ORM models."""
 
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 
 from pendulum import DateTime as PendulumDateTime
-from sqlalchemy import DateTime, Float, ForeignKey, Integer, String, inspect
+from sqlalchemy import (
+    Computed,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    inspect,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, Mapper, mapped_column, relationship
 from sqlalchemy.orm.decl_api import declarative_mixin
 
@@ -28,10 +39,22 @@ class StaticReferenceMixin:
         onupdate=PendulumDateTime.utcnow(),
     )
 
-    def as_dict(self: "StaticReferenceMixin", bound_relationships: bool = True):
-        """Transform the SQLAlchemy model to a dictionary. It also returns the relations."""
-        mapper: Mapper = inspect(self).mapper  # type: ignore
-        cols = {col.key: getattr(self, col.key) for col in mapper.column_attrs}
+    def as_dict(self: "StaticReferenceMixin", bound_relationships: bool = False):
+        """Transform the SQLAlchemy model to a dictionary, with the relations if asked for.
+
+        Columns left out of the query, e.g. by `load_only`, are returned as None instead of
+        being lazy loaded. Deferred columns, maintained by the database, are left out. The
+        relationships raise instead of lazy loading, so `bound_relationships` requires
+        them to be eagerly loaded by the query.
+        """
+        state = inspect(self)
+        mapper: Mapper = state.mapper  # type: ignore
+        unloaded = state.unloaded  # type: ignore
+        cols = {
+            col.key: getattr(self, col.key) if col.key not in unloaded else None
+            for col in mapper.column_attrs
+            if not col.deferred
+        }
         if bound_relationships:
             return {
                 **cols,
@@ -48,18 +71,47 @@ class TransactionModel(Base, StaticReferenceMixin):
     """Cluster table schema."""
 
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_category_id_created_at", "category_id", "created_at"),
+        Index("ix_transactions_category_id_id", "category_id", "id"),
+        Index("ix_transactions_created_at_id", "created_at", "id"),
+        Index("ix_transactions_updated_at_id", "updated_at", "id"),
+        Index("ix_transactions_value_id", "value", "id"),
+        Index("ix_transactions_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_transactions_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_transactions_description_trgm",
+            "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+    )
 
-    name: Mapped[str] = mapped_column(String, primary_key=True, unique=True)
+    name: Mapped[str] = mapped_column(String, unique=True)
     description: Mapped[str | None] = mapped_column(String, nullable=True)
     value: Mapped[Decimal] = mapped_column(Float(asdecimal=True), nullable=False)
     category_id: Mapped[int] = mapped_column(
         Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False
     )
+    # Maintained by the database for the full-text search, never loaded unless asked for
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, ''))",
+            persisted=True,
+        ),
+        deferred=True,
+    )
 
     category: Mapped["CategoryModel"] = relationship(
         "CategoryModel",
         back_populates="transactions",
-        lazy="subquery",
+        lazy="raise",
         uselist=False,
     )
 
@@ -68,12 +120,33 @@ class CategoryModel(Base, StaticReferenceMixin):
     """Category table schema."""
 
     __tablename__ = "categories"
+    __table_args__ = (
+        Index("ix_categories_created_at_id", "created_at", "id"),
+        Index("ix_categories_updated_at_id", "updated_at", "id"),
+    )
 
     name: Mapped[str] = mapped_column(String, unique=True, index=True)
 
     transactions: Mapped[list["TransactionModel"]] = relationship(
         "TransactionModel",
         back_populates="category",
-        lazy="subquery",
+        lazy="raise",
         uselist=True,
     )
+
+
+class TransactionDailySummaryModel(Base):
+    """Per category and per day rollup of the transactions.
+
+    It is maintained incrementally by statement-level triggers on the transactions, in the
+    same database transaction as the rows it summarizes.
+    """
+
+    __tablename__ = "transaction_daily_summary"
+
+    category_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True
+    )
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    total: Mapped[Decimal] = mapped_column(Float(asdecimal=True), nullable=False, default=0)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
@@ -0,0 +1,154 @@
+"""Core module for routing the read-only sessions across several read replicas.
+
+Reads go to the healthy replica with the fewest outstanding sessions. A background task
+probes every replica periodically and takes it out of rotation while it is unreachable
+or while its replay lag exceeds `DB_REPLICA_MAX_LAG`. When no replica is available the
+reads fall back to the primary.
+
+After a client writes, its reads go to the primary for `DB_READ_YOUR_WRITES_WINDOW`
+seconds, so it reads its own writes even when the replicas lag behind. The time of its
+last write is carried by the client itself, so any worker routes its reads the same way.
+"""
+
+import asyncio
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+# The replay timestamp stops moving when the primary is idle, so a replica streaming from
+# the primary that replayed everything it received has no lag. A replica whose WAL
+# receiver is not streaming receives nothing either, so its lag is the age of its last
+# replayed transaction, growing until it is taken out of rotation. The primary itself is
+# not in recovery.
+LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+            AND EXISTS (SELECT FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+@dataclass(eq=False)
+class Replica:
+    """A read replica and its routing state."""
+
+    name: str
+    engine: AsyncEngine
+    session_factory: async_sessionmaker[AsyncSession]
+    outstanding: int = 0
+    healthy: bool = True
+    lag: float = 0.0
+
+
+class ReplicaRouter:
+    """Balance the read sessions across the replicas."""
+
+    def __init__(
+        self,
+        replicas: list[Replica],
+        primary_session_factory: async_sessionmaker[AsyncSession],
+        max_lag: float,
+        pin_window: float,
+        probe_interval: float,
+    ) -> None:
+        """Initialize the router. Every replica starts healthy until the first probe."""
+        self.replicas = replicas
+        self.primary_session_factory = primary_session_factory
+        self.max_lag = max_lag
+        self.pin_window = pin_window
+        self.probe_interval = probe_interval
+
+    def pick(self) -> Replica | None:
+        """Get the healthy replica with the fewest outstanding sessions."""
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        return min(healthy, key=lambda replica: replica.outstanding, default=None)
+
+    def is_pinned(self, last_write: float | None) -> bool:
+        """Check whether a client that last wrote at the given Unix time must read the primary.
+
+        Times in the future, up to the window, are accepted for the clock skew of the
+        workers.
+        """
+        if last_write is None:
+            return False
+        return abs(time.time() - last_write) < self.pin_window
+
+    def lease(
+        self, last_write: float | None = None
+    ) -> tuple[async_sessionmaker[AsyncSession], Callable[[], None]]:
+        """Choose the session factory of a read and count it as outstanding.
+
+        `last_write` is the Unix time of the last write of the client, if known. Returns
+        the factory and the callback to call once the session is closed.
+        """
+        replica = None if self.is_pinned(last_write) else self.pick()
+        if replica is None:
+            return self.primary_session_factory, lambda: None
+
+        replica.outstanding += 1
+
+        def release() -> None:
+            replica.outstanding -= 1
+
+        return replica.session_factory, release
+
+    @asynccontextmanager
+    async def session(self, last_write: float | None = None) -> AsyncIterator[AsyncSession]:
+        """Open a read session on the chosen replica for the duration of the block."""
+        session_factory, release = self.lease(last_write)
+        try:
+            async with session_factory() as sess:
+                yield sess
+        finally:
+            release()
+
+    async def _probe_replica(self, replica: Replica) -> None:
+        """Measure the replay lag of the replica and update its health."""
+        try:
+            async with asyncio.timeout(self.probe_interval):
+                async with replica.engine.connect() as connection:
+                    replica.lag = float((await connection.execute(LAG_QUERY)).scalar_one())
+        except Exception as err:
+            if replica.healthy:
+                logger.warning(f"Replica {replica.name} is unreachable: {err!r}")
+            replica.healthy = False
+            return
+
+        healthy = replica.lag <= self.max_lag
+        if healthy != replica.healthy:
+            logger.warning(
+                f"Replica {replica.name} is {'back in' if healthy else 'out of'} rotation, "
+                f"lag {replica.lag:.1f}s."
+            )
+        replica.healthy = healthy
+
+    async def probe(self) -> None:
+        """Probe every replica concurrently."""
+        await asyncio.gather(*(self._probe_replica(replica) for replica in self.replicas))
+
+    async def run(self) -> None:
+        """Probe the replicas until cancelled."""
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.probe_interval)
+
+    def stats(self) -> list[dict[str, str | int | float | bool]]:
+        """Get the routing state of every replica."""
+        return [
+            {
+                "name": replica.name,
+                "healthy": replica.healthy,
+                "lag": replica.lag,
+                "outstanding": replica.outstanding,
+            }
+            for replica in self.replicas
+        ]
@@ -1,56 +1,213 @@
-"""Core module for database session related operations."""
+"""Core module for database session related operations.
 
-from asyncio import current_task
+Engines, session factories and the replica router are built on first use, so importing
+the app does not set up the database driver. The API lifespan builds them at startup,
+warms their connection pools up and disposes them at shutdown.
+"""
 
+import asyncio
+from collections.abc import Sequence
+from functools import cache
+
+from loguru import logger
+from sqlalchemy import Executable
 from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
     AsyncSession,
-    async_scoped_session,
     async_sessionmaker,
     create_async_engine,
 )
 
 from src.config import settings
+from src.sql_app.instrumentation import InstrumentedAsyncAdaptedQueuePool, instrument_engine
+from src.sql_app.replicas import Replica, ReplicaRouter
 
-crud_conn_url = "postgresql+asyncpg://{}:{}@{}:{}/{}".format(
-    settings.DB_USER,
-    settings.DB_PASSWORD,
-    settings.DB_HOST,
-    settings.DB_PORT,
-    settings.DB_NAME,
-)
 
-crud_engine = create_async_engine(crud_conn_url, pool_pre_ping=True)
+def _split_host(host: str) -> tuple[str, int]:
+    """Split a `host[:port]` address."""
+    hostname, _, port = host.partition(":")
+    return hostname, int(port) if port else settings.DB_PORT
 
-read_only_conn_url = "postgresql+asyncpg://{}:{}@{}:{}/{}".format(
-    settings.DB_USER,
-    settings.DB_PASSWORD,
-    settings.DB_HOST_READ_ONLY or settings.DB_HOST,
-    settings.DB_PORT,
-    settings.DB_NAME,
-)
 
-read_only_engine = create_async_engine(read_only_conn_url, pool_pre_ping=True)
+def _replica_hosts() -> list[str]:
+    """Get the `host[:port]` addresses of the read replicas, the primary if there are none."""
+    return settings.DB_READ_REPLICA_HOSTS or [settings.DB_HOST_READ_ONLY or settings.DB_HOST]
 
 
-async def create_async_session(read_only: bool = True) -> async_scoped_session[AsyncSession]:
-    """Create an asynchronous scoped session for database operations.
+def _pool_limits(host: str, port: int) -> tuple[int, int]:
+    """Size the pool of an engine to its share of the connection budget of its server.
 
-    This function sets up an asynchronous session using the provided engine and
-    session factory. The session is scoped to the current task, ensuring that
-    each task gets its own session.
+    Each worker has an engine on the primary and one per replica. The engines of all
+    workers on the same server, e.g. the primary and the replica engine falling back to
+    the primary, split its `DB_MAX_CONNECTIONS` evenly, minus the `LISTEN` connections of
+    the subscriptions on the primary. Returns the pool size and the
+    maximum overflow, never above `DB_POOL_SIZE` and `DB_MAX_OVERFLOW`.
+    """
+    if settings.DB_MAX_CONNECTIONS is None:
+        return settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW
 
-    Returns:
-        async_scoped_session[AsyncSession]: An asynchronous scoped session for
-        performing database operations.
+    servers = [(settings.DB_HOST, settings.DB_PORT), *map(_split_host, _replica_hosts())]
+    engines = (settings.SERVER_WORKERS or 1) * servers.count((host, port))
+    budget = settings.DB_MAX_CONNECTIONS
+    if settings.PUBSUB_BACKEND == "postgres" and (host, port) == servers[0]:
+        # Each worker also keeps a LISTEN connection to the primary for the subscriptions
+        budget -= settings.SERVER_WORKERS or 1
+    share = budget // engines
+    if share < 1:
+        raise ValueError(
+            f"DB_MAX_CONNECTIONS={settings.DB_MAX_CONNECTIONS} cannot give a connection to the "
+            f"{engines} engines on {host}:{port}."
+        )
+    pool_size = min(settings.DB_POOL_SIZE, share)
+    return pool_size, min(settings.DB_MAX_OVERFLOW, share - pool_size)
 
-    """
-    async_session = async_scoped_session(
-        session_factory=async_sessionmaker(
-            read_only_engine if read_only else crud_engine,
-            expire_on_commit=False,
-            class_=AsyncSession,
-            autoflush=False,
+
+def _build_engine(host: str, port: int, pool_name: str) -> AsyncEngine:
+    """Build an instrumented engine of the database on the host."""
+    pool_size, max_overflow = _pool_limits(host, port)
+    engine = create_async_engine(
+        "postgresql+asyncpg://{}:{}@{}:{}/{}".format(
+            settings.DB_USER,
+            settings.DB_PASSWORD,
+            host,
+            port,
+            settings.DB_NAME,
         ),
-        scopefunc=current_task,
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_logging_name=pool_name,
+        pool_pre_ping=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    instrument_engine(engine, pool_name)
+    return engine
+
+
+def pool_capacity(read_only: bool) -> int:
+    """Get the number of connections a worker can open for reads, or for writes."""
+    if not read_only:
+        return sum(_pool_limits(settings.DB_HOST, settings.DB_PORT))
+    return sum(sum(_pool_limits(*_split_host(host))) for host in _replica_hosts())
+
+
+def _build_session_factory(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    """Build the session factory of an engine."""
+    return async_sessionmaker(
+        engine,
+        expire_on_commit=False,
+        class_=AsyncSession,
+        autoflush=False,
     )
-    return async_session
+
+
+@cache
+def get_crud_engine() -> AsyncEngine:
+    """Get the engine of the primary database."""
+    return _build_engine(settings.DB_HOST, settings.DB_PORT, "primary")
+
+
+@cache
+def get_crud_session_factory() -> async_sessionmaker[AsyncSession]:
+    """Get the session factory of the primary database."""
+    return _build_session_factory(get_crud_engine())
+
+
+def _build_replica(host: str) -> Replica:
+    """Build the engine and the session factory of a read replica given as `host[:port]`."""
+    engine = _build_engine(*_split_host(host), host)
+    return Replica(name=host, engine=engine, session_factory=_build_session_factory(engine))
+
+
+@cache
+def get_replica_router() -> ReplicaRouter:
+    """Get the router of the reads across the read replicas."""
+    return ReplicaRouter(
+        replicas=[_build_replica(host) for host in _replica_hosts()],
+        primary_session_factory=get_crud_session_factory(),
+        max_lag=settings.DB_REPLICA_MAX_LAG,
+        pin_window=settings.DB_READ_YOUR_WRITES_WINDOW,
+        probe_interval=settings.DB_REPLICA_PROBE_INTERVAL,
+    )
+
+
+def get_session_factory(read_only: bool = True) -> async_sessionmaker[AsyncSession]:
+    """Get the session factory of the least loaded read replica or of the CRUD engine.
+
+    The factories are built once, on first use. Sessions are opened from them by the
+    GraphQL context, which keeps at most one read session and one write session per
+    request. Reads that must be counted as outstanding by the replica router go
+    through `get_replica_router().lease` instead.
+    """
+    if read_only:
+        replica = get_replica_router().pick()
+        return replica.session_factory if replica is not None else get_crud_session_factory()
+    return get_crud_session_factory()
+
+
+def _built_engines() -> list[AsyncEngine]:
+    """Get the engines built so far."""
+    engines = []
+    if get_crud_engine.cache_info().currsize:
+        engines.append(get_crud_engine())
+    if get_replica_router.cache_info().currsize:
+        engines.extend(replica.engine for replica in get_replica_router().replicas)
+    return engines
+
+
+async def _prepare(connection: AsyncConnection, queries: Sequence[Executable]) -> None:
+    """Run the warm-up queries, which leaves them prepared on the connection."""
+    for query in queries:
+        await connection.execute(query)
+    await connection.rollback()
+
+
+async def _warm_up_engine(
+    engine: AsyncEngine, connections: int, queries: Sequence[Executable]
+) -> None:
+    """Open connections in the pool of the engine and prepare the hot queries on them.
+
+    The connections are checked out together so that the pool opens as many, then
+    returned to the pool.
+    """
+    pool_size = engine.pool.size()  # type: ignore[attr-defined]
+    opened = [engine.connect() for _ in range(min(connections, pool_size))]
+    try:
+        await asyncio.gather(*(connection.start() for connection in opened))
+        await asyncio.gather(*(_prepare(connection, queries) for connection in opened))
+    finally:
+        await asyncio.gather(
+            *(connection.close() for connection in opened if connection.sync_connection is not None)
+        )
+
+
+async def warm_up_pools(connections: int, queries: Sequence[Executable] = ()) -> None:
+    """Build the engines and open up to `connections` pooled connections on each.
+
+    The `queries` are run on every opened connection, so they are already prepared when
+    the first requests use them.
+
+    A database that cannot be reached is logged rather than raised, so the API still
+    starts and the pools fill up on demand once it is back.
+    """
+    engines = list(
+        dict.fromkeys(
+            [get_crud_engine(), *(replica.engine for replica in get_replica_router().replicas)]
+        )
+    )
+    if connections <= 0:
+        return
+    results = await asyncio.gather(
+        *(_warm_up_engine(engine, connections, queries) for engine in engines),
+        return_exceptions=True,
+    )
+    for engine, result in zip(engines, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Could not warm the pool of {engine.pool.logging_name} up: {result!r}")
+
+
+async def dispose_engines() -> None:
+    """Close the pooled connections of every engine built so far."""
+    await asyncio.gather(*(engine.dispose() for engine in dict.fromkeys(_built_engines())))
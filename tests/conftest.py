@@ -0,0 +1,61 @@
+"""Fixtures running the API against a disposable Postgres database."""
+
+import contextlib
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import AbstractAsyncContextManager
+from pathlib import Path
+
+import pytest
+from asgi_lifespan import LifespanManager
+from httpx import ASGITransport, AsyncClient
+from testcontainers.postgres import PostgresContainer
+
+from alembic import command
+from alembic.config import Config
+from src.config import settings
+
+ROOT = Path(__file__).parents[1]
+
+
+@pytest.fixture(scope="session")
+def aiolib() -> str:
+    """Run the async tests with asyncio only."""
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def database() -> Iterator[PostgresContainer]:
+    """Start Postgres, point the settings at it and migrate it to the latest revision."""
+    with PostgresContainer("postgres:16", driver="psycopg2") as postgres:
+        settings.DB_HOST = postgres.get_container_host_ip()
+        settings.DB_PORT = int(postgres.get_exposed_port(postgres.port))
+        settings.DB_NAME = postgres.dbname
+        settings.DB_USER = postgres.username
+        settings.DB_PASSWORD = postgres.password
+
+        config = Config(str(ROOT / "alembic" / "alembic.ini"))
+        config.set_main_option("script_location", str(ROOT / "alembic"))
+        config.set_main_option("sqlalchemy.url", postgres.get_connection_url())
+        command.upgrade(config, "head")
+        yield postgres
+
+
+@pytest.fixture
+def api_client(
+    database: PostgresContainer,
+) -> Callable[[], AbstractAsyncContextManager[AsyncClient]]:
+    """Get a factory of clients of the API, started and stopped with its lifespan.
+
+    The client is entered in the test itself, so the engines run in the event loop of
+    the test.
+    """
+    from src.main import app
+
+    @contextlib.asynccontextmanager
+    async def client() -> AsyncIterator[AsyncClient]:
+        async with LifespanManager(app) as manager:
+            transport = ASGITransport(app=manager.app)
+            async with AsyncClient(transport=transport, base_url="http://test") as client:
+                yield client
+
+    return client
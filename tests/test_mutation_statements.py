@@ -0,0 +1,114 @@
+"""Tests of the number of SQL statements executed by each mutation."""
+
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import AbstractAsyncContextManager, contextmanager
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event
+
+from src.sql_app.session_manager import get_crud_engine
+
+TRANSACTION_FIELDS = "id name description value categoryId createdAt updatedAt"
+
+
+@contextmanager
+def count_statements() -> Iterator[list[str]]:
+    """Collect the statements executed on the primary database."""
+    statements: list[str] = []
+
+    def record(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        statements.append(statement)
+
+    engine = get_crud_engine().sync_engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+async def execute(client: AsyncClient, query: str) -> dict[str, Any]:
+    """Run a GraphQL operation and return its data, failing on errors."""
+    response = await client.post("/graphql", json={"query": query})
+    body = response.json()
+    assert "errors" not in body, body["errors"]
+    return body["data"]
+
+
+async def create_fixtures(client: AsyncClient) -> dict[str, Any]:
+    """Create two categories and a transaction in the first one."""
+    suffix = uuid.uuid4().hex
+    categories = [
+        (await execute(client, f'mutation {{ createCategory(name: "{name}") {{ id }} }}'))[
+            "createCategory"
+        ]
+        for name in (f"first-{suffix}", f"second-{suffix}")
+    ]
+    transaction = (
+        await execute(
+            client,
+            f'mutation {{ createTransaction(name: "fixture-{suffix}", value: 1.5, '
+            f'categoryName: "first-{suffix}") {{ id }} }}',
+        )
+    )["createTransaction"]
+    return {
+        "suffix": suffix,
+        "category_name": f"first-{suffix}",
+        "category_id": categories[0]["id"],
+        "other_category_id": categories[1]["id"],
+        "transaction_id": transaction["id"],
+    }
+
+
+MUTATIONS: dict[str, tuple[str, int]] = {
+    "createTransaction": (
+        'mutation {{ createTransaction(name: "new-{suffix}", value: 2, '
+        'categoryName: "{category_name}") {{ ' + TRANSACTION_FIELDS + " }} }}",
+        1,
+    ),
+    "createTransactions": (
+        'mutation {{ createTransactions(atomic: true, input: [{{name: "bulk-{suffix}", '
+        'value: 3, categoryName: "{category_name}"}}]) {{ index error transaction {{ '
+        + TRANSACTION_FIELDS
+        + " }} }} }}",
+        # The categories are looked up by name before the rows are inserted
+        2,
+    ),
+    "createCategory": ('mutation {{ createCategory(name: "new-{suffix}") {{ id name }} }}', 1),
+    "deleteTransaction": (
+        "mutation {{ deleteTransaction(transactionId: {transaction_id}) {{ success }} }}",
+        1,
+    ),
+    "deleteCategory": (
+        "mutation {{ deleteCategory(categoryId: {category_id}) {{ success }} }}",
+        1,
+    ),
+    "updateTransactionCategory": (
+        "mutation {{ updateTransactionCategory(transactionId: {transaction_id}, "
+        "categoryId: {other_category_id}) {{ " + TRANSACTION_FIELDS + " }} }}",
+        1,
+    ),
+    "updateTransactionDescription": (
+        "mutation {{ updateTransactionDescription(transactionId: {transaction_id}, "
+        'description: "updated") {{ ' + TRANSACTION_FIELDS + " }} }}",
+        1,
+    ),
+}
+
+
+@pytest.mark.parametrize("mutation", MUTATIONS)
+async def test_mutation_statements(
+    api_client: Callable[[], AbstractAsyncContextManager[AsyncClient]], mutation: str
+) -> None:
+    """Each mutation writes and returns its rows in the expected number of statements."""
+    query, expected = MUTATIONS[mutation]
+    async with api_client() as client:
+        fixtures = await create_fixtures(client)
+        with count_statements() as statements:
+            data = await execute(client, query.format(**fixtures))
+
+    assert data[mutation]
+    assert len(statements) == expected, statements
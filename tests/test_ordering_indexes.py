@@ -0,0 +1,82 @@
+"""Tests of the indexes backing the orderings exposed by the GraphQL API."""
+
+import enum
+from typing import Any
+
+import pytest
+from sqlalchemy import PrimaryKeyConstraint, UniqueConstraint, create_engine, text
+from testcontainers.postgres import PostgresContainer
+
+from src.graphql_app import types
+from src.sql_app import models
+
+# Orderings sorting the filtered rows without an index. The descriptions are unbounded
+# text, too long for btree entries.
+UNINDEXED_ORDERINGS = {"transactions.description"}
+
+INDEXED_COLUMNS = text(
+    """
+    SELECT index.relname, attribute.attname
+    FROM pg_index
+    JOIN pg_class AS index ON index.oid = pg_index.indexrelid
+    JOIN pg_class AS tab ON tab.oid = pg_index.indrelid
+    CROSS JOIN LATERAL unnest(pg_index.indkey) WITH ORDINALITY AS key(attnum, position)
+    JOIN pg_attribute AS attribute
+        ON attribute.attrelid = tab.oid AND attribute.attnum = key.attnum
+    WHERE tab.relname = :table
+    ORDER BY index.relname, key.position
+    """
+)
+
+
+@pytest.mark.parametrize(
+    ("ordering", "model"),
+    [
+        (types.TransactionOrderingFilter, models.TransactionModel),
+        (types.CategoryOrderingFilter, models.CategoryModel),
+    ],
+)
+def test_ordering_indexes(ordering: type[enum.Enum], model: type[Any]) -> None:
+    """Every ordering field is unique or has an index on the column and the id.
+
+    The keyset pages sort and seek on the column with the id as tie-breaker, so without
+    such an index every page scans and sorts the filtered rows, and a new ordering value
+    must come with a migration adding its index.
+    """
+    table = model.__table__
+    indexed = {
+        tuple(column.name for column in index.columns)[:2]
+        for index in table.indexes
+        if index.dialect_options["postgresql"]["using"] in (False, "btree")
+    }
+    unique = {
+        next(iter(constraint.columns)).name
+        for constraint in table.constraints
+        if isinstance(constraint, (PrimaryKeyConstraint, UniqueConstraint))
+        and len(constraint.columns) == 1
+    }
+    unique |= {next(iter(index.columns)).name for index in table.indexes if index.unique}
+    missing = {
+        f"{table.name}.{field.value}"
+        for field in ordering
+        if field.value not in unique and (field.value, "id") not in indexed
+    }
+    assert missing <= UNINDEXED_ORDERINGS
+
+
+@pytest.mark.parametrize("model", [models.TransactionModel, models.CategoryModel])
+def test_migrated_indexes(database: PostgresContainer, model: type[Any]) -> None:
+    """The migrations create the indexes declared on the models, on the same columns."""
+    table = model.__table__
+    engine = create_engine(database.get_connection_url())
+    try:
+        with engine.connect() as connection:
+            rows = connection.execute(INDEXED_COLUMNS, {"table": table.name}).all()
+    finally:
+        engine.dispose()
+
+    migrated: dict[str, list[str]] = {}
+    for name, column in rows:
+        migrated.setdefault(name, []).append(column)
+    declared = {index.name: [column.name for column in index.columns] for index in table.indexes}
+    assert {name: migrated.get(name) for name in declared} == declared